@@ -0,0 +1,247 @@
+"""
+论文批量处理命令行（不依赖 Streamlit / PyQt）
+
+用于批量导入论文库：多篇论文并行处理，结束后一次性更新全局索引，
+并输出包含每篇论文状态、耗时和token用量的JSON运行报告。
+已处理过的论文各阶段命中缓存，重复运行只处理新增或未完成的论文。
+
+用法:
+    python batch_process.py static/data --jobs 4 --llm-concurrency 8
+    python batch_process.py "papers/**/*.pdf" --stages translate
+"""
+import argparse
+import glob
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from util.cancellation import CancellationToken, ProcessingCancelled
+from util.config import MAX_CONCURRENT_PAPERS, PDF_WORKERS, LLM_WORKERS
+from util.pdf_index import PdfHashIndex, PDF_INDEX_FILE
+from util.pipeline import Pipeline
+from util.scheduler import StageScheduler, RESOURCE_PDF, RESOURCE_LLM
+from util.stage_cache import hash_file
+
+# 与 DataManager 相同的默认输出目录
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parent / "static" / "output"
+
+# 报告中汇总的指标字段
+REPORT_COUNTERS = ('llm_calls', 'prompt_tokens', 'completion_tokens', 'embedding_calls',
+                   'embedding_cache_hits', 'embedding_cache_misses',
+                   'journal_replays', 'stages_run', 'stages_cached')
+
+
+def collect_pdfs(inputs: List[str], recursive: bool = False) -> List[Path]:
+    """
+    将目录、通配符和文件参数展开为PDF文件列表（按路径去重，保持参数顺序）
+    """
+    found = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pattern = '**/*' if recursive else '*'
+            found.extend(sorted(p for p in path.glob(pattern) if p.suffix.lower() == '.pdf'))
+        elif glob.has_magic(item):
+            found.extend(sorted(Path(p) for p in glob.glob(item, recursive=True) if p.lower().endswith('.pdf')))
+        elif path.is_file():
+            found.append(path)
+        else:
+            print(f"[警告] 找不到输入: {item}", file=sys.stderr)
+
+    pdfs, seen_paths, seen_ids = [], set(), {}
+    for pdf in found:
+        resolved = pdf.resolve()
+        if resolved in seen_paths:
+            continue
+        seen_paths.add(resolved)
+        # 论文ID取文件名，同名文件会写入同一输出目录
+        if pdf.stem in seen_ids:
+            print(f"[警告] 论文ID重复，跳过: {pdf}（与 {seen_ids[pdf.stem]} 同名）", file=sys.stderr)
+            continue
+        seen_ids[pdf.stem] = pdf
+        pdfs.append(resolved)
+    return pdfs
+
+
+def dedupe_by_content(pdfs: List[Path], output_dir: Path, index: PdfHashIndex) -> Tuple[List[Path], Dict[str, Any]]:
+    """
+    跳过内容与已有论文（或本次运行中靠前的文件）相同的PDF，并在PDF内容索引中记为别名
+
+    Returns:
+        (需要处理的PDF, 跳过的PDF对应的报告条目 {别名ID: 条目})
+    """
+    run_ids = {pdf.stem for pdf in pdfs}
+
+    def exists(paper_id: str) -> bool:
+        return paper_id in run_ids or (output_dir / paper_id).is_dir()
+
+    unique, duplicates = [], {}
+    for pdf in pdfs:
+        canonical_id = index.register(hash_file(pdf), pdf.stem, exists=exists)
+        if canonical_id != pdf.stem:
+            print(f"[批处理] 跳过重复的PDF: {pdf}（与论文 {canonical_id} 内容相同）", file=sys.stderr)
+            run_ids.discard(pdf.stem)
+            duplicates[pdf.stem] = {'id': pdf.stem, 'pdf': str(pdf), 'status': 'duplicate', 'error': None,
+                                    'alias_of': canonical_id, 'wall_time': 0.0,
+                                    'metrics': {name: 0 for name in REPORT_COUNTERS}}
+            continue
+        unique.append(pdf)
+    index.save()
+    return unique, duplicates
+
+
+def _read_metrics(output_dir: Path, paper_id: str) -> Dict[str, Any]:
+    """读取论文目录下的 metrics.json（处理失败时管线也会写入）"""
+    try:
+        with open(output_dir / paper_id / "metrics.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def process_one(pipeline: Pipeline, pdf: Path, output_dir: Path, token: CancellationToken) -> Dict[str, Any]:
+    """处理单篇论文，返回报告条目（不抛出异常）"""
+    paper_id = pdf.stem
+    result = {'id': paper_id, 'pdf': str(pdf), 'status': 'completed', 'error': None}
+    start = time.perf_counter()
+    try:
+        output_paths = pipeline.process(str(pdf), str(output_dir), cancel_token=token, update_index=False)
+        metrics = output_paths.get('metrics', {})
+        result['index_entry'] = output_paths.get('index_entry')
+    except ProcessingCancelled:
+        result['status'] = 'cancelled'
+        metrics = _read_metrics(output_dir, paper_id)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+        metrics = _read_metrics(output_dir, paper_id)
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    result['metrics'] = {name: metrics.get(name, 0) for name in REPORT_COUNTERS}
+    return result
+
+
+def build_report(results: List[Dict[str, Any]], args: argparse.Namespace,
+                 started_at: str, wall_time: float, index: PdfHashIndex) -> Dict[str, Any]:
+    """生成运行报告（每篇论文附带其在PDF内容索引中的别名）"""
+    papers = [{key: value for key, value in r.items() if key != 'index_entry'} for r in results]
+    for paper in papers:
+        if paper['status'] != 'duplicate':
+            paper['aliases'] = index.aliases(paper['id'])
+    totals = {name: sum(r['metrics'][name] for r in results) for name in REPORT_COUNTERS}
+    lookups = totals['embedding_cache_hits'] + totals['embedding_cache_misses']
+    totals['embedding_cache_hit_rate'] = round(totals['embedding_cache_hits'] / lookups, 3) if lookups else 0.0
+    statuses = {}
+    for r in results:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    return {
+        'started_at': started_at,
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'wall_time': round(wall_time, 3),
+        'options': {
+            'output_dir': str(args.output_dir),
+            'jobs': args.jobs,
+            'stages': args.stages,
+            'llm_concurrency': args.llm_concurrency,
+            'pdf_workers': args.pdf_workers
+        },
+        'papers_total': len(results),
+        'status_counts': statuses,
+        'totals': totals,
+        'papers': papers
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="论文批量处理（无界面）")
+    parser.add_argument('inputs', nargs='+', help="PDF文件、目录或通配符（如 'papers/**/*.pdf'）")
+    parser.add_argument('-o', '--output-dir', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f"输出目录，默认为 {DEFAULT_OUTPUT_DIR}")
+    parser.add_argument('-j', '--jobs', type=int, default=MAX_CONCURRENT_PAPERS, help="同时处理的论文数")
+    parser.add_argument('--stages', nargs='+', default=None,
+                        help="需要产出的阶段，自动包含其前序阶段，默认运行全部阶段")
+    parser.add_argument('--llm-concurrency', type=int, default=LLM_WORKERS,
+                        help="同时运行的LLM阶段数（所有论文共享）")
+    parser.add_argument('--pdf-workers', type=int, default=PDF_WORKERS,
+                        help="同时运行的PDF解析阶段数（受显存限制）")
+    parser.add_argument('--no-preload', action='store_true',
+                        help="不在启动时预加载PDF解析模型（改为处理第一篇论文时加载）")
+    parser.add_argument('-r', '--recursive', action='store_true', help="递归查找目录中的PDF")
+    parser.add_argument('--report', type=Path, default=None,
+                        help="JSON运行报告的输出路径，默认为输出目录下的 batch_report_<时间>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    pdfs = collect_pdfs(args.inputs, args.recursive)
+    if not pdfs:
+        print("没有找到需要处理的PDF文件", file=sys.stderr)
+        return 1
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    index = PdfHashIndex(args.output_dir / PDF_INDEX_FILE)
+    pdfs, duplicates = dedupe_by_content(pdfs, args.output_dir, index)
+
+    scheduler = StageScheduler({RESOURCE_LLM: args.llm_concurrency, RESOURCE_PDF: args.pdf_workers})
+    pipeline = Pipeline(scheduler=scheduler)
+    if args.stages:
+        pipeline.stages = pipeline.expand_stages(args.stages)
+
+    if 'pdf2md' in pipeline.stages and not args.no_preload:
+        pipeline.pdf_processor.warm_up()
+
+    started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    start = time.perf_counter()
+    print(f"[批处理] 共 {len(pdfs)} 篇论文，并行 {args.jobs} 篇，阶段: {pipeline.stages}", file=sys.stderr)
+
+    token = CancellationToken()   # 所有论文共享，中断时一并取消
+    futures = {}
+    interrupted = False
+    executor = ThreadPoolExecutor(max_workers=max(1, args.jobs), thread_name_prefix="paper")
+    try:
+        for pdf in pdfs:
+            futures[executor.submit(process_one, pipeline, pdf, args.output_dir, token)] = pdf
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            print(f"[批处理] [{done}/{len(pdfs)}] {result['id']}: {result['status']} "
+                  f"{result['wall_time']:.1f}s {result['error'] or ''}", file=sys.stderr)
+    except KeyboardInterrupt:
+        # 运行中的论文在当前LLM调用结束后停止，未开始的不再启动
+        interrupted = True
+        print("[批处理] 收到中断，正在停止...", file=sys.stderr)
+        token.cancel("批处理被中断")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    results = list(duplicates.values())
+    for future, pdf in futures.items():
+        if future.cancelled():
+            results.append({'id': pdf.stem, 'pdf': str(pdf), 'status': 'cancelled', 'error': None,
+                            'wall_time': 0.0, 'metrics': {name: 0 for name in REPORT_COUNTERS}})
+        else:
+            results.append(future.result())
+
+    # 所有论文结束后一次性更新全局索引
+    entries = [r['index_entry'] for r in results if r['status'] == 'completed' and r.get('index_entry')]
+    pipeline.update_global_index(args.output_dir, entries)
+    model_status = pipeline.pdf_processor.model_status()
+    pipeline.checkpoint_writer.shutdown()
+    pipeline.pdf_processor.shutdown()
+    scheduler.shutdown()
+
+    report = build_report(results, args, started_at, time.perf_counter() - start, index)
+    report['pdf_models'] = model_status
+    report_path = args.report or args.output_dir / f"batch_report_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[批处理] 完成 {report['status_counts']}，运行报告已保存: {report_path}", file=sys.stderr)
+    failed = report['status_counts'].get('error', 0)
+    return 130 if interrupted else (2 if failed else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
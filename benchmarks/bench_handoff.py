@@ -0,0 +1,150 @@
+"""
+阶段间文档传递基准测试
+
+比较两种传递方式在一篇合成论文上的耗时：
+  - file:   每个阶段 json.load 前序产物、json.dump 自身产物（旧实现）
+  - memory: 阶段间传递内存文档，需要修改的阶段拿到副本，检查点由后台线程写入（当前实现）
+
+各阶段的处理逻辑只做轻量的字段增补，使结果主要反映序列化开销。
+md2json 和 json_process 使用真实的处理器。
+
+用法: python -m benchmarks.bench_handoff --pages 60
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import generate_markdown
+from processor.md_processor import MarkdownProcessor
+from processor.json_processor import JsonProcessor
+from util.checkpoint import CheckpointWriter, copy_document
+
+
+def _walk_blocks(sections):
+    for section in sections:
+        for block in section.get('content', []):
+            if isinstance(block, dict):
+                yield section, block
+        yield from _walk_blocks(section.get('children', []))
+
+
+def _fake_tiling(data):
+    return data
+
+
+def _fake_translate(data):
+    data['translated_title'] = data.get('title', '')
+    for section, block in _walk_blocks(data.get('sections', [])):
+        section['translated_title'] = section.get('title', '')
+        if block.get('type') == 'text':
+            block['translated_content'] = block['content']
+    return data
+
+
+def _fake_extra_info(data):
+    for section, block in _walk_blocks(data.get('sections', [])):
+        section['summary'] = section.get('title', '')
+        if block.get('type') == 'text':
+            block['questions'] = [block['content'][:80]]
+    return data
+
+
+def _fake_consumer(data):
+    # md_restore / rag 只读取文档
+    return sum(1 for _ in _walk_blocks(data.get('sections', [])))
+
+
+# 与管线一致的阶段链：(阶段, 输入阶段, 处理函数, 是否产出JSON检查点)
+STAGES = [
+    ('json_process', 'md2json', JsonProcessor().process_data, True),
+    ('tiling', 'json_process', _fake_tiling, True),
+    ('translate', 'tiling', _fake_translate, True),
+    ('md_restore', 'translate', _fake_consumer, False),
+    ('extra_info', 'translate', _fake_extra_info, True),
+    ('rag', 'extra_info', _fake_consumer, False),
+]
+
+
+def run_file_handoff(markdown: str, out_dir: Path) -> float:
+    """旧实现：每个阶段从磁盘读取前序产物并写出自身产物"""
+    start = time.perf_counter()
+    data = MarkdownProcessor().parse(markdown)
+    with open(out_dir / 'md2json.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    for stage, source, fn, produces in STAGES:
+        with open(out_dir / f'{source}.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        result = fn(data)
+        if produces:
+            with open(out_dir / f'{stage}.json', 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+    return time.perf_counter() - start
+
+
+def run_memory_handoff(markdown: str, out_dir: Path, writer: CheckpointWriter):
+    """当前实现：内存传递，检查点异步写入。返回 (关键路径耗时, 含写盘完成的总耗时)"""
+    start = time.perf_counter()
+    documents = {'md2json': MarkdownProcessor().parse(markdown)}
+    writer.write_json(out_dir / 'md2json.json', documents['md2json'])
+    for stage, source, fn, produces in STAGES:
+        data = documents[source]
+        if produces:
+            data = fn(copy_document(data))
+            documents[stage] = data
+            writer.write_json(out_dir / f'{stage}.json', data)
+        else:
+            fn(data)
+    critical = time.perf_counter() - start
+    writer.flush()
+    return critical, time.perf_counter() - start
+
+
+def run_processing_only(markdown: str) -> float:
+    """只运行处理逻辑，不做任何序列化或复制，作为基线"""
+    start = time.perf_counter()
+    documents = {'md2json': MarkdownProcessor().parse(markdown)}
+    for stage, source, fn, produces in STAGES:
+        result = fn(documents[source])
+        if produces:
+            documents[stage] = result
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="阶段间文档传递基准测试")
+    parser.add_argument('--pages', type=int, default=60, help="合成论文页数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最小值")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    markdown = generate_markdown(args.pages)
+    writer = CheckpointWriter()
+    results = {'pages': args.pages, 'file': [], 'memory_critical': [], 'memory_total': [], 'processing': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        for _ in range(args.repeat):
+            results['processing'].append(run_processing_only(markdown))
+            results['file'].append(run_file_handoff(markdown, out_dir))
+            critical, total = run_memory_handoff(markdown, out_dir, writer)
+            results['memory_critical'].append(critical)
+            results['memory_total'].append(total)
+        results['checkpoint_bytes'] = (out_dir / 'extra_info.json').stat().st_size
+    writer.shutdown()
+
+    best = {key: min(values) for key, values in results.items() if isinstance(values, list)}
+    baseline = best['processing']
+    print(f"合成论文: {args.pages} 页, 最终检查点 {results['checkpoint_bytes'] / 1024:.0f} KB")
+    print(f"{'方式':<18}{'耗时(ms)':>10}{'传递开销(ms)':>14}")
+    for label, key in [('仅处理逻辑', 'processing'), ('file', 'file'),
+                       ('memory(关键路径)', 'memory_critical'), ('memory(含写盘)', 'memory_total')]:
+        print(f"{label:<18}{best[key] * 1000:>10.1f}{(best[key] - baseline) * 1000:>14.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'best_seconds': best, **results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
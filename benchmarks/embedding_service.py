@@ -0,0 +1,148 @@
+"""
+嵌入批处理服务基准测试
+
+模拟处理论文时同时发生的三类嵌入请求：
+  - 向量库创建：图注等短片段与长段落混合的文档，每次 RAG_BATCH_SIZE 条
+  - 分块：两篇论文的句子（与 CPU_WORKERS 默认值相同），每次 TILING_BATCH_SIZE 条
+  - 检索：间隔提交的单条查询
+分别直接调用嵌入模型（当前路径）和经由 EmbeddingService 调用，比较总耗时、查询延迟、
+模型调用次数和补齐浪费的token比例。嵌入模型为 SimulatedEncoder，按补齐后的token数模拟编码耗时，
+也可以用 --model 加载真实的嵌入模型。
+
+用法: python -m benchmarks.embedding_service --documents 2000 --sentences 4000 --queries 50
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fakes import SimulatedEncoder
+from benchmarks.synthetic import _paragraph, _sentence
+from processor.rag_processor import EMBEDDING_BATCH_SIZE as RAG_BATCH_SIZE
+from processor.tiling_processor import EMBEDDING_BATCH_SIZE as TILING_BATCH_SIZE
+from util.embeddings import EmbeddingService
+
+# 同时分块的论文数
+TILING_CALLERS = 2
+
+
+def build_workload(documents: int, sentences: int, seed: int) -> Dict[str, Any]:
+    """生成各调用方的文本：约一半向量库片段为图注等短文本，其余为1到3倍长度的段落"""
+    rng = random.Random(seed)
+    rag = [_sentence(rng) if rng.random() < 0.5 else _paragraph(rng, rng.randint(1, 3)) for _ in range(documents)]
+    tiling = [[_sentence(rng) for _ in range(sentences // TILING_CALLERS)] for _ in range(TILING_CALLERS)]
+    return {'rag': rag, 'tiling': tiling}
+
+
+def run_callers(embed_documents: Callable[[List[str]], Any], embed_query: Callable[[str], Any],
+                workload: Dict[str, Any], queries: int, query_interval: float) -> Dict[str, Any]:
+    """在各自的线程中同时运行全部调用方，返回总耗时和查询延迟"""
+    latencies: List[float] = []
+
+    def rag_caller():
+        for start in range(0, len(workload['rag']), RAG_BATCH_SIZE):
+            embed_documents(workload['rag'][start:start + RAG_BATCH_SIZE])
+
+    def tiling_caller(elements: List[str]):
+        for start in range(0, len(elements), TILING_BATCH_SIZE):
+            embed_documents(elements[start:start + TILING_BATCH_SIZE])
+
+    def query_caller():
+        for i in range(queries):
+            time.sleep(query_interval)
+            started = time.perf_counter()
+            embed_query(f"what does section {i} say about attention and memory")
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=rag_caller), threading.Thread(target=query_caller)]
+    threads += [threading.Thread(target=tiling_caller, args=(elements,)) for elements in workload['tiling']]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'seconds': time.perf_counter() - started,
+        'query_latency_mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'query_latency_p95_ms': sorted(latencies)[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    }
+
+
+def make_encoder(args: argparse.Namespace):
+    if args.model:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from util.config import EMBEDDING_MODEL_NAME, EMBEDDING_NORMALIZE
+
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME,
+                                     encode_kwargs={"normalize_embeddings": EMBEDDING_NORMALIZE})
+    return SimulatedEncoder(devices=args.devices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入批处理服务基准测试")
+    parser.add_argument('--documents', type=int, default=2000, help="向量库片段数")
+    parser.add_argument('--sentences', type=int, default=4000, help="分块的句子总数")
+    parser.add_argument('--queries', type=int, default=50, help="检索查询数")
+    parser.add_argument('--query-interval', type=float, default=0.02, help="查询之间的间隔（秒）")
+    parser.add_argument('--devices', type=int, default=1, help="模拟模型的计算单元数")
+    parser.add_argument('--threads', type=int, default=2, help="服务同时调用模型的最大线程数")
+    parser.add_argument('--token-budget', type=int, default=8192, help="服务每批token预算的初始值")
+    parser.add_argument('--model', action='store_true', help="使用真实的嵌入模型（需要 langchain_huggingface）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--max-slowdown', type=float, default=1.1, help="服务总耗时超过当前路径该倍数时失败")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    workload = build_workload(args.documents, args.sentences, args.seed)
+    results = []
+
+    encoder = make_encoder(args)
+    result = run_callers(encoder.embed_documents, encoder.embed_query, workload, args.queries, args.query_interval)
+    results.append({'path': 'direct', **result, **_encoder_stats(encoder)})
+
+    encoder = make_encoder(args)
+    service = EmbeddingService(encoder, token_budget=args.token_budget, max_threads=args.threads)
+    result = run_callers(service.embed_documents, service.embed_query, workload, args.queries, args.query_interval)
+    stats = service.stats()
+    results.append({'path': 'service', **result, **_encoder_stats(encoder),
+                    'token_budget': stats['token_budget'], 'threads': stats['threads']})
+
+    print(f"{'路径':<10}{'总耗时(s)':>10}{'查询均值(ms)':>14}{'查询P95(ms)':>13}{'模型调用':>10}{'补齐浪费':>10}")
+    for r in results:
+        print(f"{r['path']:<10}{r['seconds']:>10.2f}{r['query_latency_mean_ms']:>14.1f}"
+              f"{r['query_latency_p95_ms']:>13.1f}{r['calls']:>10}{r['padding_ratio']:>10.1%}")
+    direct, served = results
+    speedup = direct['seconds'] / served['seconds'] if served['seconds'] else 0.0
+    print(f"\n服务加速比: {speedup:.2f}x（结束时 token预算 {served['token_budget']}，线程数 {served['threads']}）")
+
+    failures = []
+    if served['seconds'] > direct['seconds'] * args.max_slowdown:
+        failures.append(f"服务总耗时 {served['seconds']:.2f}s 超过当前路径 {direct['seconds']:.2f}s 的 "
+                        f"{args.max_slowdown}x")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results, 'speedup': speedup, 'failures': failures},
+                      f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"\n[失败] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+def _encoder_stats(encoder) -> Dict[str, Any]:
+    """模拟模型记录的调用次数和补齐统计，真实模型没有这些统计"""
+    padded = getattr(encoder, 'padded_tokens', 0)
+    return {
+        'calls': getattr(encoder, 'calls', 0),
+        'padded_tokens': padded,
+        'padding_ratio': 1 - encoder.tokens / padded if padded else 0.0
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+基准测试用的确定性替身：不访问网络、不加载模型，相同输入总是得到相同输出
+
+  - FakeLLMClient:  替代 util.config.LLMClient，回复由请求内容的哈希和原文截取构成
+  - FakeEmbeddings: 替代 EmbeddingModel.get_instance() 返回的嵌入模型，按词哈希累加成归一化向量，
+                    词语重叠越多的文本相似度越高，TextTiling 等依赖相似度的逻辑能得到有意义的边界
+  - SimulatedEncoder: 在 FakeEmbeddings 的基础上模拟 sentence-transformers 的编码耗时，用于批处理相关的基准测试
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+class FakeLLMClient:
+    """
+    确定性的LLM客户端替身
+
+    回复为请求哈希前缀加上最后一条消息末尾的 reply_chars 个字符，长度与原文相当，
+    使翻译、总结等阶段产出的文档大小接近真实情况。latency 用于模拟每次调用的延迟。
+    """
+
+    def __init__(self, reply_chars: int = 400, latency: float = 0.0):
+        self.reply_chars = reply_chars
+        self.latency = latency
+        self.calls = 0
+
+    def chat(self, messages: List[Dict[str, Any]], temperature=0.5, stream=True) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = str(messages[-1].get('content', '')) if messages else ''
+        return f"[{_digest(content).hex()}] {content[-self.reply_chars:]}"
+
+
+class FakeEmbeddings:
+    """确定性的嵌入模型替身，接口与 langchain 的 Embeddings 一致"""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        self.texts += 1
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            digest = _digest(token)
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+class SimulatedEncoder(FakeEmbeddings):
+    """
+    模拟 sentence-transformers 编码耗时的嵌入模型替身
+
+    与 SentenceTransformer.encode 一样，每次调用先按长度排序，再每 batch_size 条补齐到该组最长的文本；
+    每次调用耗时 call_overhead 秒，每组耗时 batch_overhead 秒加上 token_cost × 补齐后的token数。
+    补齐后的计算占用 devices 个计算单元之一（同时调用超过该数时排队），其余开销可以与其他调用重叠。
+    token数按 util.metrics.estimate_tokens 估算。
+    """
+
+    def __init__(self, dimensions: int = 384, batch_size: int = 32, call_overhead: float = 0.002,
+                 batch_overhead: float = 0.0005, token_cost: float = 2e-6, devices: int = 1):
+        super().__init__(dimensions)
+        self.batch_size = batch_size
+        self.call_overhead = call_overhead
+        self.batch_overhead = batch_overhead
+        self.token_cost = token_cost
+        self._devices = threading.Semaphore(devices)
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        from util.metrics import estimate_tokens
+
+        lengths = sorted((max(1, estimate_tokens(text)) for text in texts), reverse=True)
+        padded = sum(max(lengths[i:i + self.batch_size]) * len(lengths[i:i + self.batch_size])
+                     for i in range(0, len(lengths), self.batch_size))
+        groups = (len(lengths) + self.batch_size - 1) // self.batch_size
+        time.sleep(self.call_overhead)
+        with self._devices:
+            time.sleep(groups * self.batch_overhead + padded * self.token_cost)
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            self.tokens += sum(lengths)
+            self.padded_tokens += padded
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def install_fake_embeddings(embeddings: FakeEmbeddings) -> Callable[[], None]:
+    """让各用途的 EmbeddingModel.get_instance() 都返回替身，返回恢复原实例的函数"""
+    from util.config import EMBEDDING_MODELS, EmbeddingModel
+
+    original = EmbeddingModel._instances
+    EmbeddingModel._instances = {name: embeddings for name in EMBEDDING_MODELS.values()}
+
+    def restore():
+        EmbeddingModel._instances = original
+    return restore
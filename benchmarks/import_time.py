@@ -0,0 +1,135 @@
+"""
+启动导入耗时基准测试
+
+在独立子进程中用 ``python -X importtime`` 导入界面启动时需要的模块，汇总：
+  - 导入墙钟耗时（多次取最小值）
+  - 按顶层包汇总的导入耗时，以及累计耗时最长的模块
+  - 是否提前导入了只在处理论文时才需要的重型依赖（magic_pdf、langchain、torch 等）
+
+提前导入了重型依赖或超出耗时预算时以非零状态退出，可用于发现启动耗时回退。
+
+用法: python -m benchmarks.import_time --budget-ms 1000
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 界面显示论文列表前需要导入的模块（stream.py 的项目内依赖）
+DEFAULT_MODULES = ['util.data_manager', 'util.AI_professor_chat']
+
+# 只在处理论文、检索或问答时才需要的重型依赖，启动时不应导入
+HEAVY_PACKAGES = (
+    'magic_pdf', 'langchain', 'langchain_core', 'langchain_community', 'langchain_huggingface',
+    'sklearn', 'torch', 'transformers', 'sentence_transformers', 'faiss', 'numpy', 'openai'
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 输出，返回 [{'module', 'self_us', 'cumulative_us', 'depth'}]"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        # 模块名前的缩进表示嵌套导入的层级（首个空格为分隔符）
+        module = name.rstrip()[1:]
+        records.append({
+            'module': module.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(module) - len(module.lstrip())) // 2
+        })
+    return records
+
+
+def profile_imports(modules: List[str]) -> Dict[str, Any]:
+    """在新的解释器中导入模块，返回耗时、导入记录和已加载的模块列表"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(modules=modules)],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入失败:\n{result.stderr[-2000:]}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'seconds': probe['seconds'],
+        'loaded': probe['modules'],
+        'records': parse_importtime(result.stderr)
+    }
+
+
+def summarize_profile(profile: Dict[str, Any], top: int) -> Dict[str, Any]:
+    """按顶层包汇总导入耗时，找出提前导入的重型依赖"""
+    by_package = {}
+    for record in profile['records']:
+        package = record['module'].split('.')[0]
+        by_package[package] = by_package.get(package, 0) + record['self_us']
+    slowest = sorted(profile['records'], key=lambda r: r['cumulative_us'], reverse=True)[:top]
+    heavy = sorted({name.split('.')[0] for name in profile['loaded']} & set(HEAVY_PACKAGES))
+    return {
+        'packages_ms': {name: round(us / 1000, 1) for name, us in
+                        sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]},
+        'slowest_ms': [(r['module'], round(r['cumulative_us'] / 1000, 1)) for r in slowest],
+        'heavy_imported': heavy,
+        'module_count': len(profile['loaded'])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时基准测试")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help="需要导入的模块")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最小值")
+    parser.add_argument('--top', type=int, default=15, help="显示耗时最长的条目数")
+    parser.add_argument('--budget-ms', type=float, default=None, help="导入耗时预算（毫秒），超出时失败")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    profiles = [profile_imports(args.modules) for _ in range(max(1, args.repeat))]
+    best = min(profiles, key=lambda p: p['seconds'])
+    summary = summarize_profile(best, args.top)
+    seconds = [p['seconds'] for p in profiles]
+
+    print(f"导入模块: {', '.join(args.modules)}")
+    print(f"导入耗时: 最小 {min(seconds) * 1000:.1f} ms, 最大 {max(seconds) * 1000:.1f} ms，共加载 {summary['module_count']} 个模块")
+    print(f"\n{'顶层包':<32}{'自身耗时(ms)':>14}")
+    for package, ms in summary['packages_ms'].items():
+        print(f"{package:<32}{ms:>14.1f}")
+    print(f"\n{'模块':<48}{'累计耗时(ms)':>14}")
+    for module, ms in summary['slowest_ms']:
+        print(f"{module:<48}{ms:>14.1f}")
+
+    failures = []
+    if summary['heavy_imported']:
+        failures.append(f"启动时导入了重型依赖: {', '.join(summary['heavy_imported'])}")
+    if args.budget_ms is not None and min(seconds) * 1000 > args.budget_ms:
+        failures.append(f"导入耗时 {min(seconds) * 1000:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'modules': args.modules, 'seconds': seconds, **summary, 'failures': failures},
+                      f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"\n[失败] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+JsonProcessor 行拆分基准测试
+
+将合成论文的正文行拼接成一个很大的章节，分别用当前实现（按首字符分派，每行只分类一次）
+和之前的实现（LegacyJsonProcessor，每行依次尝试各个正则）执行 _split_content_with_order，比较：
+  - 耗时与每秒处理行数
+  - 拆分出的各类块数量
+并检查两者在合成章节和随机边界用例（孤立的说明行、相邻的多个图片/表格、不完整的公式和表格等）上
+输出的块完全相同，不同时以非零状态退出。
+
+用法: python -m benchmarks.json_split --pages 60 --copies 20
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.synthetic import generate_markdown
+from processor.json_processor import JsonProcessor
+
+# 随机边界用例的行池
+EDGE_CASE_LINES = [
+    "", "  ", "plain text", "  indented text\n", "Figure 1: cap", "fig. 2. x", "  FIGURE IV: y", "Fig 3",
+    "IMAGE 2: a", "diagram 5", "Table 1: t", "tab. (2.1) z", "TABLE II", "Tables are", "Figures show",
+    "![a](b.png)", "  ![](x/y.jpg) trailing", "![a](b", "$$ x $$", " $$a\nb$$ ", "$$ a $$ b", "$x$",
+    "<html><body><table><tr></tr></table></body></html>", "<html><body><table>", "<b>x</b>",
+    "Dfoo", "I think", "\tFigure 9: tab"
+]
+
+
+class LegacyJsonProcessor(JsonProcessor):
+    """之前的行拆分实现：每行依次尝试公式、图片、表格和说明的正则，图片的 alt/src 另行解析"""
+
+    def _split_content_with_order(self, lines: List[str]) -> List[Dict[str, Any]]:
+        blocks = []
+        n = len(lines)
+        used = [False] * n  # 标记哪些行已被处理
+
+        i = 0
+        while i < n:
+            if used[i]:
+                i += 1
+                continue
+
+            line = lines[i].rstrip('\n')
+            stripped = line.strip()
+
+            # 1) 行间公式
+            m_formula = self.formula_pattern.match(stripped)
+            if m_formula:
+                blocks.append({
+                    "type": "formula",
+                    "content": f"$$ {m_formula.group('formula')} $$"
+                })
+                used[i] = True
+                i += 1
+                continue
+
+            # 2) 处理图片
+            if self.image_pattern.match(stripped):
+                used[i] = True
+                alt_text, src = self._extract_alt_and_src(stripped)
+                caption_line, caption_index = self._find_caption(lines, i, used, self.figure_caption_pattern)
+                if caption_line and caption_index is not None:
+                    used[caption_index] = True
+                fig_block = {
+                    "type": "figure",
+                    "src": src,
+                    "alt": alt_text
+                }
+                if caption_line:
+                    fig_block["caption"] = caption_line
+                blocks.append(fig_block)
+                i += 1
+                continue
+
+            # 3) 处理表格
+            if self.table_pattern.match(stripped):
+                used[i] = True
+                caption_line, caption_index = self._find_caption(lines, i, used, self.table_caption_pattern)
+                if caption_line and caption_index is not None:
+                    used[caption_index] = True
+                table_block = {
+                    "type": "table",
+                    "content": stripped
+                }
+                if caption_line:
+                    table_block["caption"] = caption_line
+                blocks.append(table_block)
+                i += 1
+                continue
+
+            # 4) 处理普通文本，跳过caption
+            if (not self.figure_caption_pattern.match(stripped) and
+                    not self.table_caption_pattern.match(stripped)):
+                used[i] = True
+                blocks.append({
+                    "type": "text",
+                    "content": line
+                })
+            i += 1
+
+        return blocks
+
+    def _find_caption(self, lines: List[str], current_index: int, used: List[bool],
+                      caption_pattern: re.Pattern) -> Tuple[str, int]:
+        n = len(lines)
+        if current_index - 1 >= 0 and not used[current_index - 1]:
+            prev_stripped = lines[current_index - 1].strip()
+            if caption_pattern.match(prev_stripped):
+                return prev_stripped, current_index - 1
+        if current_index + 1 < n and not used[current_index + 1]:
+            next_stripped = lines[current_index + 1].strip()
+            if caption_pattern.match(next_stripped):
+                return next_stripped, current_index + 1
+        return "", None
+
+    def _extract_alt_and_src(self, image_markdown_line: str) -> Tuple[str, str]:
+        pattern = re.compile(r'!\[(?P<alt>.*?)\]\((?P<src>.*?)\)')
+        m = pattern.match(image_markdown_line)
+        if not m:
+            return "", ""
+        return m.group("alt"), m.group("src")
+
+
+def synthetic_section(pages: int, copies: int) -> list:
+    """合成论文的全部行（不含标题行）重复 copies 次，模拟超长章节"""
+    lines = [line for line in generate_markdown(pages).split('\n') if not line.startswith('#')]
+    return lines * copies
+
+
+def edge_case_sections(count: int, seed: int) -> List[List[str]]:
+    """由边界用例行随机组成的短章节"""
+    rng = random.Random(seed)
+    return [[rng.choice(EDGE_CASE_LINES) for _ in range(rng.randint(0, 15))] for _ in range(count)]
+
+
+def time_split(processor: JsonProcessor, lines: List[str], repeat: int) -> Tuple[List[Dict[str, Any]], float]:
+    """返回 (拆分结果, 最短耗时)"""
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        blocks = processor._split_content_with_order(lines)
+        best = min(best, time.perf_counter() - start)
+    return blocks, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JsonProcessor 行拆分基准测试")
+    parser.add_argument('--pages', type=int, default=60, help="合成论文页数")
+    parser.add_argument('--copies', type=int, default=20, help="章节由多少份论文正文拼接而成")
+    parser.add_argument('--edge-cases', type=int, default=5000, help="随机边界用例章节数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最小值")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    current, legacy = JsonProcessor(), LegacyJsonProcessor()
+    lines = synthetic_section(args.pages, args.copies)
+    blocks, seconds = time_split(current, lines, args.repeat)
+    legacy_blocks, legacy_seconds = time_split(legacy, lines, args.repeat)
+
+    failures = []
+    if blocks != legacy_blocks:
+        failures.append("合成章节的拆分结果与之前的实现不一致")
+    mismatched = [section for section in edge_case_sections(args.edge_cases, args.seed)
+                  if current._split_content_with_order(section) != legacy._split_content_with_order(section)]
+    if mismatched:
+        failures.append(f"{len(mismatched)}/{args.edge_cases} 个边界用例的拆分结果与之前的实现不一致，"
+                        f"例如: {mismatched[0]!r}")
+
+    counts = Counter(block['type'] for block in blocks)
+    counts['captioned'] = sum(1 for block in blocks if 'caption' in block)
+    speedup = legacy_seconds / seconds if seconds else 0.0
+    print(f"章节行数: {len(lines)}, 块数: {len(blocks)}")
+    print("块统计: " + ", ".join(f"{key}={value}" for key, value in sorted(counts.items())))
+    print(f"{'实现':<10}{'耗时(ms)':>10}{'M行/秒':>10}")
+    print(f"{'legacy':<10}{legacy_seconds * 1000:>10.1f}{len(lines) / legacy_seconds / 1e6:>10.2f}")
+    print(f"{'current':<10}{seconds * 1000:>10.1f}{len(lines) / seconds / 1e6:>10.2f}")
+    print(f"\n加速比: {speedup:.2f}x，边界用例 {args.edge_cases} 个")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'lines': len(lines), 'blocks': len(blocks), 'counts': dict(counts),
+                       'seconds': seconds, 'legacy_seconds': legacy_seconds, 'speedup': speedup,
+                       'failures': failures}, f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"\n[失败] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
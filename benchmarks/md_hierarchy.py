@@ -0,0 +1,105 @@
+"""
+Markdown章节层级解析基准测试
+
+生成包含指定数量章节的合成论文（多级编号，部分小节标题被PDF解析误识别为正文行），
+测量 MarkdownProcessor.parse 的耗时随章节数的变化。每章节耗时应大致不变（线性扩展），
+找回的遗漏章节应全部按编号数值顺序出现。
+
+用法: python -m benchmarks.md_hierarchy --sections 250 500 1000 2000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from processor.md_processor import MarkdownProcessor
+
+
+def synthetic_markdown(sections: int, subsections: int = 12, gap_ratio: float = 0.1, seed: int = 0) -> str:
+    """
+    生成合成论文
+
+    每个一级章节下有 subsections 个二级小节（超过9个，覆盖 "10" 与 "9" 的排序），
+    约 gap_ratio 的小节标题以不带 # 的正文行出现，模拟PDF解析遗漏的标题。
+    """
+    rng = random.Random(seed)
+    lines = ["# A Synthetic Paper For Benchmarking", "", "Author One, Author Two", "",
+             "# Abstract", "", "This paper is synthetic.", ""]
+    top = max(1, sections // (subsections + 1))
+    for i in range(1, top + 1):
+        lines += [f"# {i} SECTION {i}", "", f"Introduction of section {i}.", ""]
+        for j in range(1, subsections + 1):
+            title = f"{i}.{j} SUBSECTION {i} {j}"
+            # 首个小节保留标题，被遗漏的标题出现在前一小节的正文中
+            if j > 1 and rng.random() < gap_ratio:
+                lines += [title, ""]
+            else:
+                lines += [f"## {title}", ""]
+            lines += [f"Paragraph {k} of subsection {i}.{j} with some text." for k in range(2)] + [""]
+    lines += ["# References", "", "[1] Someone. A reference. 2020.", ""]
+    return "\n".join(lines)
+
+
+def count_sections(sections: List[Dict[str, Any]]) -> int:
+    return sum(1 + count_sections(s.get('children', [])) for s in sections)
+
+
+def is_ordered(sections: List[Dict[str, Any]]) -> bool:
+    """检查各级子章节是否按编号数值递增"""
+    for section in sections:
+        children = section.get('children', [])
+        keys = [MarkdownProcessor.section_key(c['number']) for c in children if c['number']]
+        if keys != sorted(keys) or not is_ordered(children):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown章节层级解析基准测试")
+    parser.add_argument('--sections', type=int, nargs='+', default=[250, 500, 1000, 2000], help="章节数")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最小值")
+    parser.add_argument('--max-growth', type=float, default=2.0,
+                        help="最大与最小规模的每章节耗时之比超过该值时失败")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    processor = MarkdownProcessor()
+    results = []
+    print(f"{'章节数':>8}{'解析后章节':>12}{'耗时(ms)':>12}{'每章节(us)':>14}{'顺序正确':>10}")
+    for count in args.sections:
+        content = synthetic_markdown(count)
+        timings = []
+        for _ in range(max(1, args.repeat)):
+            start = time.perf_counter()
+            parsed = processor.parse(content)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        total = count_sections(parsed['sections'])
+        ordered = is_ordered(parsed['sections'])
+        results.append({'sections': count, 'parsed_sections': total, 'seconds': best,
+                        'us_per_section': best / total * 1e6, 'ordered': ordered})
+        print(f"{count:>8}{total:>12}{best * 1000:>12.1f}{best / total * 1e6:>14.1f}{str(ordered):>10}")
+
+    per_section = [r['us_per_section'] for r in results]
+    growth = per_section[-1] / per_section[0] if per_section[0] else 0.0
+    print(f"\n每章节耗时增长: {growth:.2f}x（{args.sections[0]} -> {args.sections[-1]} 章节）")
+
+    failures = []
+    if growth > args.max_growth:
+        failures.append(f"每章节耗时增长 {growth:.2f}x 超过 {args.max_growth}x，解析不是线性扩展")
+    if not all(r['ordered'] for r in results):
+        failures.append("子章节没有按编号数值顺序排列")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'growth': growth, 'failures': failures}, f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"\n[失败] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Markdown流式解析内存基准测试
+
+生成指定页数的合成论文（默认350页，相当于一篇博士论文），比较两种方式的峰值内存（tracemalloc）:
+  - whole:  read_text 读入整个文件后 parse，再 json.dumps 整个结果写出
+  - stream: MarkdownProcessor.process 逐行读取，顶层章节解析完成后立即写出
+并检查两者的输出完全相同。
+
+用法: python -m benchmarks.md_streaming --pages 350
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import generate_markdown
+from processor.md_processor import MarkdownProcessor
+
+
+def run_whole(markdown_path: Path, output_path: Path) -> None:
+    content = markdown_path.read_text(encoding='utf-8')
+    result = MarkdownProcessor().parse(content)
+    output_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def run_stream(markdown_path: Path, output_path: Path) -> None:
+    MarkdownProcessor().process(str(markdown_path), str(output_path))
+
+
+def measure(fn, *args) -> tuple:
+    """返回 (峰值内存字节数, 耗时秒数)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    # 遗漏章节的提示信息不计入结果
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown流式解析内存基准测试")
+    parser.add_argument('--pages', type=int, default=350, help="合成论文页数")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        markdown_path = tmp / 'paper.md'
+        markdown_path.write_text(generate_markdown(args.pages), encoding='utf-8')
+        size = markdown_path.stat().st_size
+
+        results = {'pages': args.pages, 'markdown_bytes': size}
+        for name, fn in (('whole', run_whole), ('stream', run_stream)):
+            peak, seconds = measure(fn, markdown_path, tmp / f'{name}.json')
+            results[name] = {'peak_bytes': peak, 'seconds': seconds}
+        identical = (tmp / 'whole.json').read_bytes() == (tmp / 'stream.json').read_bytes()
+        results['identical'] = identical
+
+    print(f"合成论文: {args.pages} 页, Markdown {size / 1e6:.1f} MB")
+    print(f"{'方式':<10}{'峰值内存(MB)':>14}{'相对文件大小':>14}{'耗时(s)':>10}")
+    for name in ('whole', 'stream'):
+        peak, seconds = results[name]['peak_bytes'], results[name]['seconds']
+        print(f"{name:<10}{peak / 1e6:>14.1f}{peak / size:>13.1f}x{seconds:>10.2f}")
+    print(f"输出一致: {identical}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+处理器基准测试套件
+
+对不同规模的合成论文依次运行各处理器，记录每个处理器的耗时：
+  md2json / md2json_slides / json_process / tiling / translate / extra_info /
+  md_restore / rag_markdown / find_matching_content
+分块阶段使用 FakeEmbeddings、翻译和信息补充阶段使用 FakeLLMClient，结果只反映处理器自身的开销，
+且相同参数的多次运行处理的是完全相同的输入。
+
+结果以JSON写出，下次运行时用 --compare 指定上次的结果文件，
+耗时超过基线 --max-regression 倍的处理器视为回退，以非零状态退出。
+
+用法（在仓库根目录运行，翻译等处理器按相对路径读取提示词）:
+    python -m benchmarks.processors --pages 10 60 300 --output bench.json
+    python -m benchmarks.processors --pages 10 60 300 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.fakes import FakeEmbeddings, FakeLLMClient, install_fake_embeddings
+from benchmarks.synthetic import generate_markdown
+from processor.extra_info_processor import ExtraInfoProcessor
+from processor.json_processor import JsonProcessor
+from processor.md_processor import MarkdownProcessor
+from processor.md_processor_slides import MarkdownProcessorSlides
+from processor.md_restore_processor import RestoreProcessor
+from processor.rag_processor import RagProcessor
+from processor.tiling_processor import TilingProcessor
+from processor.translate_processor import TranslateProcessor
+from util.checkpoint import copy_document
+
+# find_matching_content 的查询次数
+DEFAULT_QUERIES = 100
+
+# 基准测试使用的论文ID
+PAPER_ID = "benchmark_paper"
+
+
+def measure(run: Callable[[Any], Any], make_input: Callable[[], Any] = lambda: None,
+            repeat: int = 3) -> Tuple[float, Any]:
+    """
+    重复运行取最短耗时，返回 (秒数, 最后一次的结果)
+
+    make_input 在计时之外为每次运行准备独立的输入（会修改文档的处理器需要拿到新副本）。
+    处理器的 print 输出被丢弃，不计入耗时的波动。
+    """
+    best, result = float('inf'), None
+    for _ in range(max(1, repeat)):
+        data = make_input()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = run(data)
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _walk_sections(sections: List[Dict[str, Any]]):
+    for section in sections:
+        yield section
+        yield from _walk_sections(section.get('children') or [])
+
+
+def _count_blocks(data: Dict[str, Any]) -> int:
+    return sum(len(section.get('content') or []) for section in _walk_sections(data.get('sections') or []))
+
+
+def build_queries(rag_tree: Dict[str, Any], count: int, seed: int) -> List[Tuple[str, str]]:
+    """
+    从RAG树中取查询: [(文本片段, 元素类型)]
+
+    约三分之二为正文片段（取段落中间的一句，需要扫描到该段落才能命中），
+    其余为章节标题和不存在的文本（需要扫描整棵树）。
+    """
+    rng = random.Random(seed)
+    texts, titles = [], []
+    for section in _walk_sections(rag_tree.get('sections') or []):
+        titles.append(section.get('title', ''))
+        for node in section.get('content') or []:
+            if node.get('type') == 'text' and node.get('content'):
+                texts.append(node['content'])
+    queries = []
+    for i in range(count):
+        kind = i % 6
+        if kind < 4 and texts:
+            sentences = [s for s in rng.choice(texts).split('. ') if s]
+            queries.append((sentences[len(sentences) // 2], 'text'))
+        elif kind == 4 and titles:
+            queries.append((rng.choice(titles), 'title'))
+        else:
+            queries.append((f"no such sentence {i} in the benchmark paper", 'text'))
+    return queries
+
+
+def prepare_data_manager(rag_tree: Dict[str, Any], work_dir: Path):
+    """写出RAG树，返回当前论文为基准论文的 DataManager"""
+    # 数据管理器依赖界面框架，只在运行该项时导入
+    from util.data_manager import DataManager, get_paths
+    from util.pdf_index import PdfHashIndex, PDF_INDEX_FILE
+
+    tree_path = work_dir / get_paths(PAPER_ID)['rag_tree']
+    tree_path.parent.mkdir(parents=True, exist_ok=True)
+    tree_path.write_text(json.dumps(rag_tree, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    # 不调用 __init__，避免创建处理管线和AI管理器；只设置查找用到的状态
+    manager = DataManager.__new__(DataManager)
+    manager.output_dir = str(work_dir)
+    manager.papers_index = [{'id': PAPER_ID}]
+    manager.current_paper = {'id': PAPER_ID}
+    manager.pdf_index = PdfHashIndex(work_dir / PDF_INDEX_FILE)
+    return manager
+
+
+def run_queries(manager, queries: List[Tuple[str, str]]) -> int:
+    """依次执行查询（每次查询都按界面中的调用方式重新加载RAG树），返回命中数"""
+    hits = 0
+    for fragment, element_type in queries:
+        result, _ = manager.find_matching_content(fragment, lang='en', element_type=element_type)
+        hits += result is not None
+    return hits
+
+
+def run_size(pages: int, args: argparse.Namespace, work_dir: Path) -> List[Dict[str, Any]]:
+    """对一种规模的合成论文运行全部处理器"""
+    markdown = generate_markdown(pages, seed=args.seed, sections=args.sections, depth=args.depth,
+                                 figure_ratio=args.figure_ratio, table_ratio=args.table_ratio,
+                                 formula_ratio=args.formula_ratio, long_ratio=args.long_ratio)
+    embeddings = FakeEmbeddings()
+    restore_embeddings = install_fake_embeddings(embeddings)
+    results = []
+
+    def record(name: str, seconds: float, units: int, **extra):
+        results.append({'pages': pages, 'processor': name, 'seconds': seconds, 'units': units, **extra})
+
+    try:
+        seconds, parsed = measure(MarkdownProcessor().parse, lambda: markdown, args.repeat)
+        record('md2json', seconds, len(list(_walk_sections(parsed['sections']))))
+
+        seconds, slides = measure(MarkdownProcessorSlides().parse, lambda: markdown, args.repeat)
+        record('md2json_slides', seconds, len(list(_walk_sections(slides['sections']))))
+
+        seconds, processed = measure(JsonProcessor().process_data, lambda: copy_document(parsed), args.repeat)
+        record('json_process', seconds, _count_blocks(processed))
+
+        embeddings.texts = 0
+        seconds, tiled = measure(TilingProcessor().process_data, lambda: copy_document(processed), args.repeat)
+        record('tiling', seconds, _count_blocks(tiled), embedded_texts=embeddings.texts // max(1, args.repeat))
+
+        translator = TranslateProcessor()
+        translator.llm = FakeLLMClient()
+        seconds, translated = measure(translator.process_data, lambda: copy_document(tiled), args.repeat)
+        record('translate', seconds, translator.llm.calls // max(1, args.repeat))
+
+        extra_info = ExtraInfoProcessor()
+        extra_info.llm = FakeLLMClient()
+        seconds, enriched = measure(extra_info.process_data, lambda: copy_document(translated), args.repeat)
+        record('extra_info', seconds, extra_info.llm.calls // max(1, args.repeat))
+
+        restorer = RestoreProcessor()
+        seconds, _ = measure(lambda data: restorer.process_data(data, work_dir / 'final_en.md', work_dir / 'final_zh.md'),
+                             lambda: enriched, args.repeat)
+        record('md_restore', seconds, _count_blocks(enriched))
+
+        # RAG树的重构在计时之外完成，只计 _generate_markdown
+        rag = RagProcessor()
+        rag_input = copy_document(enriched)
+        rag_input['sections'] = rag._filter_sections(rag_input.get('sections', []))
+        rag_tree = rag._restructure_tree(rag_input)
+        seconds, _ = measure(lambda tree: rag._generate_markdown(tree, str(work_dir / 'final_rag.md')),
+                             lambda: rag_tree, args.repeat)
+        record('rag_markdown', seconds, len(rag_tree.get('key_map', {})))
+
+        queries = build_queries(rag_tree, args.queries, args.seed)
+        seconds, hits = measure(lambda manager: run_queries(manager, queries),
+                                lambda: prepare_data_manager(rag_tree, work_dir), args.repeat)
+        record('find_matching_content', seconds, len(queries), hits=hits)
+    finally:
+        restore_embeddings()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, max_regression: float,
+            min_delta: float) -> List[str]:
+    """与基线结果比较，打印耗时比值，返回回退的项（耗时增加不足 min_delta 秒的不计，避免计时噪声）"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['pages'], r['processor']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n与基线比较: {baseline_path}")
+    print(f"{'页数':>6}  {'处理器':<24}{'基线(ms)':>10}{'本次(ms)':>10}{'比值':>8}")
+    for result in results:
+        base = baseline.get((result['pages'], result['processor']))
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        flag = ''
+        if ratio > max_regression and result['seconds'] - base['seconds'] > min_delta:
+            flag = '  <- 回退'
+            regressions.append(f"{result['pages']}页 {result['processor']}: {ratio:.2f}x")
+        print(f"{result['pages']:>6}  {result['processor']:<24}{base['seconds'] * 1000:>10.1f}"
+              f"{result['seconds'] * 1000:>10.1f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="处理器基准测试套件")
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 60, 300], help="合成论文页数（每个值一种规模）")
+    parser.add_argument('--sections', type=int, default=None, help="一级章节数，默认每6页一个")
+    parser.add_argument('--depth', type=int, default=3, help="章节编号的最大层级")
+    parser.add_argument('--figure-ratio', type=float, default=0.08, help="每段之后插入图片的概率")
+    parser.add_argument('--table-ratio', type=float, default=0.04, help="每段之后插入表格的概率")
+    parser.add_argument('--formula-ratio', type=float, default=0.06, help="每段之后插入公式的概率")
+    parser.add_argument('--long-ratio', type=float, default=0.1, help="长段落（需要分块）的概率")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="find_matching_content 查询次数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最小值")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    parser.add_argument('--compare', type=str, default=None, help="与之前写出的结果文件比较")
+    parser.add_argument('--max-regression', type=float, default=1.5, help="耗时超过基线该倍数时视为回退")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help="耗时增加不超过该毫秒数时不视为回退")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            work_dir = Path(tmp) / f"{pages}p"
+            work_dir.mkdir()
+            results.extend(run_size(pages, args, work_dir))
+
+    print(f"{'页数':>6}  {'处理器':<24}{'耗时(ms)':>10}{'单元数':>8}{'每单元(us)':>12}")
+    for result in results:
+        per_unit = result['seconds'] / result['units'] * 1e6 if result['units'] else 0.0
+        print(f"{result['pages']:>6}  {result['processor']:<24}{result['seconds'] * 1000:>10.1f}"
+              f"{result['units']:>8}{per_unit:>12.1f}")
+
+    regressions = compare(results, args.compare, args.max_regression, args.min_delta_ms / 1000) if args.compare else []
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, ensure_ascii=False, indent=2)
+
+    for regression in regressions:
+        print(f"[回退] {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+合成论文生成器：生成与 PDFProcessor 输出格式相近的Markdown论文，用于性能基准测试
+"""
+import random
+from typing import List, Optional
+
+# 每页大约包含的正文段落数（按双栏论文约500词/页估算）
+PARAGRAPHS_PER_PAGE = 5
+
+_WORDS = (
+    "model attention layer training dataset retrieval memory context token sequence "
+    "embedding transformer evaluation baseline performance results method approach "
+    "benchmark episodic segmentation boundary language large inference latency "
+    "improve propose demonstrate experiment analysis parameter learning structure"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(12, 28))]
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + '.'
+
+
+def _paragraph(rng: random.Random, scale: int = 1) -> str:
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(4, 7) * scale))
+
+
+def generate_markdown(pages: int = 60, seed: int = 0, sections: Optional[int] = None, depth: int = 2,
+                      figure_ratio: float = 0.08, table_ratio: float = 0.04, formula_ratio: float = 0.06,
+                      long_ratio: float = 0.0) -> str:
+    """
+    生成指定页数的合成论文Markdown
+
+    包含标题、作者、摘要、多级编号章节、图片及图注、HTML表格、行间公式和参考文献。
+    默认参数生成的内容保持不变，各基准测试的结果可以跨版本比较。
+
+    Args:
+        pages: 论文页数，决定正文段落数
+        seed: 随机种子，相同参数生成相同内容
+        sections: 一级章节数，默认每6页一个章节
+        depth: 章节编号的最大层级（1 为只有一级章节；二级小节每8段一个，更深一级的间隔减半）
+        figure_ratio: 每段正文之后插入图片及图注的概率
+        table_ratio: 每段正文之后插入表格及表注的概率
+        formula_ratio: 每段正文之后插入行间公式的概率
+        long_ratio: 正文段落为长段落（句子数为普通段落的4倍，超过分块阶段的最大长度）的概率
+    """
+    rng = random.Random(seed)
+    lines: List[str] = [
+        "# A Synthetic Study of Episodic Memory for Long Context Models",
+        "",
+        "Alice Zhang, Bob Li",
+        "University of Somewhere",
+        "",
+        "# ABSTRACT",
+        "",
+        _paragraph(rng),
+        "",
+    ]
+
+    paragraphs = pages * PARAGRAPHS_PER_PAGE
+    sections = sections or max(1, pages // 6)
+    per_section = max(1, paragraphs // sections)
+    # 各级小节的间隔段落数: {层级: 间隔}，层级2为8段，每深一级减半（至少1段）
+    intervals = {level: max(1, 8 >> (level - 2)) for level in range(2, depth + 1)}
+    figure = table = 0
+
+    for sec in range(1, sections + 1):
+        lines += [f"# {sec} {rng.choice(_WORDS).upper()} {rng.choice(_WORDS).upper()}", ""]
+        numbers = [sec]
+        for i in range(per_section):
+            # 每个章节分成若干小节，间隔整除时开始最浅的一级（需要已有上一级小节）
+            level = next((level for level, interval in intervals.items()
+                          if i and i % interval == 0 and len(numbers) >= level - 1), None)
+            if level is not None:
+                # 同级小节序号递增，开始新的上一级小节后从1重新编号
+                number = numbers[level - 1] + 1 if len(numbers) >= level else 1
+                numbers = numbers[:level - 1] + [number]
+                lines += [f"{'#' * level} {'.'.join(map(str, numbers))} "
+                          f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)}", ""]
+            long = long_ratio > 0 and rng.random() < long_ratio
+            lines += [_paragraph(rng, 4 if long else 1), ""]
+            kind = rng.random()
+            if kind < figure_ratio:
+                figure += 1
+                lines += [f"![](images/{seed}_{figure:04d}.jpg)", f"Figure {figure}: {_sentence(rng)}", ""]
+            elif kind < figure_ratio + table_ratio:
+                table += 1
+                cells = ''.join(f"<td>{rng.random():.3f}</td>" for _ in range(4))
+                lines += [
+                    f"Table {table}: {_sentence(rng)}",
+                    f"<html><body><table><tr>{cells}</tr><tr>{cells}</tr></table></body></html>",
+                    "",
+                ]
+            elif kind < figure_ratio + table_ratio + formula_ratio:
+                lines += [f"$$ \\mathcal{{L}}_{{{i}}} = \\sum_{{t=1}}^{{T}} \\log p(x_t \\mid x_{{<t}}) $$", ""]
+
+    lines += ["# REFERENCES", ""]
+    for ref in range(1, pages + 1):
+        lines.append(f"[{ref}] {_sentence(rng)}")
+    return '\n'.join(lines) + '\n'
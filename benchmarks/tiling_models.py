@@ -0,0 +1,195 @@
+"""
+TextTiling 分块模型离线评估
+
+用不同的嵌入模型对同一批文本块做 TextTiling 分段，以参考模型（默认为检索使用的 bge-m3）的分段为准，比较：
+  - 边界一致程度：边界的精确率/召回率/F1（相差不超过 --tolerance 个元素视为同一边界）、Pk、WindowDiff
+  - 耗时：计算嵌入和深度分数的时间，以及相对参考模型的加速比
+合成文本还有真实的话题边界，同时报告各模型相对真实边界的F1。
+
+文本块来自已处理论文的 processed.json（JSON处理阶段的产物，即分块阶段的输入），
+未指定论文时使用由话题块组成的合成文本。模型名称为 HuggingFace 模型名、hashing，
+或 fake（基准测试用的确定性替身，用于在没有模型的环境中检查本脚本）。
+
+用法:
+    python -m benchmarks.tiling_models --models hashing sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2
+    python -m benchmarks.tiling_models --papers static/output/*/processed.json --models hashing
+"""
+import argparse
+import bisect
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.tiling_segmentation import synthetic_topics
+from processor.tiling_processor import SEGMENTATION_DP, SEGMENTATION_GREEDY, TilingProcessor
+from util.config import EMBEDDING_MODEL_NAME, HASHING_EMBEDDING_MODEL, EmbeddingModel
+
+# 基准测试替身的模型名称
+FAKE_MODEL = "fake"
+
+
+def paper_blocks(paths: List[str], processor: TilingProcessor) -> Iterator[Tuple[List[str], None]]:
+    """按分块阶段的规则取出需要 TextTiling 的文本块，返回 (元素列表, None)"""
+    def walk(sections):
+        for section in sections:
+            if section.get('type') in ['abstract', 'references']:
+                continue
+            for item in processor._merge_small_text_blocks(section.get('content', [])):
+                if item['type'] == 'text' and len(item['content']) > processor.max_length:
+                    elements, _ = processor._split_elements(item['content'])
+                    if len(elements) >= processor.window_size + 2:
+                        yield elements, None
+            yield from walk(section.get('children') or [])
+
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from walk(json.load(f).get('sections') or [])
+
+
+def synthetic_blocks(count: int, seed: int) -> Iterator[Tuple[List[str], List[int]]]:
+    """合成文本块，返回 (元素列表, 真实边界)"""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield synthetic_topics(rng.randint(30, 150), seed=seed * 100003 + i)
+
+
+def load_model(name: str):
+    """创建不经过嵌入缓存和批处理服务的模型，返回 (模型, 加载秒数)"""
+    start = time.perf_counter()
+    model = FakeEmbeddings() if name == FAKE_MODEL else EmbeddingModel.create(name, cached=False)
+    return model, time.perf_counter() - start
+
+
+def boundary_scores(predicted: List[int], reference: List[int], tolerance: int) -> Tuple[int, int, int]:
+    """按容差一一匹配边界，返回 (匹配数, 预测边界数, 参考边界数)"""
+    matched, used = 0, set()
+    for boundary in predicted:
+        for offset in sorted(range(-tolerance, tolerance + 1), key=abs):
+            if boundary + offset in reference and boundary + offset not in used:
+                used.add(boundary + offset)
+                matched += 1
+                break
+    return matched, len(predicted), len(reference)
+
+
+def window_errors(predicted: List[int], reference: List[int], elements: int, k: int) -> Tuple[int, int, int]:
+    """
+    返回 (Pk 的错误窗口数, WindowDiff 的错误窗口数, 窗口数)
+
+    边界 b 表示在第 b 个元素之后分段；宽度为 k 的窗口 [i, i+k) 中，
+    Pk 比较两端元素是否在同一段，WindowDiff 比较窗口内的边界数。
+    """
+    predicted, reference = sorted(predicted), sorted(reference)
+    pk = wd = 0
+    windows = max(0, elements - k)
+    for i in range(windows):
+        p = bisect.bisect_left(predicted, i + k) - bisect.bisect_left(predicted, i)
+        r = bisect.bisect_left(reference, i + k) - bisect.bisect_left(reference, i)
+        pk += (p == 0) != (r == 0)
+        wd += p != r
+    return pk, wd, windows
+
+
+def evaluate(blocks: List[Tuple[List[str], Optional[List[int]]]], name: str, args: argparse.Namespace,
+             reference: Optional[List[List[int]]] = None) -> Dict[str, Any]:
+    """用一个模型对全部文本块分段，返回分段结果、耗时和与参考分段的一致程度"""
+    model, load_seconds = load_model(name)
+    EmbeddingModel._instances[name] = model
+    processor = TilingProcessor(min_length=args.min_length, max_length=args.max_length,
+                                segmentation=args.segmentation, embedding_model=name)
+    segmentations, seconds = [], 0.0
+    for elements, _ in blocks:
+        start = time.perf_counter()
+        boundaries = processor._segment_boundaries(elements)
+        seconds += time.perf_counter() - start
+        # 最后一个边界是文本块的结尾，不参与比较
+        segmentations.append(boundaries[:-1])
+
+    elements = sum(len(block) for block, _ in blocks)
+    result = {'model': name, 'load_seconds': load_seconds, 'seconds': seconds,
+              'elements_per_second': elements / seconds if seconds else 0.0,
+              'boundaries': sum(len(b) for b in segmentations)}
+    if reference is not None:
+        result.update(_agreement(segmentations, reference, blocks, args.tolerance))
+    truth = [true for _, true in blocks]
+    if all(true is not None for true in truth):
+        matched, predicted, expected = map(sum, zip(*(boundary_scores(p, t, args.tolerance)
+                                                       for p, t in zip(segmentations, truth))))
+        result['truth_f1'] = _f1(matched, predicted, expected)
+    return {'result': result, 'segmentations': segmentations}
+
+
+def _agreement(segmentations: List[List[int]], reference: List[List[int]],
+               blocks: List[Tuple[List[str], Any]], tolerance: int) -> Dict[str, float]:
+    matched = predicted = expected = pk = wd = windows = 0
+    for (elements, _), ours, theirs in zip(blocks, segmentations, reference):
+        m, p, e = boundary_scores(ours, theirs, tolerance)
+        matched, predicted, expected = matched + m, predicted + p, expected + e
+        # 窗口宽度取参考分段平均段长的一半
+        k = max(1, round(len(elements) / (len(theirs) + 1) / 2))
+        block_pk, block_wd, block_windows = window_errors(ours, theirs, len(elements), k)
+        pk, wd, windows = pk + block_pk, wd + block_wd, windows + block_windows
+    return {
+        'precision': matched / predicted if predicted else 1.0,
+        'recall': matched / expected if expected else 1.0,
+        'f1': _f1(matched, predicted, expected),
+        'pk': pk / windows if windows else 0.0,
+        'window_diff': wd / windows if windows else 0.0
+    }
+
+
+def _f1(matched: int, predicted: int, expected: int) -> float:
+    if not predicted and not expected:
+        return 1.0
+    return 2 * matched / (predicted + expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TextTiling 分块模型离线评估")
+    parser.add_argument('--reference', type=str, default=EMBEDDING_MODEL_NAME, help="参考模型")
+    parser.add_argument('--models', type=str, nargs='+', default=[HASHING_EMBEDDING_MODEL], help="候选模型")
+    parser.add_argument('--papers', type=str, nargs='*', default=None, help="processed.json 文件，不指定时使用合成文本")
+    parser.add_argument('--blocks', type=int, default=40, help="合成文本块数")
+    parser.add_argument('--min-length', type=int, default=500, help="文本块最小长度")
+    parser.add_argument('--max-length', type=int, default=2500, help="文本块最大长度")
+    parser.add_argument('--segmentation', type=str, default=SEGMENTATION_DP,
+                        choices=[SEGMENTATION_DP, SEGMENTATION_GREEDY], help="切分方式")
+    parser.add_argument('--tolerance', type=int, default=1, help="边界匹配的容差（元素数）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    layout = TilingProcessor(min_length=args.min_length, max_length=args.max_length, embedding_model=FAKE_MODEL)
+    blocks = list(paper_blocks(args.papers, layout) if args.papers else synthetic_blocks(args.blocks, args.seed))
+    if not blocks:
+        print("没有需要分段的文本块")
+        sys.exit(1)
+    print(f"文本块 {len(blocks)} 个，共 {sum(len(b) for b, _ in blocks)} 个元素\n")
+
+    reference = evaluate(blocks, args.reference, args)
+    results = [reference['result']]
+    for name in args.models:
+        results.append(evaluate(blocks, name, args, reference['segmentations'])['result'])
+
+    base_seconds = reference['result']['seconds']
+    has_truth = 'truth_f1' in reference['result']
+    header = f"{'模型':<48}{'加载(s)':>9}{'分段(s)':>9}{'加速比':>8}{'F1':>7}{'Pk':>7}{'WD':>7}"
+    print(header + (f"{'真实F1':>8}" if has_truth else ''))
+    for r in results:
+        r['speedup'] = base_seconds / r['seconds'] if r['seconds'] else 0.0
+        line = (f"{r['model']:<48}{r['load_seconds']:>9.2f}{r['seconds']:>9.2f}{r['speedup']:>7.1f}x"
+                f"{r.get('f1', 1.0):>7.2f}{r.get('pk', 0.0):>7.3f}{r.get('window_diff', 0.0):>7.3f}")
+        print(line + (f"{r['truth_f1']:>8.2f}" if has_truth else ''))
+    print(f"\nF1/Pk/WD 以 {args.reference} 的分段为参考（Pk、WD 越低越一致），边界容差 {args.tolerance} 个元素")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'blocks': len(blocks), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
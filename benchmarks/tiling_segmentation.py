@@ -0,0 +1,135 @@
+"""
+TextTiling 切分方式基准测试
+
+生成由若干话题块组成的长文本（每个话题有自己的用词，话题之间的位置即真实边界），
+用 FakeEmbeddings 计算一次深度分数后，分别以贪心（greedy）和动态规划（dp）方式切分，比较：
+  - 切分耗时
+  - 超出 min_length/max_length 约束的段数与字符数
+  - 段落边界处的深度分数之和
+  - 真实话题边界的召回率（相差不超过一个元素即视为命中）
+动态规划的约束违反不应多于贪心，深度分数之和不应低于贪心，否则以非零状态退出。
+
+用法: python -m benchmarks.tiling_segmentation --sentences 1000 10000 --output tiling.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from itertools import accumulate
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.fakes import FakeEmbeddings, install_fake_embeddings
+from benchmarks.synthetic import _WORDS
+from processor.tiling_processor import SEGMENTATION_DP, SEGMENTATION_GREEDY, TilingProcessor
+
+
+def synthetic_topics(sentences: int, seed: int = 0, min_topic: int = 8,
+                     max_topic: int = 40) -> Tuple[List[str], List[int]]:
+    """
+    生成话题块组成的句子序列，返回 (句子列表, 真实边界列表)
+
+    真实边界为每个话题最后一个句子的索引（不含全文最后一句）。
+    每个句子约一半的词来自所属话题的专有词表，其余为各话题共用的词。
+    """
+    rng = random.Random(seed)
+    elements, boundaries = [], []
+    topic = 0
+    while len(elements) < sentences:
+        vocabulary = [f"topic{topic}term{k}" for k in range(12)]
+        for _ in range(min(rng.randint(min_topic, max_topic), sentences - len(elements))):
+            words = [rng.choice(vocabulary) if rng.random() < 0.5 else rng.choice(_WORDS)
+                     for _ in range(rng.randint(12, 28))]
+            words[0] = words[0].capitalize()
+            elements.append(' '.join(words) + '.')
+        boundaries.append(len(elements) - 1)
+        topic += 1
+    return elements, boundaries[:-1]
+
+
+def evaluate(processor: TilingProcessor, boundaries: List[int], prefix_lengths: List[int],
+             potential_boundaries, depth_scores: List[float], true_boundaries: List[int]) -> Dict[str, Any]:
+    """统计一种切分结果的约束违反、深度分数和边界召回"""
+    lengths, start = [], 0
+    for boundary in boundaries:
+        lengths.append(prefix_lengths[boundary + 1] - prefix_lengths[start])
+        start = boundary + 1
+    violations = [max(0, processor.min_length - n) + max(0, n - processor.max_length) for n in lengths]
+    chosen = set(boundaries[:-1])
+    hits = sum(1 for b in true_boundaries if chosen & {b - 1, b, b + 1})
+    return {
+        'segments': len(lengths),
+        'violating_segments': sum(1 for v in violations if v),
+        'violation_chars': sum(violations),
+        'boundary_depth': sum(depth_scores[b] for b in chosen if b in potential_boundaries),
+        'recall': hits / len(true_boundaries) if true_boundaries else 1.0,
+        'min_length': min(lengths),
+        'max_length': max(lengths),
+        'mean_length': sum(lengths) / len(lengths)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TextTiling 切分方式基准测试")
+    parser.add_argument('--sentences', type=int, nargs='+', default=[1000, 10000], help="句子数（每个值一种规模）")
+    parser.add_argument('--min-length', type=int, default=500, help="文本块最小长度")
+    parser.add_argument('--max-length', type=int, default=2500, help="文本块最大长度")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最小值")
+    parser.add_argument('--output', type=str, default=None, help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    restore_embeddings = install_fake_embeddings(FakeEmbeddings())
+    results, failures = [], []
+    try:
+        for count in args.sentences:
+            elements, true_boundaries = synthetic_topics(count, seed=args.seed)
+            # 深度分数只计算一次，计时只包含切分本身
+            depth_scores, potential_boundaries = TilingProcessor()._depth_scores(elements)
+            prefix_lengths = [0, *accumulate(len(element) for element in elements)]
+
+            by_mode = {}
+            for mode in (SEGMENTATION_GREEDY, SEGMENTATION_DP):
+                processor = TilingProcessor(min_length=args.min_length, max_length=args.max_length,
+                                            segmentation=mode)
+                segment = processor._dp_boundaries if mode == SEGMENTATION_DP else processor._greedy_boundaries
+                best = float('inf')
+                for _ in range(max(1, args.repeat)):
+                    start = time.perf_counter()
+                    boundaries = segment(prefix_lengths, potential_boundaries, depth_scores)
+                    best = min(best, time.perf_counter() - start)
+                by_mode[mode] = {'sentences': count, 'segmentation': mode, 'seconds': best,
+                                 **evaluate(processor, boundaries, prefix_lengths, potential_boundaries,
+                                            depth_scores, true_boundaries)}
+                results.append(by_mode[mode])
+
+            greedy, dp = by_mode[SEGMENTATION_GREEDY], by_mode[SEGMENTATION_DP]
+            if dp['violation_chars'] > greedy['violation_chars']:
+                failures.append(f"{count}句: dp 超出约束 {dp['violation_chars']} 字符，多于 greedy 的 "
+                                f"{greedy['violation_chars']}")
+            elif dp['violation_chars'] == greedy['violation_chars'] and \
+                    dp['boundary_depth'] < greedy['boundary_depth'] - 1e-9:
+                failures.append(f"{count}句: dp 深度分数和 {dp['boundary_depth']:.3f} 低于 greedy 的 "
+                                f"{greedy['boundary_depth']:.3f}")
+    finally:
+        restore_embeddings()
+
+    print(f"{'句子数':>8}  {'方式':<8}{'耗时(ms)':>10}{'段数':>6}{'违反段':>8}{'违反字符':>10}"
+          f"{'深度和':>10}{'召回':>8}{'最短':>7}{'最长':>7}{'平均':>8}")
+    for r in results:
+        print(f"{r['sentences']:>8}  {r['segmentation']:<8}{r['seconds'] * 1000:>10.1f}{r['segments']:>6}"
+              f"{r['violating_segments']:>8}{r['violation_chars']:>10}{r['boundary_depth']:>10.2f}"
+              f"{r['recall']:>8.2f}{r['min_length']:>7}{r['max_length']:>7}{r['mean_length']:>8.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results, 'failures': failures},
+                      f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"\n[失败] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
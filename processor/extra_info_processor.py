@@ -1,7 +1,11 @@
 import json
 import logging
 from pathlib import Path
-from util.config import LLMClient
+from typing import Dict, Any, Optional
+from util.config import LLMClient, GLOBAL_MODEL
+from util.stage_cache import hash_prompt_files
+from util.journal import StageJournal
+from util.progress import current_progress
 
 SUMMARY_PROMPT_PATH = "prompt/summary_generation_prompt.txt"
 QUESTION_PROMPT_PATH = "prompt/question_generation_prompt.txt"
@@ -11,12 +15,42 @@ FORMULA_ANALYSIS_PROMPT_PATH = "prompt/formula_analysis_prompt.txt"
 class ExtraInfoProcessor:
     """额外信息处理器，用于生成论文各章节的总结信息和问题"""
 
-    def __init__(self):
-        """初始化额外信息处理器"""
+    VERSION = 1
+
+    def __init__(self, journal: Optional[StageJournal] = None):
+        """
+        初始化额外信息处理器
+
+        Args:
+            journal: 断点日志，每次生成完成后立即记录，重新运行时回放已完成的调用
+        """
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.llm = LLMClient()
+        self.journal = journal
         self.abstract_text = ""
-        
+
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响生成结果的参数（提示词内容和模型名称），用于计算阶段缓存键"""
+        return {
+            'prompts': hash_prompt_files([
+                SUMMARY_PROMPT_PATH,
+                QUESTION_PROMPT_PATH,
+                GRAPH_QUESTION_PROMPT_PATH,
+                FORMULA_ANALYSIS_PROMPT_PATH
+            ]),
+            'model': GLOBAL_MODEL
+        }
+        
+    def _chat(self, messages, node_path=None) -> str:
+        """调用LLM；配置了断点日志时先回放已完成的调用，新结果立即写入日志"""
+        if self.journal is None or node_path is None:
+            return self.llm.chat(messages, stream=True)
+        return self.journal.replay_or_call(
+            node_path,
+            {'model': GLOBAL_MODEL, 'messages': messages},
+            lambda: self.llm.chat(messages, stream=True)
+        )
+
     def _read_file(self, filepath: str) -> str:
         """读取文件内容"""
         try:
@@ -45,17 +79,7 @@ class ExtraInfoProcessor:
             with input_path.open('r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            # 提取摘要信息
-            self.extract_abstract(data)
-            
-            # 从顶层章节开始，自下而上生成总结
-            if "sections" in data:
-                self.generate_section_summaries(data["sections"])
-                
-                # 生成问题阶段
-                self.logger.info("开始生成各块内容的问题")
-                self.generate_questions(data["sections"])
-                self.logger.info("问题生成完成")
+            data = self.process_data(data)
 
             # 写入输出文件
             with output_path.open('w', encoding='utf-8') as f:
@@ -67,6 +91,49 @@ class ExtraInfoProcessor:
             self.logger.error(f"章节总结和问题生成失败: {str(e)}", exc_info=True)
             raise
     
+    def process_data(self, data):
+        """
+        为内存中的文档生成章节总结和问题（原地修改并返回 data）
+        """
+        # 每个章节总结、每个内容块的问题或公式解析为一个进度单元
+        progress = current_progress()
+        progress.start(self.count_work_units(data), unit='项')
+
+        # 提取摘要信息
+        self.extract_abstract(data)
+        
+        # 从顶层章节开始，自下而上生成总结
+        if "sections" in data:
+            self.generate_section_summaries(data["sections"])
+            
+            # 生成问题阶段
+            self.logger.info("开始生成各块内容的问题")
+            self.generate_questions(data["sections"])
+            self.logger.info("问题生成完成")
+        progress.finish()
+        return data
+
+    def count_work_units(self, data) -> int:
+        """预先统计需要处理的单元数（章节总结、文本/图表问题、公式解析），与生成步骤的遍历规则一致"""
+        def count(sections):
+            total = 0
+            for section in sections:
+                if section.get("type") in ["abstract", "references"]:
+                    continue
+                total += 1  # 章节总结
+                for block in section.get("content", []):
+                    if not isinstance(block, dict):
+                        continue
+                    block_type = block.get("type")
+                    if (block_type == "text" and block.get("translated_content")) or \
+                            (block_type in ["figure", "table"] and block.get("translated_caption")) or \
+                            block_type == "formula":
+                        total += 1
+                total += count(section.get("children") or [])
+            return total
+
+        return count(data.get("sections") or [])
+    
     def extract_abstract(self, data):
         """
         从数据中提取摘要信息并保存到类变量
@@ -91,19 +158,20 @@ class ExtraInfoProcessor:
         
         self.logger.warning("未找到摘要信息")
     
-    def generate_section_summaries(self, sections):
+    def generate_section_summaries(self, sections, path="sections"):
         """
         自下而上递归生成所有章节的总结
         
         Args:
             sections: 章节列表
+            path: 章节列表在文档中的节点路径
             
         Returns:
             list: 当前层级所有章节的总结列表，每个元素为{"title": 章节标题, "summary": 章节总结}的字典
         """
         all_summaries = []
         
-        for section in sections:
+        for index, section in enumerate(sections):
             # 跳过abstract和references类型的章节
             if section.get("type") in ["abstract", "references"]:
                 self.logger.info(f"跳过 {section.get('title')} 章节的总结生成")
@@ -113,11 +181,13 @@ class ExtraInfoProcessor:
             children_summaries = []
             if "children" in section and section["children"]:
                 # 递归处理子章节，获取子章节的总结列表
-                children_summaries = self.generate_section_summaries(section["children"])
+                children_summaries = self.generate_section_summaries(section["children"], f"{path}/{index}/children")
                 
             # 生成当前章节的总结
             self.logger.info(f"生成 {section.get('title', '未命名章节')} 的总结")
-            section_summary = self.generate_summary_for_section(section, children_summaries)
+            section_summary = self.generate_summary_for_section(section, children_summaries,
+                                                                node_path=f"{path}/{index}/summary")
+            current_progress().advance()
             
             if section_summary:
                 section["summary"] = section_summary
@@ -127,13 +197,14 @@ class ExtraInfoProcessor:
                 
         return all_summaries
     
-    def generate_summary_for_section(self, section, children_summaries=None):
+    def generate_summary_for_section(self, section, children_summaries=None, node_path=None):
         """
         为单个章节生成总结，综合考虑自身内容和子章节总结
         
         Args:
             section: 章节数据
             children_summaries: 子章节总结列表，每个元素为{"title": 章节标题, "summary": 章节总结}的字典
+            node_path: 总结在文档中的节点路径，用于断点日志
             
         Returns:
             str: 生成的章节总结
@@ -205,20 +276,21 @@ class ExtraInfoProcessor:
         ]
         
         try:
-            summary = self.llm.chat(messages, stream=True).replace("\n", " ").strip()
+            summary = self._chat(messages, node_path).replace("\n", " ").strip()
             return summary
         except Exception as e:
             self.logger.error(f"生成章节 {section.get('title', '未命名章节')} 的总结失败: {str(e)}")
             return ""
     
-    def generate_questions(self, sections):
+    def generate_questions(self, sections, path="sections"):
         """
         为各个章节的内容块生成问题
         
         Args:
             sections: 章节列表
+            path: 章节列表在文档中的节点路径
         """
-        for section in sections:
+        for index, section in enumerate(sections):
             # 跳过abstract和references类型的章节
             if section.get("type") in ["abstract", "references"]:
                 self.logger.info(f"跳过 {section.get('title')} 章节的问题生成")
@@ -229,20 +301,23 @@ class ExtraInfoProcessor:
             
             # 处理当前章节的内容块
             if "content" in section:
-                self._process_content_blocks(section["content"], section_summary)
+                self._process_content_blocks(section["content"], section_summary, f"{path}/{index}/content")
             
             # 递归处理子章节
             if "children" in section and section["children"]:
-                self.generate_questions(section["children"])
+                self.generate_questions(section["children"], f"{path}/{index}/children")
     
-    def _process_content_blocks(self, content_blocks, section_summary):
+    def _process_content_blocks(self, content_blocks, section_summary, path="content"):
         """
         处理内容块，为每个块生成问题
         
         Args:
             content_blocks: 内容块列表
             section_summary: 章节摘要
+            path: 内容块列表在文档中的节点路径
         """
+        progress = current_progress()
+
         # 处理连续的文本块
         i = 0
         while i < len(content_blocks):
@@ -253,19 +328,23 @@ class ExtraInfoProcessor:
                 
                 if block_type == "text" and block.get("translated_content"):
                     # 处理文本块
-                    questions = self._generate_questions_for_text(block["translated_content"], section_summary)
+                    questions = self._generate_questions_for_text(block["translated_content"], section_summary,
+                                                                  node_path=f"{path}/{i}/questions")
                     if questions:
                         block["questions"] = questions
+                    progress.advance()
                 
                 elif block_type in ["figure", "table"] and block.get("translated_caption"):
                     # 处理图片和表格块
                     questions = self._generate_questions_for_graph(
                         block["translated_caption"], 
                         section_summary,
-                        block_type
+                        block_type,
+                        node_path=f"{path}/{i}/questions"
                     )
                     if questions:
                         block["questions"] = questions
+                    progress.advance()
                 
                 elif block_type == "formula":
                     # 处理公式块，需要获取前后的文本上下文
@@ -273,19 +352,22 @@ class ExtraInfoProcessor:
                     context_after = self._find_text_context_forwards(content_blocks, i+1)
                     
                     # 生成公式解析
-                    formula_analysis = self._generate_formula_analysis(block.get("content", ""), context_before, context_after, section_summary)
+                    formula_analysis = self._generate_formula_analysis(block.get("content", ""), context_before, context_after, section_summary,
+                                                                       node_path=f"{path}/{i}/formula_analysis")
                     if formula_analysis:
                         block["formula_analysis"] = formula_analysis
+                    progress.advance()
             
             i += 1
     
-    def _generate_questions_for_text(self, text_content, section_summary):
+    def _generate_questions_for_text(self, text_content, section_summary, node_path=None):
         """
         为文本块生成问题
         
         Args:
             text_content: 文本内容
             section_summary: 章节摘要
+            node_path: 问题在文档中的节点路径，用于断点日志
             
         Returns:
             list: 生成的问题列表
@@ -306,13 +388,13 @@ class ExtraInfoProcessor:
         ]
         
         try:
-            questions = self.llm.chat(messages, stream=True).replace("\n", " ").strip()
+            questions = self._chat(messages, node_path).replace("\n", " ").strip()
             return questions
         except Exception as e:
             self.logger.error(f"生成文本块问题失败: {str(e)}")
             return ""
     
-    def _generate_questions_for_graph(self, caption, section_summary, graph_type):
+    def _generate_questions_for_graph(self, caption, section_summary, graph_type, node_path=None):
         """
         为图片和表格块生成问题
         
@@ -320,6 +402,7 @@ class ExtraInfoProcessor:
             caption: 图表说明
             section_summary: 章节摘要
             graph_type: 图表类型（"figure"或"table"）
+            node_path: 问题在文档中的节点路径，用于断点日志
             
         Returns:
             list: 生成的问题列表
@@ -343,7 +426,7 @@ class ExtraInfoProcessor:
         ]
         
         try:
-            questions = self.llm.chat(messages, stream=True).replace("\n", " ").strip()
+            questions = self._chat(messages, node_path).replace("\n", " ").strip()
             return questions
         except Exception as e:
             self.logger.error(f"生成{graph_type_text}块问题失败: {str(e)}")
@@ -393,7 +476,7 @@ class ExtraInfoProcessor:
         
         return ""
     
-    def _generate_formula_analysis(self, formula, context_before, context_after, section_summary):
+    def _generate_formula_analysis(self, formula, context_before, context_after, section_summary, node_path=None):
         """
         为公式块生成详细解读和分析。
 
@@ -402,6 +485,7 @@ class ExtraInfoProcessor:
             context_before (str): 公式前的文本上下文
             context_after (str): 公式后的文本上下文
             section_summary (str): 当前章节的总结信息或摘要信息
+            node_path (str): 解析在文档中的节点路径，用于断点日志
 
         Returns:
             str: 生成的公式解析文本
@@ -436,7 +520,7 @@ class ExtraInfoProcessor:
 
         try:
             # 调用 LLM 生成公式解析
-            formula_analysis = self.llm.chat(messages, stream=True).replace("\n", " ").strip()
+            formula_analysis = self._chat(messages, node_path).replace("\n", " ").strip()
             return formula_analysis
         except Exception as e:
             self.logger.error(f"生成公式解析失败: {str(e)}")
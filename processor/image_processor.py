@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from util.cancellation import check_cancelled
+from util.config import IMAGE_DISPLAY_MAX_SIDE, IMAGE_THUMB_MAX_SIDE, IMAGE_QUALITY, IMAGE_FORMAT
+from util.progress import current_progress
+
+# 渲染版本与缩略图的存放目录（位于论文的 images 目录下）
+DISPLAY_DIR_NAME = "web"
+THUMB_DIR_NAME = "thumbs"
+
+# 可处理的原图格式
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+
+class ImageProcessor:
+    """
+    图片后处理器：为阅读界面生成限制尺寸的渲染版本和缩略图
+
+    pdf2md 输出的是原始分辨率的截图，阅读界面直接加载原图时每页要下载数MB图片。
+    这里对 images 目录中的每张图片：
+      - 按内容哈希去重，内容相同的图片改为硬链接，只占一份磁盘空间
+      - 生成长边不超过 display_max_side 的渲染版本和长边不超过 thumb_max_side 的缩略图，
+        以内容哈希命名，内容相同的图片共用同一份渲染结果，已生成的不再重复生成
+      - 将原图到渲染版本、缩略图的对应关系写入清单，阅读界面据此先显示缩略图，点击后查看大图
+    原图保持不变，Markdown中的图片引用无需修改。
+    """
+
+    VERSION = 1
+
+    def __init__(self, display_max_side: int = IMAGE_DISPLAY_MAX_SIDE, thumb_max_side: int = IMAGE_THUMB_MAX_SIDE,
+                 quality: int = IMAGE_QUALITY, image_format: str = IMAGE_FORMAT):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.display_max_side = display_max_side
+        self.thumb_max_side = thumb_max_side
+        self.quality = quality
+        self.image_format = image_format.lower()
+
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响渲染结果的参数，用于计算阶段缓存键"""
+        return {
+            'display_max_side': self.display_max_side,
+            'thumb_max_side': self.thumb_max_side,
+            'quality': self.quality,
+            'format': self.image_format
+        }
+
+    def process(self, paper_dir: str, manifest_path: str) -> str:
+        """
+        处理论文 images 目录中的图片并写入清单
+
+        Args:
+            paper_dir: 论文输出目录（清单中的路径相对于该目录，与Markdown中的图片引用一致）
+            manifest_path: 清单输出路径
+
+        Returns:
+            str: 清单路径
+        """
+        paper_dir = Path(paper_dir)
+        images_dir = paper_dir / "images"
+        originals = sorted(p for p in images_dir.iterdir()
+                           if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES) if images_dir.is_dir() else []
+        # 没有图片的论文不需要导入 Pillow
+        image_format = self._resolve_format() if originals else self.image_format
+        suffix = '.jpg' if image_format == 'jpeg' else f'.{image_format}'
+        progress = current_progress()
+        progress.start(len(originals), unit='张')
+
+        images: Dict[str, Dict[str, Any]] = {}
+        first_by_hash: Dict[str, str] = {}
+        renditions: Dict[str, Optional[Dict[str, Any]]] = {}
+        original_bytes = saved_bytes = 0
+        for path in originals:
+            check_cancelled()
+            digest = self._hash_file(path)
+            size = path.stat().st_size
+            original_bytes += size
+            duplicate_of = first_by_hash.get(digest)
+            if duplicate_of is None:
+                first_by_hash[digest] = path.name
+            elif self._link_duplicate(path, images_dir / duplicate_of):
+                saved_bytes += size
+
+            if digest not in renditions:
+                renditions[digest] = self._render(path, images_dir, digest, suffix, image_format)
+            rendition = renditions[digest]
+            if rendition is None:
+                # 无法解码的图片不写入清单，阅读界面对其直接显示原图
+                progress.advance()
+                continue
+            images[path.name] = {
+                'sha256': digest,
+                'bytes': size,
+                'duplicate_of': duplicate_of,
+                **rendition
+            }
+            progress.advance()
+
+        rendered = [r for r in renditions.values() if r is not None]
+        manifest = {
+            'version': self.VERSION,
+            'format': image_format,
+            'images': images,
+            'unique': len(first_by_hash),
+            'duplicates': len(originals) - len(first_by_hash),
+            'unreadable': len(originals) - len(images),
+            'original_bytes': original_bytes,
+            'deduplicated_bytes': saved_bytes,
+            'display_bytes': sum(r['display_bytes'] for r in rendered),
+            'thumb_bytes': sum(r['thumb_bytes'] for r in rendered)
+        }
+        manifest_path = Path(manifest_path)
+        tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(manifest_path)
+        progress.finish()
+        self.logger.info(f"图片处理完成: {len(originals)} 张（去重后 {len(first_by_hash)} 张，无法解码 {manifest['unreadable']} 张），"
+                         f"原图 {original_bytes / 1e6:.1f} MB，渲染版本 {manifest['display_bytes'] / 1e6:.1f} MB，"
+                         f"缩略图 {manifest['thumb_bytes'] / 1e6:.2f} MB")
+        return str(manifest_path)
+
+    def _resolve_format(self) -> str:
+        """确定输出格式：Pillow 不支持 WebP 编码时退回 JPEG"""
+        from PIL import features
+
+        if self.image_format == 'webp' and not features.check('webp'):
+            self.logger.warning("当前Pillow不支持WebP编码，改用JPEG")
+            return 'jpeg'
+        return self.image_format
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _link_duplicate(self, path: Path, original: Path) -> bool:
+        """将内容重复的图片替换为指向首张图片的硬链接，返回两者是否共用同一份磁盘空间"""
+        try:
+            if os.path.samefile(path, original):
+                return True
+            tmp_path = path.with_name(path.name + '.link')
+            os.link(original, tmp_path)
+            tmp_path.replace(path)
+            return True
+        except OSError as e:
+            # 文件系统不支持硬链接时保留原文件
+            self.logger.debug(f"无法为重复图片创建硬链接 {path.name}: {e}")
+            return False
+
+    def _render(self, path: Path, images_dir: Path, digest: str, suffix: str,
+                image_format: str) -> Optional[Dict[str, Any]]:
+        """生成渲染版本和缩略图（已存在时直接复用），返回相对于论文目录的路径和尺寸，图片无法解码时返回None"""
+        from PIL import Image, UnidentifiedImageError
+
+        display_path = images_dir / DISPLAY_DIR_NAME / f"{digest}{suffix}"
+        thumb_path = images_dir / THUMB_DIR_NAME / f"{digest}{suffix}"
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+                if not display_path.exists() or not thumb_path.exists():
+                    image.load()
+                    for target, max_side in ((display_path, self.display_max_side), (thumb_path, self.thumb_max_side)):
+                        if not target.exists():
+                            self._save_rendition(image, target, max_side, image_format)
+        except (OSError, UnidentifiedImageError) as e:
+            # 损坏或截断的截图只跳过该图片，不影响整篇论文
+            self.logger.warning(f"图片无法解码，跳过: {path.name}: {e}")
+            return None
+        return {
+            'width': width,
+            'height': height,
+            'display': f"images/{DISPLAY_DIR_NAME}/{display_path.name}",
+            'thumb': f"images/{THUMB_DIR_NAME}/{thumb_path.name}",
+            'display_bytes': display_path.stat().st_size,
+            'thumb_bytes': thumb_path.stat().st_size
+        }
+
+    def _save_rendition(self, image, target: Path, max_side: int, image_format: str) -> None:
+        from PIL import Image
+
+        rendition = image.copy()
+        rendition.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image_format == 'jpeg' or rendition.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            rendition = self._to_rgb(rendition, keep_alpha=image_format != 'jpeg')
+        options: Dict[str, Optional[Any]] = {'quality': self.quality}
+        if image_format == 'jpeg':
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.stem}.tmp{target.suffix}")
+        rendition.save(tmp_path, format=image_format.upper(), **options)
+        tmp_path.replace(target)
+
+    @staticmethod
+    def _to_rgb(image, keep_alpha: bool):
+        """转换为可编码的颜色模式，JPEG不支持透明通道时铺白色背景"""
+        from PIL import Image
+
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            image = image.convert('RGBA')
+            if keep_alpha:
+                return image
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        return image.convert('RGB')
@@ -2,7 +2,16 @@ import json
 import logging
 import re
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+
+# 行类型（_classify_lines 输出的类型数组取值）
+LINE_TEXT = 0
+LINE_FORMULA = 1
+LINE_IMAGE = 2
+LINE_TABLE = 3
+LINE_FIGURE_CAPTION = 4
+LINE_TABLE_CAPTION = 5
+
 
 class JsonProcessor:
     """
@@ -10,14 +19,16 @@ class JsonProcessor:
     并能将脚注行（上一行或下一行）合并到图片块的caption中。
     """
 
+    VERSION = 1
+
     def __init__(self):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
         # 匹配行间公式：整行只包含 $$...$$
         self.formula_pattern = re.compile(r"^\s*\${2}(?P<formula>.*?)\${2}\s*$", re.DOTALL)
 
-        # 匹配Markdown图片：形如 ![alt](path/to/img.png)
-        self.image_pattern = re.compile(r'^!\[.*?\]\(.*?\)')
+        # 匹配Markdown图片：形如 ![alt](path/to/img.png)，同时取出 alt 和 src
+        self.image_pattern = re.compile(r'^!\[(?P<alt>.*?)\]\((?P<src>.*?)\)')
 
         # 匹配HTML表格：形如 <html><body><table>...</table></body></html>
         self.table_pattern = re.compile(r'^<html><body><table>.*?</table></body></html>$')
@@ -47,6 +58,18 @@ class JsonProcessor:
             )
         ''', re.IGNORECASE | re.VERBOSE)
 
+        # 按去除首尾空白后的首字符分派：各类行的首字符互不相同，每行最多只需尝试一个正则
+        # （公式以$开头，图片以!开头，表格以<开头，图片说明以F/I/D开头，表格说明以T开头）
+        self._line_dispatch: Dict[str, Tuple[int, re.Pattern]] = {
+            '$': (LINE_FORMULA, self.formula_pattern),
+            '!': (LINE_IMAGE, self.image_pattern),
+            '<': (LINE_TABLE, self.table_pattern)
+        }
+        for char in 'FfIiDd':
+            self._line_dispatch[char] = (LINE_FIGURE_CAPTION, self.figure_caption_pattern)
+        for char in 'Tt':
+            self._line_dispatch[char] = (LINE_TABLE_CAPTION, self.table_caption_pattern)
+
     def process(self, input_path: str, output_path: str) -> Path:
         """
         读取 input.json ，递归地处理其 sections（含子章节），
@@ -60,13 +83,7 @@ class JsonProcessor:
             with input_path.open('r', encoding='utf-8') as f:
                 data = json.load(f)
 
-            # 处理顶层 sections
-            sections = data.get("sections", [])
-            processed_sections = []
-            for sec in sections:
-                processed_sections.append(self._process_section(sec))
-
-            data["sections"] = processed_sections
+            data = self.process_data(data)
 
             # 输出结果
             self.logger.info(f"保存处理结果到: {output_path}")
@@ -79,6 +96,19 @@ class JsonProcessor:
             self.logger.error(f"JSON处理失败: {str(e)}", exc_info=True)
             raise
 
+    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理内存中的文档：递归拆分所有章节的 content（原地修改并返回 data）
+        """
+        # 处理顶层 sections
+        sections = data.get("sections", [])
+        processed_sections = []
+        for sec in sections:
+            processed_sections.append(self._process_section(sec))
+
+        data["sections"] = processed_sections
+        return data
+
     def _process_section(self, section: Dict[str, Any]) -> Dict[str, Any]:
         """
         处理单个章节：
@@ -104,139 +134,90 @@ class JsonProcessor:
 
         return section
 
+    def _classify_lines(self, lines: List[str]) -> Tuple[bytearray, List[str], List[Optional[re.Match]]]:
+        """
+        对每行分类一次
+
+        Returns:
+            (行类型数组, 去除首尾空白后的各行, 公式/图片行的匹配结果)
+        """
+        types = bytearray(len(lines))  # 默认为 LINE_TEXT
+        stripped_lines = [line.strip() for line in lines]
+        matches: List[Optional[re.Match]] = [None] * len(lines)
+        dispatch = self._line_dispatch
+        for i, stripped in enumerate(stripped_lines):
+            candidate = dispatch.get(stripped[:1])
+            if candidate is None:
+                continue
+            line_type, pattern = candidate
+            m = pattern.match(stripped)
+            if m:
+                types[i] = line_type
+                matches[i] = m
+        return types, stripped_lines, matches
+
     def _split_content_with_order(self, lines: List[str]) -> List[Dict[str, Any]]:
         """
         单次自上而下扫描，保证块的输出顺序与原行顺序一致。
+        未与图片/表格相邻的说明行被丢弃。
         """
+        types, stripped_lines, matches = self._classify_lines(lines)
         blocks = []
-        n = len(lines)
-        used = [False] * n  # 标记哪些行已被处理
+        used = bytearray(len(lines))  # 标记已作为说明合并到图片/表格中的行
 
-        i = 0
-        while i < n:
+        for i, line_type in enumerate(types):
             if used[i]:
-                i += 1
                 continue
 
-            line = lines[i].rstrip('\n')
-            stripped = line.strip()
+            if line_type == LINE_TEXT:
+                blocks.append({
+                    "type": "text",
+                    "content": lines[i].rstrip('\n')
+                })
 
-            # 1) 行间公式
-            m_formula = self.formula_pattern.match(stripped)
-            if m_formula:
-                formula_body = m_formula.group("formula")
+            elif line_type == LINE_FORMULA:
                 blocks.append({
                     "type": "formula",
-                    "content": f"$$ {formula_body} $$"
+                    "content": f"$$ {matches[i].group('formula')} $$"
                 })
-                used[i] = True
-                i += 1
-                continue
-
-            # 2) 处理图片
-            m_img = self.image_pattern.match(stripped)
-            if m_img:
-                used[i] = True
-                alt_text, src = self._extract_alt_and_src(stripped)
-                
-                caption_line = ""
-                caption_index = None
-
-                # 检查上下文是否有图片说明
-                caption_line, caption_index = self._find_caption(
-                    lines, i, used, self.figure_caption_pattern
-                )
-
-                # 如果找到说明，标记已使用
-                if caption_line and caption_index is not None:
-                    used[caption_index] = True
 
+            elif line_type == LINE_IMAGE:
                 fig_block = {
                     "type": "figure",
-                    "src": src,
-                    "alt": alt_text
+                    "src": matches[i].group("src"),
+                    "alt": matches[i].group("alt")
                 }
-                if caption_line:
-                    fig_block["caption"] = caption_line
-
-                blocks.append(fig_block)
-                i += 1
-                continue
-
-            # 3) 处理表格
-            m_table = self.table_pattern.match(stripped)
-            if m_table:
-                used[i] = True
-                
-                caption_line = ""
-                caption_index = None
-
-                # 检查上下文是否有表格说明
-                caption_line, caption_index = self._find_caption(
-                    lines, i, used, self.table_caption_pattern
-                )
-
-                # 如果找到说明，标记已使用
-                if caption_line and caption_index is not None:
+                caption_index = self._find_caption(types, i, used, LINE_FIGURE_CAPTION)
+                if caption_index is not None:
                     used[caption_index] = True
+                    fig_block["caption"] = stripped_lines[caption_index]
+                blocks.append(fig_block)
 
+            elif line_type == LINE_TABLE:
                 table_block = {
                     "type": "table",
-                    "content": stripped
+                    "content": stripped_lines[i]
                 }
-                if caption_line:
-                    table_block["caption"] = caption_line
-
+                caption_index = self._find_caption(types, i, used, LINE_TABLE_CAPTION)
+                if caption_index is not None:
+                    used[caption_index] = True
+                    table_block["caption"] = stripped_lines[caption_index]
                 blocks.append(table_block)
-                i += 1
-                continue
-
-            # 4) 处理普通文本，跳过caption
-            if (not self.figure_caption_pattern.match(stripped) and 
-                not self.table_caption_pattern.match(stripped)):
-                text_block = {
-                    "type": "text",
-                    "content": line
-                }
-                used[i] = True
-                blocks.append(text_block)
-            else:
-                # 如果是caption，仅增加索引
-                i += 1
-                continue
-            
-            i += 1
 
         return blocks
 
-    def _find_caption(self, lines: List[str], current_index: int, used: List[bool], 
-                     caption_pattern: re.Pattern) -> Tuple[str, int]:
-        """查找图片或表格的说明文字"""
-        n = len(lines)
-        
-        # 优先检查上一行
-        if current_index - 1 >= 0 and not used[current_index - 1]:
-            prev_stripped = lines[current_index - 1].strip()
-            if caption_pattern.match(prev_stripped):
-                return prev_stripped, current_index - 1
-
-        # 再检查下一行
-        if current_index + 1 < n and not used[current_index + 1]:
-            next_stripped = lines[current_index + 1].strip()
-            if caption_pattern.match(next_stripped):
-                return next_stripped, current_index + 1
-
-        return "", None
-
-    def _extract_alt_and_src(self, image_markdown_line: str) -> Tuple[str, str]:
-        """
-        从 ![alt文本](path/to/xxx.png) 的行里解析 alt / src。
-        """
-        pattern = re.compile(r'!\[(?P<alt>.*?)\]\((?P<src>.*?)\)')
-        m = pattern.match(image_markdown_line)
-        if not m:
-            return "", ""
-        return m.group("alt"), m.group("src")
+    @staticmethod
+    def _find_caption(types: bytearray, current_index: int, used: bytearray, caption_type: int) -> Optional[int]:
+        """查找图片或表格的说明行（优先上一行，其次下一行），返回行号"""
+        prev_index = current_index - 1
+        if prev_index >= 0 and not used[prev_index] and types[prev_index] == caption_type:
+            return prev_index
+
+        next_index = current_index + 1
+        if next_index < len(types) and not used[next_index] and types[next_index] == caption_type:
+            return next_index
+
+        return None
 
 
 if __name__ == "__main__":
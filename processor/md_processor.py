@@ -1,7 +1,10 @@
 import re
 import json
+import heapq
 import logging
-from typing import Dict, Any, List, Tuple, Optional
+import shutil
+import tempfile
+from typing import Dict, Any, Iterable, Iterator, List, Tuple, Optional, Union
 from dataclasses import dataclass, field
 from collections import defaultdict
 from pathlib import Path
@@ -9,6 +12,18 @@ from pathlib import Path
 # 配置日志
 logger = logging.getLogger(__name__)
 
+
+def read_lines(path: Union[str, Path]) -> Iterator[str]:
+    """逐行读取文本文件，产出的各行与 read_text().split('\\n') 的结果一致"""
+    line = ''
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+    # 以换行结尾（或空文件）时 split 的最后一项是空字符串
+    if not line or line.endswith('\n'):
+        yield ''
+
+
 @dataclass
 class Section:
     title: str            # 完整标题（包含编号和文本）
@@ -21,6 +36,8 @@ class Section:
 class MarkdownProcessor:
     """Markdown处理器：将Markdown解析为结构化JSON"""
 
+    VERSION = 2
+
     def __init__(self):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
@@ -82,14 +99,14 @@ class MarkdownProcessor:
 
     def parse_content(self, content: List[str]) -> List[str]:
         """将内容解析为段落列表"""
-        text = '\n'.join(content)
         paragraphs = []
         current_para = []
         
         in_latex_block = False
         latex_content = []
         
-        for line in text.split('\n'):
+        # 内容项中可能包含换行（如已合并的段落），按行展开
+        for line in (part for item in content for part in item.split('\n')):
             line = line.strip()
             
             # 检查是否是LaTeX块的开始或结束
@@ -197,98 +214,122 @@ class MarkdownProcessor:
         return result
     
 
-    def check_section_continuity(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        sections.sort(key=lambda x: int(x['number'].split('.')[-1]))
-        all_sections = sections.copy()
-        section_numbers = [int(s['number'].split('.')[-1]) for s in all_sections]
-        
-        i = 0
-        while i < len(all_sections) - 1:  # 动态终止条件
-            current_num = section_numbers[i]
-            next_num = section_numbers[i + 1]
-            
-            if next_num - current_num > 1:
-                current_section = all_sections[i]  # 使用动态列表
-                prefix = '.'.join(current_section['number'].split('.')[:-1]) + '.' if current_section['number'].count('.') > 0 else ''
-                
-                missing_sections, updated_content = self.find_missing_sections(
-                    '\n'.join(current_section['content']), prefix
-                )
-                
-                if missing_sections:
-                    print(f"在 {current_section['number']} 之后找到遗漏的章节：")
-                    for section in missing_sections:
-                        print(f"  - {section.title}")
-                    current_section['content'] = updated_content
-                    for missing_section in missing_sections:
-                        missing_dict = vars(missing_section)
-                        missing_dict['children'] = []
-                        insert_idx = next((j for j, s in enumerate(all_sections) if s['number'] > missing_section.number), len(all_sections))
-                        all_sections.insert(insert_idx, missing_dict)
-                    
-                    # 同步更新关键变量
-                    section_numbers = [int(s['number'].split('.')[-1]) for s in all_sections]
-                    sections = all_sections.copy()
-                    i = 0  # 仅在插入后重置索引
-                    continue
-            
-            i += 1  # 正常递增
-        
-        return all_sections
+    @staticmethod
+    def section_key(number: str) -> Tuple[int, ...]:
+        """将章节编号解析为数字元组（如 "2.10" -> (2, 10)），用于按数值排序"""
+        return tuple(int(part) for part in number.split('.')) if number else ()
 
-    def build_hierarchy(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """构建章节的层级结构"""
-        hierarchy = []
-        section_map = {}  # 用于快速查找章节
+    def check_section_continuity(self, sections: List[Dict[str, Any]],
+                                 keys: Optional[Dict[int, Tuple[int, ...]]] = None) -> List[Dict[str, Any]]:
+        """
+        检查同级章节编号的连续性，从缺口前一章节的内容中找回被误识别为正文的章节标题
+
+        按编号数值顺序单遍扫描：相邻章节编号不连续时在前一章节内容中查找遗漏的标题，
+        找回的章节按编号放入待扫描序列，与后续章节之间的缺口同样只检查一次。
+
+        Args:
+            sections: 同一父章节下的子章节
+            keys: 章节对象 id 到编号数字元组的映射（由调用方预先解析，缺省时在此解析）
+        """
+        keys = {} if keys is None else keys
+        for section in sections:
+            if id(section) not in keys:
+                keys[id(section)] = self.section_key(section['number'])
+
+        # 堆中按 (编号, 出现顺序) 排序，编号相同的章节保持原有先后顺序
+        pending = [(keys[id(section)], order, section) for order, section in enumerate(sections)]
+        heapq.heapify(pending)
+        order = len(sections)
+        result = []
+        while pending:
+            current_key, _, current_section = heapq.heappop(pending)
+            result.append(current_section)
+            if not pending or pending[0][0][-1] - current_key[-1] <= 1:
+                continue
+
+            prefix = '.'.join(current_section['number'].split('.')[:-1]) + '.' if current_section['number'].count('.') > 0 else ''
+            missing_sections, updated_content = self.find_missing_sections(
+                '\n'.join(current_section['content']), prefix
+            )
+            if not missing_sections:
+                continue
+
+            print(f"在 {current_section['number']} 之后找到遗漏的章节：")
+            for section in missing_sections:
+                print(f"  - {section.title}")
+            current_section['content'] = updated_content
+            for missing_section in missing_sections:
+                missing_dict = vars(missing_section)
+                missing_dict['children'] = []
+                key = self.section_key(missing_section.number)
+                keys[id(missing_dict)] = key
+                heapq.heappush(pending, (key, order, missing_dict))
+                order += 1
+
+        return result
+
+    def iter_hierarchy(self, sections: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        流式构建章节的层级结构，逐个产出完成的顶层章节
+
+        带编号的顶层章节（或找不到父章节的章节）开始一棵子树，之后编号以其子树中某个章节为前缀的
+        章节归入该子树。下一棵子树开始时，当前子树不会再有新的子章节，逐组检查编号连续性后
+        与其后出现的无编号章节一起产出。
+        """
+        root = None           # 当前子树的根章节
+        section_map = {}      # 当前子树中 编号 -> 章节
         level_groups = defaultdict(list)  # 按父章节分组的子章节
-        
-        # 第一次遍历：构建基本的层级关系
+        keys = {}             # 章节对象 id -> 编号数字元组，只解析一次
+        trailing = []         # 当前子树之后出现的无编号顶层章节
+
+        def finish_tree():
+            for parent_number, group in level_groups.items():
+                section_map[parent_number]['children'] = self.check_section_continuity(group, keys)
+            yield root
+            yield from trailing
+
         for section in sections:
             section['children'] = []
             if not section['number']:  # 处理没有编号的章节
-                hierarchy.append(section)
+                if root is None:
+                    yield section
+                else:
+                    trailing.append(section)
                 continue
-                
+
             numbers = section['number'].split('.')
-            
-            if len(numbers) == 1:  # 顶层章节
-                hierarchy.append(section)
+            parent_number = '.'.join(numbers[:-1])
+            if len(numbers) > 1 and parent_number in section_map:
+                # 将同级章节归类
+                keys[id(section)] = tuple(int(n) for n in numbers)
+                level_groups[parent_number].append(section)
                 section_map[section['number']] = section
-            else:
-                parent_number = '.'.join(numbers[:-1])
-                if parent_number in section_map:
-                    # 将同级章节归类
-                    level_groups[parent_number].append(section)
-                    section_map[section['number']] = section
-                else:
-                    # 如果找不到父章节，作为顶层章节处理
-                    hierarchy.append(section)
-                    section_map[section['number']] = section
-        
-        # 第二次遍历：处理每组同级章节
-        for parent_number, group in level_groups.items():
-            # 检查同级章节的连续性
-            updated_group = self.check_section_continuity(group)
-            
-            # 更新父章节的 children
-            if parent_number in section_map:
-                section_map[parent_number]['children'] = updated_group
-                
-                # 更新 section_map
-                for section in updated_group:
-                    section_map[section['number']] = section
-        
-        return hierarchy
+                continue
 
-    def parse(self, content: str) -> Dict[str, Any]:
-        """解析整个 Markdown 文档"""
-        lines = content.split('\n')
-        result = {
-            'title': '',           # 文档标题
-            'authors_info': '',    # 作者信息
-            'sections': []         # 章节列表
-        }
-        
+            # 顶层章节（如果找不到父章节，也作为顶层章节处理），开始新的子树
+            if root is not None:
+                yield from finish_tree()
+            root = section
+            section_map = {section['number']: section}
+            level_groups = defaultdict(list)
+            keys = {}
+            trailing = []
+
+        if root is not None:
+            yield from finish_tree()
+
+    def build_hierarchy(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """构建章节的层级结构（包含连续性检查）"""
+        return list(self.iter_hierarchy(sections))
+
+    def iter_sections(self, lines: Iterable[str], header: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        逐行解析文档，每个章节在遇到下一个标题时解析完成并产出（扁平结构，尚未构建层级）
+
+        Args:
+            lines: 文档的各行（不含换行符），可以是逐行读取文件的迭代器
+            header: 解析过程中写入文档标题 'title' 和作者信息 'authors_info'
+        """
         current_section = None     # 当前正在处理的章节
         current_content = []       # 当前章节的内容行
         collecting_authors = False # 是否正在收集作者信息
@@ -320,7 +361,7 @@ class MarkdownProcessor:
                 # 保存当前章节（如果有）
                 if current_section:
                     current_section.content = self.parse_content(current_content)
-                    result['sections'].append(vars(current_section))
+                    yield vars(current_section)
                 
                 # 创建新的参考文献章节
                 current_section = Section(
@@ -343,7 +384,7 @@ class MarkdownProcessor:
                 
                 # 处理文档标题
                 if not has_started:
-                    result['title'] = title_text
+                    header['title'] = title_text
                     # collecting_authors = True
                     has_started = True
                     continue
@@ -365,7 +406,7 @@ class MarkdownProcessor:
                             clean_authors_lines.append(line)
                     
                     # 保存清理后的作者信息
-                    result['authors_info'] = '\n'.join(clean_authors_lines).strip()
+                    header['authors_info'] = '\n'.join(clean_authors_lines).strip()
                     collecting_authors = False
                     
                     # 创建 abstract 章节
@@ -393,7 +434,7 @@ class MarkdownProcessor:
                     if in_references:
                         # 如果是参考文献章节，将内容解析为列表
                         current_section.content = self.parse_references('\n'.join(current_content))
-                        result['sections'].append(vars(current_section))
+                        yield vars(current_section)
                         break  # 处理完参考文献后直接跳出
                     else:
                         # 如果是摘要章节，需要特殊处理
@@ -417,7 +458,7 @@ class MarkdownProcessor:
                         else:
                             current_section.content = self.parse_content(current_content)
                         
-                        result['sections'].append(vars(current_section))
+                        yield vars(current_section)
                 
                 # 创建新章节
                 number, raw_title, level = self.parse_section_number(title_text)
@@ -441,35 +482,65 @@ class MarkdownProcessor:
                     authors_content.append(line)
                 else:
                     current_content.append(line)
-        
-        # 构建层级结构（包含连续性检查）
-        result['sections'] = self.build_hierarchy(result['sections'])
 
-        # 移除空章节
-        result['sections'] = self.remove_empty_sections(result['sections'])
-        
+    def iter_document(self, lines: Iterable[str], header: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        流式解析文档：逐个产出构建好层级、移除了空章节的顶层章节
+
+        内存中只保留正在解析的章节和尚未产出的顶层子树，不需要同时持有整篇文档。
+        """
+        for section in self.iter_hierarchy(self.iter_sections(lines, header)):
+            yield from self.remove_empty_sections([section])
+
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, Any]:
+        """解析文档的各行，返回完整的结构化文档"""
+        result = {
+            'title': '',           # 文档标题
+            'authors_info': '',    # 作者信息
+            'sections': []         # 章节列表
+        }
+        result['sections'] = list(self.iter_document(lines, result))
         return result
 
+    def parse(self, content: str) -> Dict[str, Any]:
+        """解析整个 Markdown 文档"""
+        return self.parse_lines(content.split('\n'))
+
+    def parse_file(self, markdown_path: Union[str, Path]) -> Dict[str, Any]:
+        """逐行读取并解析Markdown文件（不需要先把整个文件读入一个字符串）"""
+        return self.parse_lines(read_lines(markdown_path))
+
     def process(self, markdown_path: str, output_path: str) -> Path:
         """将原来独立的 process_markdown_file 函数集成为类方法"""
         try:
             markdown_path = Path(markdown_path)
             output_path = Path(output_path)
             
-            # 读取文件
+            # 逐行读取并解析，顶层章节解析完成后立即写出
             self.logger.info(f"开始解析Markdown文件: {markdown_path}")
-            content = markdown_path.read_text(encoding='utf-8')
-            
-            # 使用原有的 parse 方法解析
-            result = self.parse(content)
-            
-            # 保存结果
-            self.logger.info(f"保存解析结果到: {output_path}")
-            output_path.write_text(
-                json.dumps(result, ensure_ascii=False, indent=2),
-                encoding='utf-8'
-            )
-            
+            header = {'title': '', 'authors_info': ''}
+            count = 0
+            # 作者信息在遇到摘要标题时才确定，章节先写入临时文件，最后接在文档头之后
+            with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+                for section in self.iter_document(read_lines(markdown_path), header):
+                    spool.write(',\n' if count else '\n')
+                    # 与 json.dumps(result, indent=2) 中 sections 列表元素的缩进一致
+                    spool.write('    ' + json.dumps(section, ensure_ascii=False, indent=2).replace('\n', '\n    '))
+                    count += 1
+
+                # 保存结果（先写临时文件再替换），输出与 json.dumps(result, ensure_ascii=False, indent=2) 相同
+                self.logger.info(f"保存解析结果到: {output_path}")
+                tmp_path = output_path.with_name(output_path.name + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write('{\n')
+                    for key, value in header.items():
+                        f.write(f'  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n')
+                    f.write('  "sections": [')
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+                    f.write('\n  ]\n}' if count else ']\n}')
+                tmp_path.replace(output_path)
+
             return output_path
             
         except Exception as e:
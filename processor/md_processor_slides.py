@@ -1,7 +1,7 @@
 import re
 import json
 import logging
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Union
 from dataclasses import dataclass, field
 from collections import defaultdict
 from pathlib import Path
@@ -21,6 +21,8 @@ class Section:
 class MarkdownProcessorSlides:
     """Markdown处理器：将Markdown解析为结构化JSON"""
 
+    VERSION = 1
+
     def __init__(self):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
@@ -366,6 +368,10 @@ class MarkdownProcessorSlides:
         
         return result
 
+    def parse_file(self, markdown_path: Union[str, Path]) -> Dict[str, Any]:
+        """读取并解析Markdown文件（与 MarkdownProcessor.parse_file 接口一致）"""
+        return self.parse(Path(markdown_path).read_text(encoding='utf-8'))
+
     def process(self, markdown_path: str, output_path: str) -> Path:
         """将原来独立的 process_markdown_file 函数集成为类方法"""
         try:
@@ -6,6 +6,8 @@ from collections import defaultdict
 class RestoreProcessor:
     """恢复处理器, 将提供的json文件还原成中英两篇md文档"""
 
+    VERSION = 1
+
     def __init__(self):
         """初始化恢复处理器"""
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
@@ -178,8 +180,21 @@ class RestoreProcessor:
         读取 input.json，恢复成中英文两篇md文档
         1. 中文用翻译部分；如果没有翻译则保留英文原文
         """
+        input_path = Path(input_path)
+        self.logger.info(f"开始处理JSON文件: {input_path}")
+        try:
+            with input_path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"JSON处理失败: {str(e)}", exc_info=True)
+            raise
+        return self.process_data(data, output_path_en, output_path_zh)
+
+    def process_data(self, data, output_path_en: str, output_path_zh: str) -> tuple:
+        """
+        将内存中的文档恢复成中英文两篇md文档（只读取 data，不做修改）
+        """
         try:
-            input_path = Path(input_path)
             output_path_en = Path(output_path_en)
             output_path_zh = Path(output_path_zh)
             
@@ -191,10 +206,6 @@ class RestoreProcessor:
             open(output_path_en, 'w', encoding='utf-8').close()
             open(output_path_zh, 'w', encoding='utf-8').close()
             
-            self.logger.info(f"开始处理JSON文件: {input_path}")
-            with input_path.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-            
             # 处理文档标题
             title_en = data.get('title', '')
             self._write_to_md(output_path_en, f"# {title_en}")
@@ -0,0 +1,146 @@
+"""
+magic_pdf 版面/公式/OCR 模型的常驻管理
+
+magic_pdf 在进程内以单例缓存已加载的模型（按 ocr 等参数区分），首次调用 doc_analyze
+时才加载，耗时数秒到数十秒。这里在每个进程中统一管理加载：可以在启动时预加载，
+之后的论文直接复用常驻模型，并对外提供各模式的就绪状态。
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 模型状态
+MODEL_NOT_LOADED = 'not_loaded'
+MODEL_LOADING = 'loading'
+MODEL_READY = 'ready'
+MODEL_FAILED = 'failed'
+
+# 预热用的单页文档内容：走一遍完整的 doc_analyze，使该模式用到的全部模型进入 magic_pdf 的单例缓存
+_WARMUP_TEXT = "Model warm-up page. The quick brown fox jumps over the lazy dog. E = mc^2"
+
+
+def _mode_name(ocr: bool) -> str:
+    return 'ocr' if ocr else 'txt'
+
+
+def _warm_up(ocr: bool) -> None:
+    """用单页文档运行一次 doc_analyze，加载该模式的模型"""
+    import fitz  # PyMuPDF，magic_pdf 的依赖
+    from magic_pdf.data.dataset import PymuDocDataset
+    from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 72), _WARMUP_TEXT)
+        pdf_bytes = doc.tobytes()
+    PymuDocDataset(pdf_bytes).apply(doc_analyze, ocr=ocr)
+
+
+class PDFModelManager:
+    """
+    进程内的模型管理器
+
+    OCR模式与文本层模式在 magic_pdf 中是两套模型实例，分别加载、分别记录状态。
+    加载过程串行执行（magic_pdf 的模型单例不是线程安全的），
+    同一模式的并发请求只加载一次，其余等待加载完成。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._states: Dict[bool, str] = {}
+        self._load_seconds: Dict[bool, float] = {}
+        self._errors: Dict[bool, str] = {}
+
+    def state(self, ocr: bool) -> str:
+        with self._state_lock:
+            return self._states.get(ocr, MODEL_NOT_LOADED)
+
+    def is_ready(self, ocr: bool) -> bool:
+        return self.state(ocr) == MODEL_READY
+
+    def ensure_ready(self, ocr: bool) -> float:
+        """
+        确保指定模式的模型已加载
+
+        Returns:
+            float: 本次调用为等待模型加载花费的秒数，模型已常驻时为0
+
+        Raises:
+            Exception: 模型加载失败时抛出原始异常（下次调用会重新尝试加载）
+        """
+        if self.is_ready(ocr):
+            return 0.0
+        start = time.perf_counter()
+        with self._load_lock:
+            if not self.is_ready(ocr):
+                self._set_state(ocr, MODEL_LOADING)
+                self.logger.info(f"开始加载PDF解析模型（{_mode_name(ocr)}模式）...")
+                try:
+                    _warm_up(ocr)
+                except Exception as e:
+                    self._set_state(ocr, MODEL_FAILED, error=f"{type(e).__name__}: {e}")
+                    raise
+                seconds = time.perf_counter() - start
+                self._set_state(ocr, MODEL_READY, seconds=seconds)
+                self.logger.info(f"PDF解析模型（{_mode_name(ocr)}模式）加载完成，耗时 {seconds:.1f} 秒")
+        return time.perf_counter() - start
+
+    def preload(self, modes: Iterable[bool] = (True, False)) -> bool:
+        """
+        预加载指定模式的模型（失败时只记录，不抛出异常），返回是否全部就绪
+        """
+        ready = True
+        for ocr in modes:
+            try:
+                self.ensure_ready(ocr)
+            except Exception as e:
+                ready = False
+                self.logger.error(f"预加载PDF解析模型（{_mode_name(ocr)}模式）失败: {e}")
+        return ready
+
+    def preload_async(self, modes: Iterable[bool] = (True, False)) -> threading.Thread:
+        """在后台线程中预加载模型"""
+        thread = threading.Thread(target=self.preload, args=(tuple(modes),),
+                                  name="pdf-model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Dict[str, object]]:
+        """各模式的模型状态: {'ocr': {'state', 'load_seconds', 'error'}, 'txt': {...}}"""
+        with self._state_lock:
+            return {
+                _mode_name(ocr): {
+                    'state': self._states.get(ocr, MODEL_NOT_LOADED),
+                    'load_seconds': round(self._load_seconds[ocr], 3) if ocr in self._load_seconds else None,
+                    'error': self._errors.get(ocr)
+                }
+                for ocr in (True, False)
+            }
+
+    def _set_state(self, ocr: bool, state: str, seconds: Optional[float] = None, error: Optional[str] = None) -> None:
+        with self._state_lock:
+            self._states[ocr] = state
+            if seconds is not None:
+                self._load_seconds[ocr] = seconds
+            if error is not None:
+                self._errors[ocr] = error
+            elif state == MODEL_READY:
+                self._errors.pop(ocr, None)
+
+
+_manager: Optional[PDFModelManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> PDFModelManager:
+    """获取当前进程的模型管理器（主进程与每个分片进程各有一个）"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PDFModelManager()
+        return _manager
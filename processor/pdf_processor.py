@@ -1,70 +1,687 @@
 from pathlib import Path
 import logging
+import multiprocessing
+import hashlib
+import json
+import os
+import shutil
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
 
-from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
-from magic_pdf.data.dataset import PymuDocDataset
-from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+from processor.pdf_models import (get_model_manager, MODEL_NOT_LOADED, MODEL_LOADING,
+                                  MODEL_READY, MODEL_FAILED)
+from util.config import (PDF_SHARD_PAGES, PDF_SHARD_WORKERS, PDF_TEXT_FAST_PATH, PDF_PAGE_CACHE,
+                         PDF_PAGE_CACHE_MAX_MB, PDF_PAGE_CACHE_BLOCK_PAGES)
+from util.cancellation import check_cancelled
+from util.metrics import record_stage_info
+from util.progress import current_progress
 
 logger = logging.getLogger(__name__)
 
+# 分片转换的临时输出目录（位于论文输出目录下，拼接完成后删除）
+SHARD_DIR_NAME = ".pdf_shards"
+# 页面缓存目录（位于所有论文共用的输出根目录下，不同论文之间共享）
+PAGE_CACHE_DIR_NAME = ".page_cache"
+# 计算页面指纹时渲染位图的分辨率
+PAGE_FINGERPRINT_DPI = 72
+
+# 段落以这些字符结尾时视为完整，不与下一分片开头的段落合并
+_SENTENCE_END = tuple('.!?:;。！？：；)]"\'”’')
+
+# 以这些前缀开头的块不是正文段落（标题、图片、表格、公式、代码）
+_NON_TEXT_PREFIXES = ('#', '![', '<', '$$', '|', '```')
+
+# 页面分类阈值：文本层字符数少于该值的页面视为没有可用文本层
+MIN_TEXT_CHARS = 50
+# 文本层中乱码字符（替换字符、私用区、控制字符）占比超过该值时视为字体编码损坏
+MAX_BAD_CHAR_RATIO = 0.1
+# 图片覆盖页面面积超过该比例时视为扫描页
+SCANNED_IMAGE_COVERAGE = 0.9
+# 需要OCR的页面占比达到该值时整篇OCR，避免切成大量零碎片段
+WHOLE_DOCUMENT_OCR_RATIO = 0.5
+
+
+def _page_needs_ocr(page) -> bool:
+    """
+    判断单页是否需要OCR
+
+    没有文本层（字符太少）、文本层乱码（字体缺少Unicode映射）、
+    或整页被图片覆盖（扫描页，即使带有文本层其质量也无法保证）时需要OCR。
+    """
+    text = page.get_text("text")
+    glyphs = [c for c in text if not c.isspace()]
+    if len(glyphs) < MIN_TEXT_CHARS:
+        return True
+    bad = sum(1 for c in glyphs if c == '\ufffd' or unicodedata.category(c) in ('Co', 'Cc'))
+    if bad / len(glyphs) > MAX_BAD_CHAR_RATIO:
+        return True
+    page_area = page.rect.width * page.rect.height
+    if page_area <= 0:
+        return True
+    image_area = 0.0
+    for image in page.get_image_info():
+        x0, y0, x1, y1 = image['bbox']
+        image_area += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    return image_area / page_area >= SCANNED_IMAGE_COVERAGE
+
+
+def classify_pages(pdf_bytes: bytes) -> List[bool]:
+    """逐页判断是否需要OCR，返回每页的判断结果"""
+    import fitz  # PyMuPDF，magic_pdf 的依赖
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [_page_needs_ocr(page) for page in doc]
+
+
+def plan_segments(needs_ocr: List[bool], shard_pages: int = 0) -> List[Tuple[int, int, bool]]:
+    """
+    将页面划分为连续片段，每个片段内使用同一种转换模式
+
+    需要OCR的页面占多数时整篇OCR；否则文本页与OCR页按连续区间分开。
+    shard_pages > 0 时片段再按页数上限切分，以便并行转换。
+
+    Returns:
+        List[Tuple[int, int, bool]]: [(起始页, 结束页（不含）, 是否OCR)]
+    """
+    if needs_ocr and sum(needs_ocr) / len(needs_ocr) >= WHOLE_DOCUMENT_OCR_RATIO:
+        needs_ocr = [True] * len(needs_ocr)
+    segments = []
+    start = 0
+    for page in range(1, len(needs_ocr) + 1):
+        if page == len(needs_ocr) or needs_ocr[page] != needs_ocr[start] \
+                or (shard_pages > 0 and page - start >= shard_pages):
+            segments.append((start, page, needs_ocr[start]))
+            start = page
+    return segments
+
+
+def page_fingerprints(pdf_bytes: bytes) -> List[str]:
+    """
+    计算每页的内容指纹：低分辨率灰度渲染位图加文本层的哈希
+
+    与PDF的对象编号和文件结构无关，修订后重新生成的PDF中未改动的页面指纹不变。
+    """
+    import fitz  # PyMuPDF，magic_pdf 的依赖
+
+    fingerprints = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            pixmap = page.get_pixmap(dpi=PAGE_FINGERPRINT_DPI, colorspace=fitz.csGRAY)
+            digest = hashlib.sha256()
+            digest.update(f"{pixmap.width}x{pixmap.height}\n".encode())
+            digest.update(pixmap.samples)
+            digest.update(page.get_text("text").encode('utf-8'))
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+class PageCache:
+    """
+    页面解析结果缓存
+
+    缓存条目是连续若干页（同一转换模式）一次转换得到的Markdown片段，由各页的
+    (页面指纹, 转换模式, 处理逻辑版本) 键标识。magic_pdf 会在一次转换内合并跨页的段落和表格、
+    统计标题层级，其输出无法再拆回单页，因此条目按整段复用：重新导入时只有一段页面全部未改动才命中。
+    条目按首页的键建立索引；片段引用的图片按内容哈希命名，硬链接到共用的图片目录中。
+    缓存总大小超过 max_bytes 时按最近使用时间淘汰条目，并删除不再被引用的图片。
+    """
+
+    def __init__(self, cache_dir: Path, version: int, max_bytes: int = 0):
+        self.cache_dir = Path(cache_dir)
+        self.version = version
+        self.max_bytes = max_bytes
+        self.runs_dir = self.cache_dir / "runs"
+        self.index_dir = self.cache_dir / "index"
+        self.images_dir = self.cache_dir / "images"
+
+    def key(self, fingerprint: str, ocr: bool) -> str:
+        return hashlib.sha256(f"{fingerprint}:{int(ocr)}:{self.version}".encode()).hexdigest()
+
+    @staticmethod
+    def run_key(page_keys: List[str]) -> str:
+        return hashlib.sha256("\n".join(page_keys).encode()).hexdigest()
+
+    def _entry_path(self, run_key: str) -> Path:
+        return self.runs_dir / run_key[:2] / f"{run_key}.json"
+
+    def _index_path(self, page_key: str) -> Path:
+        return self.index_dir / page_key[:2] / f"{page_key}.json"
+
+    def match(self, keys: List[str], start: int) -> Optional[Dict[str, Any]]:
+        """查找从第 start 页开始、各页都未改动的最长缓存条目，没有时返回None"""
+        try:
+            candidates = json.loads(self._index_path(keys[start]).read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            return None
+        best = None
+        for run_key in candidates:
+            entry = self.load(run_key)
+            if entry is None or keys[start:start + len(entry['pages'])] != entry['pages']:
+                continue
+            if best is None or len(entry['pages']) > len(best['pages']):
+                best = entry
+        if best is not None:
+            # 更新修改时间作为最近使用时间，淘汰时保留常用的条目
+            try:
+                os.utime(self._entry_path(self.run_key(best['pages'])))
+            except OSError:
+                pass
+        return best
+
+    def load(self, run_key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，条目不存在或引用的图片缺失时返回None"""
+        try:
+            with open(self._entry_path(run_key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not all((self.images_dir / name).exists() for name in entry['images']):
+            return None
+        return entry
+
+    def store(self, page_keys: List[str], markdown: str, images_dir: Path) -> Dict[str, Any]:
+        """保存一段页面的片段及其图片（先写临时文件再替换，多篇论文同时写入同一段页面时结果相同）"""
+        images = sorted(p.name for p in images_dir.iterdir()) if images_dir.is_dir() else []
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        for name in images:
+            link_or_copy(images_dir / name, self.images_dir / name)
+        entry = {'pages': page_keys, 'markdown': markdown, 'images': images}
+        run_key = self.run_key(page_keys)
+        _write_atomic(self._entry_path(run_key), json.dumps(entry, ensure_ascii=False))
+
+        index_path = self._index_path(page_keys[0])
+        try:
+            candidates = json.loads(index_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            candidates = []
+        if run_key not in candidates:
+            _write_atomic(index_path, json.dumps(candidates + [run_key]))
+        return entry
+
+    def evict(self) -> int:
+        """缓存总大小超过上限时按最近使用时间淘汰条目（及只被这些条目引用的图片），返回淘汰的条目数"""
+        if self.max_bytes <= 0 or not self.runs_dir.is_dir():
+            return 0
+        runs = []
+        references: Dict[str, int] = {}
+        for path in self.runs_dir.glob('*/*.json'):
+            # 其他论文可能同时在淘汰，列出后已被删除的条目直接跳过
+            try:
+                stat = path.stat()
+                text = path.read_text(encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                images = json.loads(text)['images']
+            except (json.JSONDecodeError, KeyError, TypeError):
+                images = []
+            runs.append((stat.st_mtime, path, stat.st_size, images))
+            for name in images:
+                references[name] = references.get(name, 0) + 1
+        image_sizes = {}
+        if self.images_dir.is_dir():
+            for image in self.images_dir.iterdir():
+                try:
+                    image_sizes[image.name] = image.stat().st_size
+                except FileNotFoundError:
+                    continue
+        total = sum(size for _, _, size, _ in runs) + sum(image_sizes.values())
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, path, size, images in sorted(runs, key=lambda run: run[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+            for name in images:
+                references[name] -= 1
+                if references[name] == 0 and name in image_sizes:
+                    (self.images_dir / name).unlink(missing_ok=True)
+                    total -= image_sizes[name]
+        logger.info(f"页面缓存超过 {self.max_bytes / 1e6:.0f} MB，淘汰 {evicted} 个条目")
+        return evicted
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(text, encoding='utf-8')
+    tmp_path.replace(path)
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """目标不存在时将 source 硬链接为 target（文件系统不支持硬链接时复制）"""
+    if target.exists():
+        return
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    tmp_path.replace(target)
+
+
+def _convert_pdf(pdf_bytes: bytes, output_dir: str, md_name: str, ocr: bool = True) -> str:
+    """
+    用 magic_pdf 将PDF（或PDF片段）转换为Markdown，图片写入 output_dir/images
+
+    Args:
+        ocr: True 使用OCR模式，False 直接提取文本层（速度快得多）
+
+    Returns:
+        str: 生成的Markdown文件路径
+    """
+    # magic_pdf 导入时会加载大量模型相关依赖，只在真正处理PDF时导入
+    from magic_pdf.data.data_reader_writer import FileBasedDataWriter
+    from magic_pdf.data.dataset import PymuDocDataset
+    from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+
+    # 模型常驻于进程内，只有首次转换（或未预加载时）需要等待加载
+    load_seconds = get_model_manager().ensure_ready(ocr)
+    if load_seconds > 0.5:
+        record_stage_info(model_load_seconds=round(load_seconds, 2))
+
+    output_dir = Path(output_dir)
+    image_writer = FileBasedDataWriter(str(output_dir / "images"))
+    md_writer = FileBasedDataWriter(str(output_dir))
+    ds = PymuDocDataset(pdf_bytes)
+    infer_result = ds.apply(doc_analyze, ocr=ocr)
+    if ocr:
+        pipe_result = infer_result.pipe_ocr_mode(image_writer)
+    else:
+        pipe_result = infer_result.pipe_txt_mode(image_writer)
+    pipe_result.dump_md(md_writer, md_name, "images")
+    return str(output_dir / md_name)
+
+
+def _init_shard_worker(threads: int, preload_modes: Tuple[bool, ...] = (), status_queue=None) -> None:
+    """
+    分片进程初始化：限制每个进程的计算线程数，避免多个进程争抢CPU，
+    并预加载模型，使模型常驻于进程中供之后的论文复用；加载结束后通过 status_queue 回报模型状态
+    """
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    # 预加载失败不影响进程启动，转换时会重新尝试加载并抛出原始错误
+    get_model_manager().preload(preload_modes)
+    if status_queue is not None:
+        status_queue.put((os.getpid(), get_model_manager().status()))
+
+
+def _noop() -> None:
+    """空任务，用于让进程池启动全部进程"""
+
+
+def split_pdf(pdf_bytes: bytes, segments: List[Tuple[int, int, bool]]) -> List[bytes]:
+    """按片段的页码范围切分PDF，返回各片段的PDF内容"""
+    import fitz  # PyMuPDF，magic_pdf 的依赖
+
+    parts = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for start, end, _ in segments:
+            with fitz.open() as part:
+                part.insert_pdf(doc, from_page=start, to_page=end - 1)
+                parts.append(part.tobytes())
+    return parts
+
+
+def _is_text_block(block: str) -> bool:
+    block = block.strip()
+    return bool(block) and not block.startswith(_NON_TEXT_PREFIXES)
+
+
+def stitch_markdown(parts: List[str]) -> str:
+    """
+    按页序拼接各分片的Markdown
+
+    magic_pdf 会合并跨页的段落，但分片之间做不到：上一分片以未结束的句子收尾、
+    下一分片以小写字母开头的正文段落，是同一段落被分片边界截断，拼接时合并回一段。
+    标题不做特殊处理，标题层级和章节嵌套由 md2json 阶段对拼接后的整篇文档统一解析，
+    与是否分片无关。
+    """
+    result = ""
+    for part in parts:
+        part = part.strip("\n")
+        if not part:
+            continue
+        if not result:
+            result = part
+            continue
+        tail = result.rsplit("\n\n", 1)[-1]
+        head, separator, rest = part.partition("\n\n")
+        if (_is_text_block(tail) and _is_text_block(head)
+                and not tail.rstrip().endswith(_SENTENCE_END) and head.lstrip()[:1].islower()):
+            result = result.rstrip() + " " + head.lstrip() + separator + rest
+        else:
+            result += "\n\n" + part
+    return result + "\n"
+
+
+def _overall_state(states: List[str]) -> str:
+    """汇总多个模型状态：全部就绪为 ready，有失败为 failed，有加载中为 loading"""
+    if not states:
+        return MODEL_NOT_LOADED
+    for state in (MODEL_FAILED, MODEL_LOADING, MODEL_NOT_LOADED):
+        if state in states:
+            return state
+    return MODEL_READY
+
+
 class PDFProcessor:
     """PDF处理器：将PDF转换为Markdown格式"""
-    
-    def __init__(self):
+
+    VERSION = 2
+
+    def __init__(self, shard_pages: Optional[int] = None, shard_workers: Optional[int] = None,
+                 text_fast_path: Optional[bool] = None, page_cache: Optional[bool] = None,
+                 page_cache_block_pages: Optional[int] = None):
         """
         初始化PDF处理器
+
+        Args:
+            shard_pages: 分片转换时每个分片的页数，0表示整篇转换，默认取 PDF_SHARD_PAGES
+            shard_workers: 分片转换的进程数，默认取 PDF_SHARD_WORKERS
+            text_fast_path: 有文本层的页面是否跳过OCR，默认取 PDF_TEXT_FAST_PATH
+            page_cache: 是否按页缓存解析结果，默认取 PDF_PAGE_CACHE
+            page_cache_block_pages: 启用页面缓存时每个页块的页数，默认取 PDF_PAGE_CACHE_BLOCK_PAGES
         """
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.logger.debug("初始化PDF处理器")
+        self.shard_pages = PDF_SHARD_PAGES if shard_pages is None else shard_pages
+        self.shard_workers = PDF_SHARD_WORKERS if shard_workers is None else shard_workers
+        self.text_fast_path = PDF_TEXT_FAST_PATH if text_fast_path is None else text_fast_path
+        self.page_cache = PDF_PAGE_CACHE if page_cache is None else page_cache
+        self.page_cache_block_pages = max(1, PDF_PAGE_CACHE_BLOCK_PAGES if page_cache_block_pages is None
+                                          else page_cache_block_pages)
+        # 分片转换的进程池在首次使用时创建，之后的论文复用（避免每篇论文重新加载模型）
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # 分片进程在初始化时回报的模型状态: {进程号: 各模式状态}
+        self._status_queue = None
+        self._worker_models: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._pool_warming = False
+
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响转换结果的参数（转换模式的选择、分片和页块的拼接），用于计算阶段缓存键"""
+        return {
+            'text_fast_path': self.text_fast_path,
+            'shard_pages': self.shard_pages,
+            'page_cache_block_pages': self.page_cache_block_pages if self.page_cache else 0
+        }
+
+    @property
+    def preload_modes(self) -> Tuple[bool, ...]:
+        """需要常驻的模型模式：始终需要OCR模式，启用文本层快速路径时还需要文本层模式"""
+        return (True, False) if self.text_fast_path else (True,)
+
+    def warm_up(self) -> None:
+        """
+        启动时预加载模型（不阻塞），之后的论文无需等待模型加载
+
+        分片转换时启动全部分片进程，各进程在初始化时加载模型；
+        否则在当前进程的后台线程中加载。
+        """
+        if self.shard_pages > 0:
+            # 进程池按需启动进程：没有空闲进程时每提交一个任务启动一个进程
+            pool = self._get_pool()
+            for _ in range(max(1, self.shard_workers)):
+                pool.submit(_noop)
+            with self._pool_lock:
+                self._pool_warming = True
+        else:
+            get_model_manager().preload_async(self.preload_modes)
+
+    def model_status(self) -> Dict[str, Any]:
+        """
+        模型就绪状态
+
+        Returns:
+            Dict: {'state': not_loaded/loading/ready/failed, 'workers': 各进程的各模式状态}
+        """
+        if self.shard_pages <= 0:
+            modes = get_model_manager().status()
+            states = [modes['ocr' if ocr else 'txt']['state'] for ocr in self.preload_modes]
+            return {'state': _overall_state(states), 'workers': {os.getpid(): modes}}
+
+        with self._pool_lock:
+            while self._status_queue is not None and not self._status_queue.empty():
+                pid, modes = self._status_queue.get()
+                self._worker_models[pid] = modes
+            workers = dict(self._worker_models)
+            expected = max(1, self.shard_workers) if self._pool_warming else len(workers)
+        states = [modes['ocr' if ocr else 'txt']['state']
+                  for modes in workers.values() for ocr in self.preload_modes]
+        # 已请求启动、尚未回报的进程仍在加载模型
+        states.extend([MODEL_LOADING] * max(0, expected - len(workers)))
+        return {'state': _overall_state(states), 'workers': workers}
 
     def process(self, pdf_path: str, output_dir: str) -> Path:
         """
         处理PDF文件
-        
+
         Args:
             pdf_path: PDF文件路径
             output_dir: 输出目录路径
 
         Returns:
             Path: 生成的Markdown文件路径
-        
+
         Raises:
             FileNotFoundError: 当PDF文件不存在时
         """
         pdf_path = Path(pdf_path)
         output_dir = Path(output_dir)
-        
+
         if not pdf_path.exists():
             raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
 
-        # try:
         # 设置输出路径
         print(f"[PDFProcessor] 开始处理PDF", pdf_path, output_dir)
         paper_name = pdf_path.stem
-        output_image_path = output_dir / "images"
-        local_image_path = 'images'
-        
-        # 初始化图片写入器
-        image_writer = FileBasedDataWriter(str(output_image_path))
-        md_writer = FileBasedDataWriter(str(output_dir))
-        
+
         # 读取PDF文件
-        reader = FileBasedDataReader("")
-        pdf_bytes = reader.read(pdf_path)  # 读取PDF内容
-        
-        # 创建数据集实例
-        ds = PymuDocDataset(pdf_bytes)
-        
-        # 处理PDF
-        self.logger.info("开始PDF处理流程...")
-        ds.apply(doc_analyze, ocr=True).pipe_ocr_mode(image_writer).dump_md(md_writer, f"{paper_name}.md", local_image_path)
-        
-        # 生成Markdown路径
-        markdown_path = output_dir / f"{paper_name}.md"
-        
+        pdf_bytes = pdf_path.read_bytes()
+
+        # 逐页判断是否有可用文本层，划分转换片段
+        if self.text_fast_path:
+            needs_ocr = classify_pages(pdf_bytes)
+        else:
+            import fitz  # PyMuPDF，magic_pdf 的依赖
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                needs_ocr = [True] * doc.page_count
+        segments = plan_segments(needs_ocr, self.shard_pages)
+        self._record_mode(needs_ocr, segments)
+
+        if self.page_cache:
+            # 缓存目录位于所有论文共用的输出根目录下，同一论文的修订版可以复用未改动的页面
+            cache = PageCache(output_dir.parent / PAGE_CACHE_DIR_NAME, self.VERSION, PDF_PAGE_CACHE_MAX_MB * 1_000_000)
+            modes = [ocr for start, end, ocr in segments for _ in range(start, end)]
+            markdown_path = self._process_with_page_cache(pdf_bytes, modes, cache, output_dir, paper_name)
+        elif len(segments) > 1:
+            markdown_path = self._process_segments(pdf_bytes, segments, output_dir, paper_name)
+        else:
+            # 处理PDF
+            ocr = segments[0][2] if segments else True
+            self.logger.info(f"开始PDF处理流程（{'OCR' if ocr else '文本层提取'}模式）...")
+            markdown_path = Path(_convert_pdf(pdf_bytes, str(output_dir), f"{paper_name}.md", ocr))
+
         self.logger.info(f"Markdown文件已保存到: {markdown_path}")
         return markdown_path
-            
-        # except Exception as e:
-        #     self.logger.error(f"PDF处理失败: {str(e)}", exc_info=True)
-        #     raise
+
+    def _record_mode(self, needs_ocr: List[bool], segments: List[Tuple[int, int, bool]]) -> None:
+        """将转换模式记录到阶段指标"""
+        ocr_pages = sum(end - start for start, end, ocr in segments if ocr)
+        text_pages = sum(end - start for start, end, ocr in segments if not ocr)
+        mode = 'ocr' if not text_pages else ('txt' if not ocr_pages else 'mixed')
+        self.logger.info(f"PDF转换模式: {mode}（文本层 {text_pages} 页，OCR {ocr_pages} 页）")
+        record_stage_info(pdf_mode=mode, ocr_pages=ocr_pages, text_pages=text_pages,
+                          pages_without_text_layer=sum(needs_ocr), segments=len(segments))
+
+    def _process_with_page_cache(self, pdf_bytes: bytes, modes: List[bool], cache: PageCache,
+                                 output_dir: Path, paper_name: str) -> Path:
+        """
+        复用缓存中各页都未改动的页段，其余页面按连续、同一转换模式的片段转换后存入缓存，
+        再按页序拼接Markdown；片段之间截断的段落由 stitch_markdown 合并
+
+        片段不跨越固定页数的页块边界（与分片页数无关），即使整篇都未命中也按页块转换和缓存，
+        修订后重新导入时只有改动页所在的页块需要重新转换。
+        """
+        keys = [cache.key(fingerprint, ocr) for fingerprint, ocr in zip(page_fingerprints(pdf_bytes), modes)]
+        parts: List[Tuple[int, Dict[str, Any]]] = []
+        missing: List[Tuple[int, int, bool]] = []
+        page = 0
+        while page < len(keys):
+            entry = cache.match(keys, page)
+            if entry is not None:
+                parts.append((page, entry))
+                page += len(entry['pages'])
+                continue
+            # 与上一个未命中的页面相邻、模式相同且在同一页块内时并入同一片段
+            if missing and missing[-1][1] == page and missing[-1][2] == modes[page] \
+                    and page % self.page_cache_block_pages != 0:
+                missing[-1] = (missing[-1][0], page + 1, modes[page])
+            else:
+                missing.append((page, page + 1, modes[page]))
+            page += 1
+        missing_pages = sum(end - start for start, end, _ in missing)
+        self.logger.info(f"页面缓存命中 {len(keys) - missing_pages}/{len(keys)} 页，"
+                         f"其余页面分 {len(missing)} 个片段转换")
+        record_stage_info(page_cache_hits=len(keys) - missing_pages, page_cache_misses=missing_pages)
+
+        shard_root = output_dir / SHARD_DIR_NAME
+        if missing:
+            shutil.rmtree(shard_root, ignore_errors=True)
+            converted = self._convert_segments(pdf_bytes, missing, shard_root, paper_name)
+            for index, ((start, end, _), markdown) in enumerate(zip(missing, converted)):
+                entry = cache.store(keys[start:end], markdown, shard_root / f"{index:04d}" / "images")
+                parts.append((start, entry))
+            parts.sort(key=lambda part: part[0])
+
+        images_dir = output_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        for _, entry in parts:
+            for name in entry['images']:
+                link_or_copy(cache.images_dir / name, images_dir / name)
+
+        markdown_path = output_dir / f"{paper_name}.md"
+        tmp_path = markdown_path.with_name(markdown_path.name + '.tmp')
+        tmp_path.write_text(stitch_markdown([entry['markdown'] for _, entry in parts]), encoding='utf-8')
+        tmp_path.replace(markdown_path)
+        shutil.rmtree(shard_root, ignore_errors=True)
+        cache.evict()
+        return markdown_path
+
+    def _process_segments(self, pdf_bytes: bytes, segments: List[Tuple[int, int, bool]],
+                          output_dir: Path, paper_name: str) -> Path:
+        """分片段转换并按页序拼接Markdown、合并图片目录"""
+        self.logger.info(f"PDF共 {segments[-1][1]} 页，分为 {len(segments)} 个片段转换")
+        shard_root = output_dir / SHARD_DIR_NAME
+        shutil.rmtree(shard_root, ignore_errors=True)
+        parts = self._convert_segments(pdf_bytes, segments, shard_root, paper_name)
+
+        # 合并图片：magic_pdf 按图片内容的哈希命名，同名文件内容相同
+        images_dir = output_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        for index in range(len(segments)):
+            shard_images = shard_root / f"{index:04d}" / "images"
+            if not shard_images.is_dir():
+                continue
+            for image in shard_images.iterdir():
+                target = images_dir / image.name
+                if not target.exists():
+                    shutil.move(str(image), str(target))
+
+        markdown_path = output_dir / f"{paper_name}.md"
+        tmp_path = markdown_path.with_name(markdown_path.name + '.tmp')
+        tmp_path.write_text(stitch_markdown(parts), encoding='utf-8')
+        tmp_path.replace(markdown_path)
+        shutil.rmtree(shard_root, ignore_errors=True)
+        return markdown_path
+
+    def _convert_segments(self, pdf_bytes: bytes, segments: List[Tuple[int, int, bool]],
+                          shard_root: Path, paper_name: str) -> List[str]:
+        """
+        转换各片段，返回各片段的Markdown（第 i 个片段的图片位于 shard_root/<i>/images）
+
+        配置了分片页数时各片段在进程池中并行转换，否则在当前进程中依次转换。
+        """
+        total_pages = sum(end - start for start, end, _ in segments)
+        parts_bytes = split_pdf(pdf_bytes, segments)
+
+        progress = current_progress()
+        progress.start(total_pages, unit='页')
+        parts: List[Optional[str]] = [None] * len(segments)
+
+        def on_done(index: int, md_path: str) -> None:
+            start, end, ocr = segments[index]
+            parts[index] = Path(md_path).read_text(encoding='utf-8')
+            self.logger.info(f"片段 {index + 1}/{len(segments)}（第 {start + 1}-{end} 页，"
+                             f"{'OCR' if ocr else '文本层'}）转换完成")
+            progress.advance(end - start)
+
+        args = [(data, str(shard_root / f"{index:04d}"), f"{paper_name}.md", segments[index][2])
+                for index, data in enumerate(parts_bytes)]
+        if self.shard_pages > 0:
+            self._convert_in_pool(args, on_done)
+        else:
+            for index, task in enumerate(args):
+                check_cancelled()
+                on_done(index, _convert_pdf(*task))
+        progress.finish()
+        return parts
+
+    def _convert_in_pool(self, args: List[tuple], on_done) -> None:
+        """在进程池中并行转换各片段，每个片段完成时在当前线程中回调 on_done(序号, Markdown路径)"""
+        pool = self._get_pool()
+        futures = {pool.submit(_convert_pdf, *task): index for index, task in enumerate(args)}
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                check_cancelled()
+                for future in done:
+                    on_done(futures[future], future.result())
+        except BaseException as e:
+            for future in futures:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                # 子进程异常退出（如内存不足）后进程池不可再用，下次重新创建
+                with self._pool_lock:
+                    self._reset_pool_state()
+            raise
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """获取分片转换的进程池（spawn方式启动，避免fork带有CUDA或线程状态的父进程）"""
+        with self._pool_lock:
+            if self._pool is None:
+                workers = max(1, self.shard_workers)
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                context = multiprocessing.get_context("spawn")
+                self._status_queue = context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=context,
+                    initializer=_init_shard_worker,
+                    initargs=(threads, self.preload_modes, self._status_queue)
+                )
+            return self._pool
+
+    def _reset_pool_state(self) -> None:
+        """丢弃进程池及其进程的模型状态（调用方持有 _pool_lock）"""
+        self._pool = None
+        self._status_queue = None
+        self._worker_models = {}
+        self._pool_warming = False
+
+    def shutdown(self) -> None:
+        """关闭分片转换的进程池"""
+        with self._pool_lock:
+            pool = self._pool
+            self._reset_pool_state()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
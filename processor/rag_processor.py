@@ -2,18 +2,25 @@ import json
 import logging
 from pathlib import Path
 from typing import Tuple, Dict, List, Any
-from langchain.text_splitter import MarkdownHeaderTextSplitter
-from langchain_community.vectorstores.faiss import FAISS
-from langchain_community.vectorstores.utils import DistanceStrategy
-from util.config import EmbeddingModel
+from util.config import EmbeddingModel, EMBEDDING_MODEL_NAME
+from util.progress import current_progress
+
+# 向量库分批嵌入的文档片段数，用于报告阶段内进度
+EMBEDDING_BATCH_SIZE = 32
 
 class RagProcessor:
     """RAG 处理器：将 JSON 转换为 Markdown 和符合检索需求的JSON树结构，并生成向量库"""
 
+    VERSION = 1
+
     def __init__(self):
         """初始化 RAG 处理器"""
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响向量库结果的参数，用于计算阶段缓存键"""
+        return {'embedding_model': EMBEDDING_MODEL_NAME}
+
     def process(self, input_path: str, output_md_path: str, output_tree_json_path: str, vector_store_path: str) -> Tuple[str, str, str]:
         """处理 JSON 文件，生成 Markdown、JSON以及向量库
 
@@ -31,7 +38,18 @@ class RagProcessor:
         try:
             with open(input_path, "r", encoding="utf-8") as f:
                 paper_data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"RAG 处理失败: {str(e)}", exc_info=True)
+            raise
+        return self.process_data(paper_data, output_md_path, output_tree_json_path, vector_store_path)
+
+    def process_data(self, paper_data: Dict, output_md_path: str, output_tree_json_path: str, vector_store_path: str) -> Tuple[str, str, str]:
+        """处理内存中的文档（会修改 paper_data），生成 Markdown、JSON以及向量库
 
+        Returns:
+            Tuple[str, str, str]: Markdown文件路径, JSON文件路径, 向量库路径
+        """
+        try:
             # 提取摘要并放入 summary 字段
             abstract_content = self._extract_abstract_summary(paper_data.get("sections", []))
             abstract_content = self._extract_abstract_summary(paper_data.get("sections", []))
@@ -74,6 +92,11 @@ class RagProcessor:
         Returns:
             str: 向量库路径
         """
+        # langchain / FAISS 导入较慢，只在生成向量库时导入
+        from langchain.text_splitter import MarkdownHeaderTextSplitter
+        from langchain_community.vectorstores.faiss import FAISS
+        from langchain_community.vectorstores.utils import DistanceStrategy
+
         self.logger.info(f"开始为 Markdown 创建向量库: {md_path}")
         
         # 确保向量库存储路径存在
@@ -92,12 +115,22 @@ class RagProcessor:
         
         self.logger.info(f"分割后得到 {len(docs)} 个文档片段")
         
-        # 创建向量存储
-        vector_store = FAISS.from_documents(
-            documents=docs,
-            embedding=EmbeddingModel.get_instance(),
-            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
-        )
+        # 创建向量存储，分批嵌入以便报告进度（FAISS按添加顺序追加向量，结果与一次性创建相同）
+        progress = current_progress()
+        progress.start(len(docs), unit='片段')
+        vector_store = None
+        for start in range(0, len(docs), EMBEDDING_BATCH_SIZE):
+            batch = docs[start:start + EMBEDDING_BATCH_SIZE]
+            if vector_store is None:
+                vector_store = FAISS.from_documents(
+                    documents=batch,
+                    embedding=EmbeddingModel.get_instance(),
+                    distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+                )
+            else:
+                vector_store.add_documents(batch)
+            progress.advance(len(batch))
+        progress.finish()
         
         # 保存向量存储
         vector_store.save_local(str(vector_store_path_obj))
@@ -1,11 +1,19 @@
+import bisect
 import json
 import logging
 import re
-import numpy as np
+from itertools import accumulate
 from pathlib import Path
-from typing import Dict, List, Any
-from sklearn.metrics.pairwise import cosine_similarity
-from util.config import EmbeddingModel
+from typing import Dict, List, Any, Optional, Sequence, Set, Tuple
+from util.config import EmbeddingModel, ROLE_TILING, TILING_SEGMENTATION
+from util.progress import current_progress
+
+# 每次调用嵌入模型的元素数，分批调用以便报告进度和响应取消
+EMBEDDING_BATCH_SIZE = 64
+
+# 长文本块的切分方式
+SEGMENTATION_DP = "dp"
+SEGMENTATION_GREEDY = "greedy"
 
 class TilingProcessor:
     """
@@ -14,8 +22,11 @@ class TilingProcessor:
     将处理后的JSON文件进行分割合并处理，为翻译阶段做准备
     使用向量相似度计算最佳切分点
     """
+
+    VERSION = 2
     
-    def __init__(self, min_length: int = 500, max_length: int = 2500, window_size: int = 3, step_size: int = 1):
+    def __init__(self, min_length: int = 500, max_length: int = 2500, window_size: int = 3, step_size: int = 1,
+                 segmentation: str = TILING_SEGMENTATION, embedding_model: Optional[str] = None):
         """
         初始化平铺处理器
         
@@ -24,12 +35,29 @@ class TilingProcessor:
             max_length: 文本块最大长度
             window_size: 相似度计算窗口大小
             step_size: 滑动窗口步长
+            segmentation: 切分方式，"dp" 为全局最优切分，"greedy" 为逐段贪心切分
+            embedding_model: 计算相似度的嵌入模型名称，默认为分块用途配置的模型（TILING_EMBEDDING_MODEL）
         """
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.min_length = min_length
         self.max_length = max_length
         self.window_size = window_size
         self.step_size = step_size
+        if segmentation not in (SEGMENTATION_DP, SEGMENTATION_GREEDY):
+            raise ValueError(f"未知的切分方式: {segmentation}")
+        self.segmentation = segmentation
+        self.embedding_model = embedding_model or EmbeddingModel.model_name(ROLE_TILING)
+
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响分块结果的参数，用于计算阶段缓存键"""
+        return {
+            'min_length': self.min_length,
+            'max_length': self.max_length,
+            'window_size': self.window_size,
+            'step_size': self.step_size,
+            'segmentation': self.segmentation,
+            'embedding_model': self.embedding_model
+        }
     
     def process(self, input_path: str, output_path: str) -> Path:
         """
@@ -48,11 +76,7 @@ class TilingProcessor:
         with open(input_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # 处理sections中的content
-        if 'sections' in data:
-            self.logger.info(f"开始处理文档sections，共 {len(data['sections'])} 个section")
-            self._process_sections(data['sections'])
-            self.logger.info("sections处理完成")
+        data = self.process_data(data)
         
         # 保存处理后的JSON文件
         output_file = Path(output_path)
@@ -62,6 +86,53 @@ class TilingProcessor:
         self.logger.info(f"处理完成，输出已保存到 {output_file}")
         return output_file
     
+    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理内存中的文档，将文本块进行合并分割（原地修改并返回 data）
+        """
+        # 每个需要嵌入的元素（句子或段落）为一个进度单元
+        progress = current_progress()
+        progress.start(self.count_work_units(data), unit='句')
+
+        # 处理sections中的content
+        if 'sections' in data:
+            self.logger.info(f"开始处理文档sections，共 {len(data['sections'])} 个section")
+            self._process_sections(data['sections'])
+            self.logger.info("sections处理完成")
+        progress.finish()
+        return data
+
+    def count_work_units(self, data: Dict[str, Any]) -> int:
+        """
+        预先统计需要计算嵌入的元素数
+
+        按与 _process_sections 相同的规则合并小文本块、切分大文本块，只计数不计算嵌入。
+        """
+        def count(sections: List[Dict[str, Any]]) -> int:
+            total = 0
+            for section in sections:
+                if section.get('type') in ['abstract', 'references']:
+                    continue
+                for item in self._merge_small_text_blocks(section.get('content', [])):
+                    if item['type'] == 'text' and len(item['content']) > self.max_length:
+                        total += self._count_embeddings(len(self._split_elements(item['content'])[0]))
+                total += count(section.get('children') or [])
+            return total
+
+        return count(data.get('sections') or [])
+
+    def _count_embeddings(self, element_count: int) -> int:
+        """TextTiling对给定数量的元素需要计算嵌入的元素数（元素过少时不计算嵌入）"""
+        return 0 if element_count < self.window_size + 2 else element_count
+
+    def _split_elements(self, text: str) -> Tuple[List[str], str]:
+        """将大文本块切分为TextTiling的基本元素，返回 (元素列表, 分割模式)"""
+        if '\n\n' in text:
+            # 使用换行符分割策略
+            return text.split('\n\n'), "delimiter"
+        # 使用句子分割策略
+        return self._split_into_sentences(text), "sentence"
+    
     def _process_sections(self, sections: List[Dict[str, Any]]) -> None:
         """
         处理sections列表，递归处理所有section内容，跳过abstract和references
@@ -109,14 +180,7 @@ class TilingProcessor:
                 original_index = item.get('index', 0)
                 
                 # 分割大文本块
-                if '\n\n' in item['content']:
-                    # 使用换行符分割策略
-                    elements = item['content'].split('\n\n')
-                    split_mode = "delimiter"
-                else:
-                    # 使用句子分割策略
-                    elements = self._split_into_sentences(item['content'])
-                    split_mode = "sentence"
+                elements, split_mode = self._split_elements(item['content'])
                 
                 # 使用统一的TextTiling算法进行分割
                 segments = self._texttiling(elements, split_mode)
@@ -204,85 +268,110 @@ class TilingProcessor:
             combined_text = ' '.join(elements) if split_mode == "sentence" else '\n\n'.join(elements)
             return [combined_text]
         
-        # 创建文本块（窗口）
-        blocks = []
-        for i in range(0, len(elements) - self.window_size + 1, self.step_size):
-            window = elements[i:i + self.window_size]
-            if split_mode == "sentence":
-                blocks.append(' '.join(window))
-            else:  # delimiter mode
-                blocks.append('\n'.join(window))
-        
-        # 计算每个块的嵌入向量 - 使用统一的EmbeddingModel
-        embedding_model = EmbeddingModel.get_instance()
-        block_embeddings = [embedding_model.embed_query(block) for block in blocks]
-        
-        # 计算相邻块之间的相似度                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                       
-        similarities = [cosine_similarity([block_embeddings[i]], [block_embeddings[i+1]])[0][0] 
-                        for i in range(len(block_embeddings)-1)]
-        
-        # 计算深度分数
-        depth_scores = [0] * len(elements)
-        for i in range(1, len(similarities)-1):
-            depth = (similarities[i-1] + similarities[i+1] - 2*similarities[i]) / 2
-            depth_scores[i+self.window_size//2] = depth
-        
+        joiner = ' ' if split_mode == "sentence" else '\n'
+        segments = []
+        start = 0
+        for boundary in self._segment_boundaries(elements):
+            segments.append(joiner.join(elements[start:boundary + 1]))
+            start = boundary + 1
+        return segments
+
+    def _segment_boundaries(self, elements: List[str]) -> List[int]:
+        """计算分段结果，返回各段最后一个元素的索引"""
+        depth_scores, potential_boundaries = self._depth_scores(elements)
+
+        # 找到最优分段
+        prefix_lengths = [0, *accumulate(len(element) for element in elements)]
+        if self.segmentation == SEGMENTATION_DP:
+            boundaries = self._dp_boundaries(prefix_lengths, potential_boundaries, depth_scores)
+        else:
+            boundaries = self._greedy_boundaries(prefix_lengths, potential_boundaries, depth_scores)
+
+        # 贪心切分时最后一个段落太小则并入前一段（段落长度包含元素之间的一个分隔字符）；
+        # 动态规划已将最后一段的长度计入代价，合并反而会破坏最优解
+        if self.segmentation == SEGMENTATION_GREEDY and len(boundaries) > 1:
+            last_start = boundaries[-2] + 1
+            last_length = prefix_lengths[-1] - prefix_lengths[last_start] + len(elements) - last_start - 1
+            if last_length < self.min_length:
+                del boundaries[-2]
+        return boundaries
+
+    def _depth_scores(self, elements: List[str]) -> Tuple[List[float], Set[int]]:
+        """计算每个元素位置的深度分数，返回 (深度分数列表, 潜在边界集合)"""
+        # 每个元素只嵌入一次，窗口向量为窗口内元素向量的平均
+        import numpy as np
+
+        element_embeddings = self._embed_elements(elements)
+        window_starts = np.arange(0, len(elements) - self.window_size + 1, self.step_size)
+        cumulative = np.vstack([np.zeros((1, element_embeddings.shape[1])), np.cumsum(element_embeddings, axis=0)])
+        block_embeddings = (cumulative[window_starts + self.window_size] - cumulative[window_starts]) / self.window_size
+
+        # 计算相邻窗口之间的余弦相似度
+        norms = np.linalg.norm(block_embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        normalized = block_embeddings / norms[:, None]
+        similarities = np.einsum('ij,ij->i', normalized[:-1], normalized[1:])
+
+        # 计算深度分数：窗口 i 的深度记在窗口中间的元素上
+        depth_scores = np.zeros(len(elements))
+        depths = (similarities[:-2] + similarities[2:] - 2 * similarities[1:-1]) / 2
+        offset = 1 + self.window_size // 2
+        depth_scores[offset:offset + len(depths)] = depths
+
         # 计算阈值
-        depth_values = [d for d in depth_scores if d > 0]
-        if depth_values:
-            mean_depth = np.mean(depth_values)
-            std_depth = np.std(depth_values)
-            threshold = mean_depth + 0.4 * std_depth
+        depth_values = depth_scores[depth_scores > 0]
+        if depth_values.size:
+            threshold = depth_values.mean() + 0.4 * depth_values.std()
         else:
             threshold = 0
-        
+
         # 找出潜在的边界
-        potential_boundaries = [i for i, score in enumerate(depth_scores) if score > threshold]
-        
-        # 找到最优分段
-        segments = []
+        potential_boundaries = set(np.flatnonzero(depth_scores > threshold).tolist())
+        return depth_scores.tolist(), potential_boundaries
+
+    def _embed_elements(self, elements: List[str]):
+        """分批调用 embed_documents 计算各元素的嵌入，返回 (元素数, 维度) 的数组"""
+        import numpy as np
+
+        embedding_model = EmbeddingModel.get_model(self.embedding_model)
+        progress = current_progress()
+        embeddings = []
+        for start in range(0, len(elements), EMBEDDING_BATCH_SIZE):
+            batch = elements[start:start + EMBEDDING_BATCH_SIZE]
+            embeddings.extend(embedding_model.embed_documents(batch))
+            progress.advance(len(batch))
+        return np.asarray(embeddings, dtype=np.float64)
+
+    def _greedy_boundaries(self, prefix_lengths: List[int], potential_boundaries: Set[int],
+                           depth_scores: Sequence[float]) -> List[int]:
+        """逐段贪心切分：每段在长度约束内选取深度分数最高的边界，返回各段最后一个元素的索引"""
+        boundaries = []
         start = 0
-        
-        while start < len(elements):
-            optimal_boundary = self._find_optimal_boundary(start, elements, potential_boundaries, depth_scores)
-            
-            if split_mode == "sentence":
-                segment_text = ' '.join(elements[start:optimal_boundary+1])
-            else:  # delimiter mode
-                segment_text = '\n'.join(elements[start:optimal_boundary+1])
-            
-            segments.append(segment_text)
-            start = optimal_boundary + 1
-        
-        # 处理最后一个段落如果太小
-        if segments and len(segments[-1]) < self.min_length and len(segments) > 1:
-            last_segment = segments.pop()
-            if split_mode == "sentence":
-                segments[-1] += " " + last_segment
-            else:  # delimiter mode
-                segments[-1] += "\n" + last_segment
-        
-        return segments
-    
-    def _find_optimal_boundary(self, start: int, elements: List[str], 
-                               potential_boundaries: List[int], depth_scores: List[float]) -> int:
+        while start < len(prefix_lengths) - 1:
+            boundary = self._find_optimal_boundary(start, prefix_lengths, potential_boundaries, depth_scores)
+            boundaries.append(boundary)
+            start = boundary + 1
+        return boundaries
+
+    def _find_optimal_boundary(self, start: int, prefix_lengths: List[int],
+                               potential_boundaries: Set[int], depth_scores: Sequence[float]) -> int:
         """
         找到最优的段落边界
         
         Args:
             start: 起始位置
-            elements: 元素列表（句子或分隔部分）
-            potential_boundaries: 潜在边界列表
+            prefix_lengths: 元素长度的前缀和（prefix_lengths[i] 为前 i 个元素的总长度）
+            potential_boundaries: 潜在边界集合
             depth_scores: 深度分数列表
             
         Returns:
             int: 最优边界的索引
         """
-        current_length = 0
+        element_count = len(prefix_lengths) - 1
         candidate_boundaries = []
         
-        for i in range(start, len(elements)):
-            current_length += len(elements[i])
+        for i in range(start, element_count):
+            current_length = prefix_lengths[i + 1] - prefix_lengths[start]
             if self.min_length <= current_length <= self.max_length:
                 if i in potential_boundaries:
                     candidate_boundaries.append((i, depth_scores[i]))
@@ -292,13 +381,54 @@ class TilingProcessor:
         if not candidate_boundaries:
             # 找一个长度接近目标的位置
             target_length = (self.min_length + self.max_length) / 2
-            return min(range(start, min(len(elements), start + 10)), 
-                      key=lambda i: abs(sum(len(e) for e in elements[start:i+1]) - target_length))
+            return min(range(start, min(element_count, start + 10)),
+                       key=lambda i: abs(prefix_lengths[i + 1] - prefix_lengths[start] - target_length))
         
         # 选择深度分数最高的边界
         best_boundary = max(candidate_boundaries, key=lambda x: x[1])
         return best_boundary[0]
-    
+
+    def _dp_boundaries(self, prefix_lengths: List[int], potential_boundaries: Set[int],
+                       depth_scores: Sequence[float]) -> List[int]:
+        """
+        全局最优切分：动态规划选取各段的结束位置，返回各段最后一个元素的索引
+
+        按字典序比较三项代价：
+          1. 超出长度约束的字符数之和最小（能满足 min_length/max_length 时为0）
+          2. 段落边界（最后一段的结尾除外）处的深度分数之和最大，只有潜在边界计分
+          3. 各段长度与目标长度（两个约束的中点）之差的绝对值之和最小
+        一段只有在去掉首个元素后不超过 max_length 时才允许超长（相邻的短元素无法另行成段时并入），
+        因此每段的起点只需考虑 max_length 范围内的元素再多一个，复杂度为 O(n·k)，k 为一段最多包含的元素数。
+        """
+        element_count = len(prefix_lengths) - 1
+        target_length = (self.min_length + self.max_length) / 2
+        # best[i]: 前 i 个元素切分完成时的最小代价 (超出字符数, -深度分数和, 长度偏差和)
+        best = [(0, 0.0, 0.0)] + [None] * element_count
+        previous = [0] * (element_count + 1)
+        for end in range(1, element_count + 1):
+            # 最后一个元素是整段文本的结尾，不是段落边界
+            gain = depth_scores[end - 1] if end < element_count and end - 1 in potential_boundaries else 0.0
+            # 长度不超过 max_length 的最早起点，再向前多取一个元素
+            first = max(0, bisect.bisect_left(prefix_lengths, prefix_lengths[end] - self.max_length, 0, end) - 1)
+            best_cost = None
+            for start in range(first, end):
+                length = prefix_lengths[end] - prefix_lengths[start]
+                violation = max(0, self.min_length - length) + max(0, length - self.max_length)
+                prior = best[start]
+                cost = (prior[0] + violation, prior[1] - gain, prior[2] + abs(length - target_length))
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    previous[end] = start
+            best[end] = best_cost
+
+        boundaries = []
+        end = element_count
+        while end > 0:
+            boundaries.append(end - 1)
+            end = previous[end]
+        boundaries.reverse()
+        return boundaries
+
     def _split_into_sentences(self, text: str) -> List[str]:
         """
         将文本分割成句子（支持中英文）
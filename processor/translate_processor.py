@@ -1,7 +1,11 @@
 import json
 import logging
 from pathlib import Path
-from util.config import LLMClient
+from typing import Dict, Any, Optional
+from util.config import LLMClient, GLOBAL_MODEL
+from util.stage_cache import hash_prompt_files
+from util.journal import StageJournal
+from util.progress import current_progress
 
 # 翻译提示词文件路径
 TITLE_TRANSLATE_PROMPT_PATH = "prompt/title_translate_prompt.txt"
@@ -10,13 +14,28 @@ CONTENT_TRANSLATE_PROMPT_PATH = "prompt/content_translate_prompt.txt"
 class TranslateProcessor:
     """翻译处理器, 使用LLM进行对论文json文件分段翻译"""
 
-    def __init__(self):
-        """初始化翻译处理器"""
+    VERSION = 1
+
+    def __init__(self, journal: Optional[StageJournal] = None):
+        """
+        初始化翻译处理器
+
+        Args:
+            journal: 断点日志，每次翻译完成后立即记录，重新运行时回放已完成的翻译
+        """
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.llm = LLMClient()
+        self.journal = journal
         
         # 保存已翻译的摘要，用于后续翻译的上下文
         self.translated_abstract = ""
+
+    def cache_params(self) -> Dict[str, Any]:
+        """返回影响翻译结果的参数（提示词内容和模型名称），用于计算阶段缓存键"""
+        return {
+            'prompts': hash_prompt_files([TITLE_TRANSLATE_PROMPT_PATH, CONTENT_TRANSLATE_PROMPT_PATH]),
+            'model': GLOBAL_MODEL
+        }
         
     def _read_file(self, filepath: str) -> str:
         """读取文件内容"""
@@ -40,14 +59,7 @@ class TranslateProcessor:
             with input_path.open('r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            # 1. 翻译标题
-            self.translate_titles(data)
-            
-            # 2. 翻译abstract
-            self.translate_abstract(data)
-            
-            # 3. 翻译sections内容
-            self.translate_content(data)
+            data = self.process_data(data)
 
             # 写入 output.json
             with output_path.open('w', encoding='utf-8') as f:
@@ -59,6 +71,55 @@ class TranslateProcessor:
             self.logger.error(f"JSON处理失败: {str(e)}", exc_info=True)
             raise
     
+    def process_data(self, data):
+        """
+        翻译内存中的文档（原地修改并返回 data）
+        """
+        # 每次翻译调用为一个进度单元
+        progress = current_progress()
+        progress.start(self.count_work_units(data), unit='段')
+
+        # 1. 翻译标题
+        self.translate_titles(data)
+        
+        # 2. 翻译abstract
+        self.translate_abstract(data)
+        
+        # 3. 翻译sections内容
+        self.translate_content(data)
+        progress.finish()
+        return data
+
+    def count_work_units(self, data) -> int:
+        """预先统计需要翻译的单元数（标题、摘要、正文段落、图表标题），与各翻译步骤的遍历规则一致"""
+        def count_titles(sections):
+            return sum(("title" in s) + count_titles(s.get("children") or []) for s in sections)
+
+        def count_content(sections):
+            total = 0
+            for section in sections:
+                items = [item for item in section.get("content", []) if isinstance(item, dict)]
+                captions = sum(1 for item in items
+                               if item.get("type") in ["figure", "table"] and item.get("caption"))
+                if section.get("type") == "abstract":
+                    # 摘要章节只翻译图表标题，且不递归子章节
+                    total += captions
+                    continue
+                total += captions + sum(1 for item in items
+                                        if item.get("type") == "text" and item.get("content"))
+                total += count_content(section.get("children") or [])
+            return total
+
+        sections = data.get("sections") or []
+        total = ("title" in data) + count_titles(sections) + count_content(sections)
+        abstract = next((s for s in sections if s.get("type") == "abstract"), None)
+        if abstract and abstract.get("content"):
+            first_text = next((item for item in abstract["content"]
+                               if isinstance(item, dict) and item.get("type") == "text"), None)
+            if first_text and first_text.get("content"):
+                total += 1
+        return total
+    
     def translate_titles(self, data):
         """
         翻译JSON结构中的所有标题
@@ -68,24 +129,24 @@ class TranslateProcessor:
         if "title" in data:
             title = data["title"]
             self.logger.info(f"翻译主标题: {title}")
-            data["translated_title"] = self.translate_text("title", title)
+            data["translated_title"] = self.translate_text("title", title, node_path="title")
         
         # 递归翻译sections中的所有标题
         if "sections" in data:
             self.translate_section_titles(data["sections"])
     
-    def translate_section_titles(self, sections):
-        """递归翻译所有章节标题"""
-        for section in sections:
+    def translate_section_titles(self, sections, path="sections"):
+        """递归翻译所有章节标题，path 为 sections 列表在文档中的节点路径"""
+        for index, section in enumerate(sections):
             # 翻译当前章节标题
             if "title" in section:
                 title = section["title"]
                 self.logger.info(f"翻译章节标题: {title}")
-                section["translated_title"] = self.translate_text("title", title)
+                section["translated_title"] = self.translate_text("title", title, node_path=f"{path}/{index}/title")
             
             # 递归翻译子章节标题
             if "children" in section and section["children"]:
-                self.translate_section_titles(section["children"])
+                self.translate_section_titles(section["children"], f"{path}/{index}/children")
     
     def translate_abstract(self, data):
         """翻译论文摘要"""
@@ -94,7 +155,7 @@ class TranslateProcessor:
             self.logger.warning("未找到sections，跳过摘要翻译")
             return
             
-        for section in data["sections"]:
+        for section_index, section in enumerate(data["sections"]):
             if section.get("type") == "abstract":
                 # 检查是否有内容
                 if not (section.get("content") and section["content"]):
@@ -103,7 +164,7 @@ class TranslateProcessor:
                     
                 # 查找第一个type为text的content项
                 abstract_text = ""
-                for content_item in section["content"]:
+                for item_index, content_item in enumerate(section["content"]):
                     if content_item.get("type") == "text":
                         abstract_text = content_item.get("content", "")
                         break
@@ -114,7 +175,10 @@ class TranslateProcessor:
                 
                 # 翻译摘要
                 self.logger.info("开始翻译摘要")
-                translated_abstract = self.translate_text("abstract", abstract_text)
+                translated_abstract = self.translate_text(
+                    "abstract", abstract_text,
+                    node_path=f"sections/{section_index}/content/{item_index}/content"
+                )
                 
                 # 保存翻译结果
                 content_item["translated_content"] = translated_abstract
@@ -130,14 +194,15 @@ class TranslateProcessor:
         if "sections" in data:
             self.translate_section_content(data["sections"])
     
-    def translate_section_content(self, sections):
-        """递归翻译章节内容，包括文本和图表标题"""
-        for section in sections:
+    def translate_section_content(self, sections, path="sections"):
+        """递归翻译章节内容，包括文本和图表标题，path 为 sections 列表在文档中的节点路径"""
+        for section_index, section in enumerate(sections):
+            content_path = f"{path}/{section_index}/content"
             # 对于abstract部分，只处理图表和表格标题，跳过文本内容
             if section.get("type") == "abstract":
                 self.logger.info("abstract部分: 只处理图表和表格标题")
                 if "content" in section:
-                    for item in section["content"]:
+                    for item_index, item in enumerate(section["content"]):
                         # 先检查item是否为字典类型
                         if not isinstance(item, dict):
                             self.logger.info(f"跳过非字典类型的内容: {str(item)[:50]}...")
@@ -150,7 +215,10 @@ class TranslateProcessor:
                         if item_type in ["figure", "table"] and "caption" in item and item["caption"]:
                             caption = item["caption"]
                             self.logger.info(f"翻译abstract中的{item_type}标题: {caption[:50]}...")
-                            item["translated_caption"] = self.translate_text("caption", caption, use_abstract_reference=True)
+                            item["translated_caption"] = self.translate_text(
+                                "caption", caption, use_abstract_reference=True,
+                                node_path=f"{content_path}/{item_index}/caption"
+                            )
                 continue
 
             # 翻译章节内容
@@ -158,7 +226,7 @@ class TranslateProcessor:
                 # 用于保存章节内的前一段翻译，初始为空
                 previous_section_translation = ""
                 
-                for item in section["content"]:
+                for item_index, item in enumerate(section["content"]):
                     # 先检查item是否为字典类型
                     if not isinstance(item, dict):
                         self.logger.info(f"跳过非字典类型的内容: {str(item)[:50]}...")
@@ -176,12 +244,14 @@ class TranslateProcessor:
                         if not previous_section_translation:
                             item["translated_content"] = self.translate_text("content", content, 
                                                                            previous_translation=None, 
-                                                                           use_abstract_reference=True)
+                                                                           use_abstract_reference=True,
+                                                                           node_path=f"{content_path}/{item_index}/content")
                         else:
                             # 否则使用前一段文本作为参考
                             item["translated_content"] = self.translate_text("content", content, 
                                                                            previous_translation=previous_section_translation, 
-                                                                           use_abstract_reference=False)
+                                                                           use_abstract_reference=False,
+                                                                           node_path=f"{content_path}/{item_index}/content")
                         
                         # 更新章节内的前一段翻译
                         previous_section_translation = item["translated_content"]
@@ -190,13 +260,17 @@ class TranslateProcessor:
                     elif item_type in ["figure", "table"] and "caption" in item and item["caption"]:
                         caption = item["caption"]
                         self.logger.info(f"翻译{item_type}标题: {caption[:50]}...")
-                        item["translated_caption"] = self.translate_text("caption", caption, use_abstract_reference=True)
+                        item["translated_caption"] = self.translate_text(
+                            "caption", caption, use_abstract_reference=True,
+                            node_path=f"{content_path}/{item_index}/caption"
+                        )
                     
             # 递归翻译子章节 - 每个子章节有自己的翻译上下文
             if "children" in section and section["children"]:
-                self.translate_section_content(section["children"])
+                self.translate_section_content(section["children"], f"{path}/{section_index}/children")
 
-    def translate_text(self, text_type, content, previous_translation=None, use_abstract_reference=False):
+    def translate_text(self, text_type, content, previous_translation=None, use_abstract_reference=False,
+                       node_path=None):
         """
         使用LLM翻译指定类型的文本
         
@@ -205,6 +279,7 @@ class TranslateProcessor:
         content: 需要翻译的内容
         previous_translation: 前一段文本的翻译（可选）
         use_abstract_reference: 是否使用abstract作为参考（图表和表格标题，或章节第一段）
+        node_path: 译文在文档中的节点路径，用于断点日志（可选）
         """
         # 根据文本类型选择对应的提示词文件路径
         prompt_file = TITLE_TRANSLATE_PROMPT_PATH if text_type == "title" else CONTENT_TRANSLATE_PROMPT_PATH
@@ -232,4 +307,16 @@ class TranslateProcessor:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
-        return self.llm.chat(messages, stream=True).strip()
\ No newline at end of file
+        translation = self._chat(messages, node_path).strip()
+        current_progress().advance()
+        return translation
+
+    def _chat(self, messages, node_path=None) -> str:
+        """调用LLM；配置了断点日志时先回放已完成的调用，新结果立即写入日志"""
+        if self.journal is None or node_path is None:
+            return self.llm.chat(messages, stream=True)
+        return self.journal.replay_or_call(
+            node_path,
+            {'model': GLOBAL_MODEL, 'messages': messages},
+            lambda: self.llm.chat(messages, stream=True)
+        )
\ No newline at end of file
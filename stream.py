@@ -3,6 +3,7 @@ from util.data_manager import DataManager
 # Add at the very top before other imports
 import os
 import json  # 添加在文件顶部
+import html
 from util.AI_professor_chat import AIProfessorChat
 import uuid
 import shutil
@@ -136,6 +137,17 @@ def handle_file_upload():
         uploaded_file = st.session_state.uploaded_file
         file_id = uploaded_file.name.strip('.pdf').replace(" ", "_")[:50]
 
+        # 内容与已有论文相同（文件名不同）时直接打开已有论文，不重复处理
+        existing_id = data_manager.find_paper_by_content(uploaded_file.getbuffer(), alias=file_id)
+        if existing_id:
+            if existing_id in [p['id'] for p in data_manager.papers_index]:
+                st.session_state.selected_paper = existing_id
+                st.info(f"该论文已存在（{existing_id}），已切换到该论文")
+            else:
+                st.info(f"该论文已在处理队列中（{existing_id}）")
+            del st.session_state.uploaded_file
+            return
+
         if file_id in [p['id'] for p in data_manager.papers_index]:
             st.error("该论文已存在，请选择其他文件")
             del st.session_state.uploaded_file
@@ -165,6 +177,9 @@ with st.sidebar:
         )
 
         if selected_paper:
+            aliases = data_manager.paper_aliases(selected_paper)
+            if aliases:
+                st.caption(f"别名（内容相同的PDF）: {', '.join(aliases)}")
             selected_file = st.selectbox(
                 "选择文件",
                 options=['metadata', 'article_en', 'article_zh', 'rag_md', 'rag_tree'],
@@ -241,12 +256,23 @@ with st.sidebar:
                 status_icon = {"pending": "⏳", "processing": "🔄", "completed": "✅", "failed": "❌", "incomplete": "🔧"}[item['status']]
                 st.write(f"{status_icon} ({item['status']}) {item['id']}")
             
-            current_item = data_manager.processing_queue[0] if data_manager.processing_queue else None
-            if current_item:
-                progress_data = data_manager.processing_progress
-                st.caption("处理进度")
+            # 多篇论文可能同时处理，分别显示各自的进度
+            processing_items = [item for item in data_manager.processing_queue if item['status'] == 'processing']
+            for current_item in processing_items:
+                progress_data = data_manager.processing_progress_by_paper.get(current_item['id'])
+                if not progress_data:
+                    continue
+                st.caption(f"处理进度: {current_item['id']}")
                 st.write(f"{progress_data['stage_name']}\tprogress: {progress_data['progress']}% ({progress_data['index']}/{progress_data['total']})") 
                 st.progress(progress_data['progress']/100)
+                # 阶段内进度：已完成/总数、吞吐量和预计剩余时间
+                for stage, detail in progress_data.get('stage_details', {}).items():
+                    eta = detail.get('eta')
+                    eta_text = f"{int(eta) // 60}分{int(eta) % 60:02d}秒" if eta is not None else "估算中"
+                    st.caption(
+                        f"{stage}: {detail['done']}/{detail['total']}{detail['unit']}"
+                        f"，{detail['throughput']:.1f}{detail['unit']}/分钟，剩余 {eta_text}"
+                    )
 
             
     with st.expander("💬 AI对话", expanded=True):
@@ -366,7 +392,19 @@ with main_col:
                 # 如果路径中出现了空格，替换为%20
                 image_prefix = image_prefix.replace(" ", "%20")
                 # Replace image paths in content
-                content_with_anchors = re.sub(r'!\[(.*?)\]\((.*?)\)', lambda m: f'![{m.group(1)}]({image_prefix}/{m.group(2)})', content_with_anchors)
+                # 有图片清单时先显示缩略图，点击后在新标签页打开大图
+                images_manifest = paper.get('images_manifest', {})
+
+                def replace_image(match):
+                    alt, src = match.group(1), match.group(2)
+                    rendition = images_manifest.get(os.path.basename(src))
+                    if not rendition:
+                        return f'![{alt}]({image_prefix}/{src})'
+                    return (f'<a href="{image_prefix}/{rendition["display"]}" target="_blank">'
+                            f'<img src="{image_prefix}/{rendition["thumb"]}" alt="{html.escape(alt)}" loading="lazy" '
+                            f'style="max-width:100%"></a>')
+
+                content_with_anchors = re.sub(r'!\[(.*?)\]\((.*?)\)', replace_image, content_with_anchors)
 
                 print("📷 替换图片路径完成", content_with_anchors)
                 # Render the combined markdown
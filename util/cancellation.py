@@ -0,0 +1,71 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class ProcessingCancelled(BaseException):
+    """
+    论文处理被取消
+
+    与 asyncio.CancelledError 一样继承 BaseException：处理器中大量
+    ``except Exception`` 用于容忍单次LLM调用失败，取消不能被这些分支吞掉。
+    """
+
+
+class CancellationToken:
+    """
+    协作式取消令牌
+
+    取消方调用 cancel，处理方在LLM调用之间、流式响应的分块之间、嵌入批次之间
+    以及阶段开始前检查令牌。被取消的处理最多再完成当前这一次调用，
+    已完成的结果已写入断点日志和检查点，下次运行时可以继续。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ''
+
+    def cancel(self, reason: str = '') -> None:
+        """请求取消"""
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """已请求取消时抛出 ProcessingCancelled"""
+        if self._event.is_set():
+            raise ProcessingCancelled(self.reason or "处理已取消")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待取消请求，返回是否已取消"""
+        return self._event.wait(timeout)
+
+
+# 当前上下文中正在运行的处理任务的取消令牌，LLM客户端和嵌入模型等底层组件通过它检查取消
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar('cancellation_token', default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """获取当前上下文的取消令牌，不在可取消的任务中运行时返回None"""
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """当前任务已被取消时抛出 ProcessingCancelled"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def use_token(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """在当前上下文中使用指定的取消令牌"""
+    ctx_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(ctx_token)
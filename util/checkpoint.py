@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Union
+
+from util.stage_cache import hash_bytes
+from util.metrics import StageMetrics, record_bytes_read
+
+
+def copy_document(obj: Any) -> Any:
+    """
+    复制JSON结构的文档（只包含dict/list/字符串/数字等）
+
+    文档在阶段之间以内存对象传递，会修改输入的阶段需要拿到独立副本。
+    只处理JSON类型，比 copy.deepcopy 和 json.dumps/json.loads 往返都快得多。
+    """
+    obj_type = type(obj)
+    if obj_type is dict:
+        return {key: copy_document(value) for key, value in obj.items()}
+    if obj_type is list:
+        return [copy_document(value) for value in obj]
+    return obj
+
+
+def dump_document(data: Any) -> bytes:
+    """按阶段产物的磁盘格式序列化文档（与各处理器原先的 json.dump 输出一致）"""
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def load_document(path: Union[str, Path]) -> Any:
+    """从检查点文件读取文档"""
+    record_bytes_read(os.path.getsize(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CheckpointWriter:
+    """
+    检查点写入器：在后台线程中把阶段产出的文档写入磁盘
+
+    阶段之间直接传递内存中的文档，检查点文件只用于调试查看和断点续跑，
+    因此序列化和写盘不必阻塞后续阶段。单个写线程按提交顺序执行任务，
+    同一论文后提交的任务（如写缓存清单）可以依赖先提交的写入结果。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._lock = threading.Lock()
+        self._pending: List[Future] = []
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """提交任意写入任务，按提交顺序执行"""
+        future = self._executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(future)
+        return future
+
+    def write_json(self, path: Union[str, Path], data: Any,
+                   metrics: Optional[StageMetrics] = None) -> Future:
+        """
+        异步写入JSON检查点
+
+        调用方提交后不能再修改 data。
+
+        Args:
+            path: 检查点文件路径
+            data: 文档
+            metrics: 写入字节数计入的阶段指标（写线程中没有当前阶段，需显式传入）
+
+        Returns:
+            Future: 结果为写入内容的SHA-256，与 hash_file 对该文件的结果一致
+        """
+        return self.submit(self._write_json, Path(path), data, metrics)
+
+    def _write_json(self, path: Path, data: Any, metrics: Optional[StageMetrics]) -> str:
+        content = dump_document(data)
+        if metrics is not None:
+            metrics.add(bytes_written=len(content))
+        # 先写临时文件再替换，避免中断时留下不完整的检查点
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(content)
+        tmp_path.replace(path)
+        self.logger.debug(f"检查点已写入: {path}")
+        return hash_bytes(content)
+
+    def flush(self) -> None:
+        """等待所有已提交的写入任务完成"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.exception()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭写线程"""
+        self._executor.shutdown(wait=wait)
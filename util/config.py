@@ -1,10 +1,18 @@
 import logging
 import sys
-from typing import Optional, List, Dict, Any, Generator
-from openai import OpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+from typing import Optional, List, Dict, Any, Generator, TYPE_CHECKING
 import dotenv
 import os
+from util.metrics import record_llm_call, estimate_tokens
+from util.cancellation import ProcessingCancelled, check_cancelled
+from util.paths import PROJECT_ROOT
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+# openai、langchain、torch 等重型依赖在首次使用时才导入，
+# 只浏览已处理论文时不必为它们付出启动时间
 
 # 加载环境变量
 dotenv.load_dotenv()
@@ -17,6 +25,58 @@ GLOBAL_MODEL = os.getenv("GLOBAL_MODEL")
 
 # 嵌入模型配置
 EMBEDDING_MODEL_NAME = "BAAI/bge-m3"
+EMBEDDING_NORMALIZE = True  # 向量库按内积检索，嵌入向量需要归一化
+# 不加载神经网络、按词哈希计算嵌入的轻量模型，可用于只比较相对相似度的分块阶段
+HASHING_EMBEDDING_MODEL = "hashing"
+# 嵌入模型的用途：检索（向量库创建与查询）和分块（TextTiling边界检测）
+ROLE_RETRIEVAL = "retrieval"
+ROLE_TILING = "tiling"
+# 各用途使用的模型，分块阶段可改用小模型（如 sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2）
+# 或 hashing，用 benchmarks/tiling_models.py 评估与 bge-m3 的边界一致程度
+EMBEDDING_MODELS = {
+    ROLE_RETRIEVAL: EMBEDDING_MODEL_NAME,
+    ROLE_TILING: os.getenv("TILING_EMBEDDING_MODEL", EMBEDDING_MODEL_NAME)
+}
+# 持久化嵌入缓存：分块、向量库创建和检索共用，按文本内容复用已计算的嵌入（设为空字符串关闭）
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(PROJECT_ROOT, "static", "output", ".embedding_cache"))
+# 嵌入缓存的最大条目数，超过时淘汰最久未用的条目（bge-m3 每条约2KB）
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# 共享的嵌入批处理服务：合并各调用方的请求，按长度分桶、按token预算组批（设为0时直接调用模型）
+EMBEDDING_SERVICE = os.getenv("EMBEDDING_SERVICE", "1") == "1"
+EMBEDDING_TOKEN_BUDGET = int(os.getenv("EMBEDDING_TOKEN_BUDGET", "8192"))  # 每批token预算的初始值，运行中按吞吐量调整
+EMBEDDING_SERVICE_THREADS = int(os.getenv("EMBEDDING_SERVICE_THREADS", "2"))  # 同时调用模型的最大线程数
+
+# 论文处理并发配置
+MAX_CONCURRENT_PAPERS = int(os.getenv("MAX_CONCURRENT_PAPERS", "2"))  # 同时处理的论文数
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))  # PDF解析/OCR阶段的工作线程数（受显存限制）
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))  # 本地计算与嵌入阶段的工作线程数
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "4"))  # LLM调用阶段的工作线程数（受API并发限制）
+
+# PDF分片并行转换：按页切分后在多个进程中同时转换，适合只有CPU的机器
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "0"))  # 每个分片的页数，0表示不分片
+PDF_SHARD_WORKERS = int(os.getenv("PDF_SHARD_WORKERS", "4"))  # 分片转换的进程数
+# 有可用文本层的页面直接提取文本，只对扫描页和纯图片页做OCR
+PDF_TEXT_FAST_PATH = os.getenv("PDF_TEXT_FAST_PATH", "1") == "1"
+# 缓存PDF解析结果（缓存目录位于输出目录下），修订后重新导入的论文复用未改动的页段。
+# 首次导入时多一次逐页指纹计算和缓存写入，默认关闭；缓存总大小上限（MB，0为不限）
+PDF_PAGE_CACHE = os.getenv("PDF_PAGE_CACHE", "0") == "1"
+PDF_PAGE_CACHE_MAX_MB = int(os.getenv("PDF_PAGE_CACHE_MAX_MB", "2048"))
+# 启用页面缓存时按固定页数的页块转换和缓存（与分片设置无关），修改一页只需重新转换所在的页块；
+# 页块越小重新转换越少，但跨页块的段落和表格合并、批量推理的效果越差
+PDF_PAGE_CACHE_BLOCK_PAGES = int(os.getenv("PDF_PAGE_CACHE_BLOCK_PAGES", "8"))
+# 图片后处理：阅读界面加载的渲染版本与缩略图（长边像素上限）、编码质量和格式（webp/jpeg）
+IMAGE_DISPLAY_MAX_SIDE = int(os.getenv("IMAGE_DISPLAY_MAX_SIDE", "1600"))
+IMAGE_THUMB_MAX_SIDE = int(os.getenv("IMAGE_THUMB_MAX_SIDE", "480"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "webp")
+# 平铺阶段切分长文本块的方式: dp（在长度约束下使边界深度分数之和最大）或 greedy（逐段选取局部最优边界）
+TILING_SEGMENTATION = os.getenv("TILING_SEGMENTATION", "dp")
+# 界面启动时在后台预加载PDF解析模型（占用显存），批处理命令行总是预加载
+PDF_PRELOAD_MODELS = os.getenv("PDF_PRELOAD_MODELS", "0") == "1"
+
+# 流式调用时请求接口在最后一个分块中返回token用量（stream_options.include_usage），
+# 接口拒绝该参数时自动去掉后重试，之后不再发送；设为0则始终不发送。未返回用量时按字符数估算token
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"
 
 # 日志配置
 def setup_logging():
@@ -39,6 +99,13 @@ def setup_logging():
     # 添加控制台处理器
     root_logger.addHandler(console_handler)
 
+
+def _names_stream_options(error: Exception) -> bool:
+    """接口返回的错误是否指向 stream_options 参数"""
+    details = [str(error), getattr(error, 'param', None), getattr(error, 'body', None)]
+    return any('stream_options' in str(detail) for detail in details if detail)
+
+
 # LLM客户端
 class LLMClient:
     _instance: Optional['LLMClient'] = None
@@ -58,11 +125,24 @@ class LLMClient:
         self.api_key = api_key or API_KEY
         self.base_url = base_url or API_BASE_URL
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        self._client = None
+        self._client_lock = threading.Lock()
+        # 接口是否接受 stream_options 参数，首次被拒绝后不再发送
+        self._stream_usage = LLM_STREAM_USAGE
         self._initialized = True
+
+    @property
+    def client(self):
+        """OpenAI客户端，首次调用时创建"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url
+                    )
+        return self._client
         
     def chat(self, messages: List[Dict[str, Any]], temperature=0.5, stream=True) -> str:
         """与LLM交互
@@ -74,31 +154,76 @@ class LLMClient:
             
         Returns:
             str: LLM响应内容
+
+        Raises:
+            ProcessingCancelled: 当前处理任务已被取消（调用前或流式接收过程中）
         """
+        # 任务已取消时不再发起新的请求
+        check_cancelled()
         try:
-            response = self.client.chat.completions.create(
+            request = dict(
                 model=GLOBAL_MODEL,
                 messages=messages,
                 temperature=temperature,
                 stream=stream
             )
+            if stream and self._stream_usage:
+                request['stream_options'] = {"include_usage": True}
+            response = self._create(request)
             
             if stream:
                 full_response = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        print(content, end='', flush=True)
-                        full_response += content
+                usage = None
+                try:
+                    for chunk in response:
+                        check_cancelled()
+                        # 开启include_usage时最后一个分块只有用量，没有choices
+                        if getattr(chunk, 'usage', None):
+                            usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content is not None:
+                            content = chunk.choices[0].delta.content
+                            print(content, end='', flush=True)
+                            full_response += content
+                except ProcessingCancelled:
+                    # 关闭与服务端的流式连接，不再接收剩余输出
+                    response.close()
+                    print()
+                    raise
                 print()
+                self._record_usage(messages, full_response, usage)
                 return full_response
             else:
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                self._record_usage(messages, content, getattr(response, 'usage', None))
+                return content
                 
         except Exception as e:
             print(f"LLM调用出错: {str(e)}")
             raise
 
+    def _create(self, request: Dict[str, Any]):
+        """发送请求；接口以400拒绝 stream_options 时去掉该参数重试，并记住该接口不支持"""
+        from openai import BadRequestError
+
+        try:
+            return self.client.chat.completions.create(**request)
+        except BadRequestError as e:
+            # 只有错误指明是 stream_options 参数时才去掉重试，其他400错误（如上下文超长）照常抛出
+            if 'stream_options' not in request or not _names_stream_options(e):
+                raise
+            logging.warning(f"LLM接口不接受 stream_options 参数，改为按字符数估算token: {e}")
+            self._stream_usage = False
+            request = {key: value for key, value in request.items() if key != 'stream_options'}
+            return self.client.chat.completions.create(**request)
+
+    def _record_usage(self, messages: List[Dict[str, Any]], completion: str, usage) -> None:
+        """向当前阶段的指标记录一次调用的token用量，接口未返回用量时按字符数估算"""
+        if usage is not None:
+            record_llm_call(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+            return
+        prompt_tokens = sum(estimate_tokens(str(message.get('content', ''))) for message in messages)
+        record_llm_call(prompt_tokens, estimate_tokens(completion or ''), estimated=True)
+
     def chat_stream_by_sentence(self, messages: List[Dict[str, Any]], temperature=0.5) -> Generator[str, None, str]:
         """与LLM交互，按句子流式返回结果
         
@@ -178,27 +303,85 @@ class LLMClient:
 
 # 嵌入模型
 class EmbeddingModel:
-    _instance: Optional[HuggingFaceEmbeddings] = None
+    # 按模型名称保存的实例，使用相同模型的用途共用同一实例
+    _instances: Dict[str, 'Embeddings'] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def model_name(role: str = ROLE_RETRIEVAL) -> str:
+        """获取该用途使用的模型名称"""
+        return EMBEDDING_MODELS[role]
 
     @classmethod
-    def get_instance(cls) -> HuggingFaceEmbeddings:
-        """获取嵌入模型单例"""
-        if cls._instance is None:
-            # 检查CUDA可用性
-            try:
-                import torch
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            except ImportError:
-                device = "cpu"
-                
-            logging.info(f"初始化嵌入模型: {EMBEDDING_MODEL_NAME}，使用设备: {device}")
-            
-            cls._instance = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL_NAME,
-                model_kwargs={"device": device},
-                encode_kwargs={"normalize_embeddings": True}
-            )
-        return cls._instance
+    def get_instance(cls, role: str = ROLE_RETRIEVAL) -> 'Embeddings':
+        """获取该用途的嵌入模型单例"""
+        return cls.get_model(EMBEDDING_MODELS[role])
+
+    @classmethod
+    def get_model(cls, model_name: str) -> 'Embeddings':
+        """按名称获取嵌入模型单例（首次调用时才创建）"""
+        if model_name not in cls._instances:
+            with cls._lock:
+                if model_name not in cls._instances:
+                    cls._instances[model_name] = cls.create(model_name)
+        return cls._instances[model_name]
+
+    @classmethod
+    def create(cls, model_name: str, cached: bool = True) -> 'Embeddings':
+        """
+        创建嵌入模型（HuggingFace 模型在此时才导入 langchain_huggingface / torch 并加载）
+
+        Args:
+            model_name: HuggingFace 模型名称，或 HASHING_EMBEDDING_MODEL
+            cached: 是否经由持久化嵌入缓存和批处理服务（离线评估时关闭，以测得模型本身的耗时）
+        """
+        from util.embeddings import EmbeddingService, HashingEmbeddings, MeteredEmbeddings
+
+        if model_name == HASHING_EMBEDDING_MODEL:
+            # 计算很快，不需要缓存和批处理
+            return MeteredEmbeddings(HashingEmbeddings())
+
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        # 检查CUDA可用性
+        try:
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            device = "cpu"
+
+        logging.info(f"初始化嵌入模型: {model_name}，使用设备: {device}")
+
+        embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": device},
+            encode_kwargs={"normalize_embeddings": EMBEDDING_NORMALIZE}
+        )
+        if not cached:
+            return MeteredEmbeddings(embeddings)
+        if EMBEDDING_SERVICE:
+            # GPU上并发调用模型没有收益，只用一个线程
+            embeddings = EmbeddingService(embeddings, token_budget=EMBEDDING_TOKEN_BUDGET,
+                                          max_threads=EMBEDDING_SERVICE_THREADS if device == "cpu" else 1)
+        # 指标记录和取消检查在调用方线程中进行，位于批处理服务之外
+        return cls._with_cache(MeteredEmbeddings(embeddings), model_name)
+
+    @staticmethod
+    def _with_cache(embeddings: 'Embeddings', model_name: str) -> 'Embeddings':
+        """在模型外包装持久化嵌入缓存，未配置缓存目录或缓存无法打开时直接使用模型"""
+        if not EMBEDDING_CACHE_DIR:
+            return embeddings
+        import sqlite3
+        from util.embedding_cache import EmbeddingCache
+        from util.embeddings import CachedEmbeddings
+
+        try:
+            cache = EmbeddingCache(EMBEDDING_CACHE_DIR, model_name, EMBEDDING_NORMALIZE, EMBEDDING_CACHE_MAX_ENTRIES)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"无法打开嵌入缓存 {EMBEDDING_CACHE_DIR}，不使用缓存: {e}")
+            return embeddings
+        logging.info(f"嵌入缓存: {cache.directory}（{cache.stats()['entries']} 条）")
+        return CachedEmbeddings(embeddings, cache)
 
 # 使用示例
 if __name__ == "__main__":
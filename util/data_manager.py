@@ -1,9 +1,13 @@
 import os
 import json
 import shutil
+import threading
 from PyQt6.QtCore import QObject, pyqtSignal
 from util.pipeline import Pipeline
 from util.threads import ProcessingThread
+from util.config import MAX_CONCURRENT_PAPERS, PDF_PRELOAD_MODELS
+from util.pdf_index import PdfHashIndex, PDF_INDEX_FILE
+from util.stage_cache import hash_bytes
 from rich import print
 from util.AI_manager import AIManager
 
@@ -19,6 +23,7 @@ def get_paths(id):
         "rag_tree": f"{id}/final_rag_tree.json",
         "rag_vector_store": f"{id}/vectors",
         "images": f"{id}/images",
+        "images_manifest": f"{id}/images_manifest.json",
     }
 
 class DataManager(QObject):
@@ -60,9 +65,15 @@ class DataManager(QObject):
             'index': 0,
             'total': 0,
             'progress': 0,
-            'stage_progress': 0
+            'stage_progress': 0,
+            'eta': None,
+            'throughput': 0,
+            'stage_details': {}
         }
         self.pipeline = Pipeline(data_manager=self)  # 初始化管线
+        if PDF_PRELOAD_MODELS:
+            # 后台预加载PDF解析模型，上传论文后无需等待模型加载
+            self.pipeline.pdf_processor.warm_up()
     
     # ========== 初始化相关方法 ==========
     
@@ -75,13 +86,24 @@ class DataManager(QObject):
         # 确保目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.data_dir, exist_ok=True)
+        # PDF内容索引，识别以不同文件名上传的同一篇论文
+        self.pdf_index = PdfHashIndex(os.path.join(self.output_dir, PDF_INDEX_FILE))
     
     def _init_processing_queue(self):
         """初始化处理队列和状态"""
         self.processing_queue = []    # 待处理文件队列
-        self.is_processing = False    # 是否正在处理
         self.is_paused = False         # 初始状态为暂停
-        self.current_thread = None    # 当前处理线程
+        self.processing_threads = {}  # 正在运行的处理线程: {paper_id: ProcessingThread}
+        self.stopping_threads = {}    # 已请求停止、尚未退出的处理线程: {paper_id: ProcessingThread}
+        self.max_concurrent_papers = max(1, MAX_CONCURRENT_PAPERS)  # 同时处理的论文数上限
+        self.processing_progress_by_paper = {}  # 各论文的处理进度: {paper_id: progress}
+        # 处理线程的回调在各自线程中执行，队列的修改需要加锁
+        self._queue_lock = threading.RLock()
+
+    @property
+    def is_processing(self):
+        """是否有论文正在处理"""
+        return bool(self.processing_threads)
     
     # ========== 论文索引加载管理 ==========
     
@@ -134,6 +156,7 @@ class DataManager(QObject):
             file_type: 文件类型（article_en, article_zh, rag_md, rag_tree）
             content: 文件内容
         """
+        paper_id = self.resolve_paper_id(paper_id)
         if file_type == "metadata":
             # 保存元数据到papers_index
             paper = next((p for p in self.papers_index if p["id"] == paper_id), None)
@@ -168,6 +191,7 @@ class DataManager(QObject):
             tuple: (paper, zh_content, en_content)
         """
         # 查找指定ID的论文
+        paper_id = self.resolve_paper_id(paper_id)
         paper = next((p for p in self.papers_index if p["id"] == paper_id), None)
         ret = {
             'metadata': paper,
@@ -175,6 +199,7 @@ class DataManager(QObject):
             'article_zh': "",
             "rag_md": "",
             "rag_tree": "{}",
+            "images_manifest": {},
         }
         if not paper:
             error(f"未找到ID为{paper_id}的论文")
@@ -198,7 +223,20 @@ class DataManager(QObject):
         
         # 验证图片路径
         self._verify_images_path(paper)
+        ret['images_manifest'] = self._load_images_manifest(paper_id)
         return ret
+
+    def _load_images_manifest(self, paper_id):
+        """加载图片清单（原图文件名到渲染版本、缩略图的对应关系），未生成时返回空字典"""
+        manifest_path = os.path.join(self.output_dir, get_paths(paper_id)['images_manifest'])
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('images', {})
+        except Exception as e:
+            error(f"加载图片清单失败: {str(e)}")
+            return {}
     
     def _load_document_content(self, file_path, default_title, is_chinese=True):
         # 修复路径处理
@@ -247,6 +285,7 @@ class DataManager(QObject):
             dict: RAG树结构，如果加载失败则返回None
         """
         # 查找指定ID的论文
+        paper_id = self.resolve_paper_id(paper_id)
         paper = next((p for p in self.papers_index if p["id"] == paper_id), None)
         
         if not paper:
@@ -495,13 +534,20 @@ class DataManager(QObject):
         # 获取已处理论文的ID列表
         processed_ids = {paper['id'] for paper in self.papers_index}
         
-        # 扫描数据目录中的PDF文件
+        # 扫描数据目录中的PDF文件（已处理的论文在前，内容重复时优先保留已处理的论文ID）
         pdf_files = [f for f in os.listdir(self.data_dir) if f.lower().endswith('.pdf')]
+        pdf_files.sort(key=lambda f: (os.path.splitext(f)[0] not in processed_ids, f))
+        self.pdf_index.forget_missing_files(self.data_dir)
         
         # 对于每个PDF文件，检查是否已经处理
         for pdf_file in pdf_files:
             paper_id = os.path.splitext(pdf_file)[0]  # 不包含扩展名的文件名作为ID
 
+            canonical_id = self._register_pdf(os.path.join(self.data_dir, pdf_file), paper_id)
+            if canonical_id != paper_id:
+                print(f"[DataManager] 跳过重复的PDF: {pdf_file}（与论文 {canonical_id} 内容相同）")
+                continue
+
             if paper_id in processing_queue_ids:
                 print(f"[DataManager] 跳过正在处理的文件: {pdf_file}")
                 continue
@@ -529,6 +575,8 @@ class DataManager(QObject):
                         'missing_steps': missing_paths,
                     })
         
+        self.pdf_index.save()
+
         # 按缺失步骤数排序（缺失少的在前）
         self.processing_queue.sort(key=lambda x: len(x.get('missing_steps', [])))
         
@@ -567,12 +615,20 @@ class DataManager(QObject):
             # 提取文件名作为论文ID
             file_name = os.path.basename(file_path)
             paper_id = os.path.splitext(file_name)[0]
+
+            # 与已有论文内容相同时只记录别名，不重复处理
+            canonical_id = self._register_pdf(file_path, paper_id)
+            self.pdf_index.save()
+            if canonical_id != paper_id:
+                print(f"[DataManager] 上传的PDF与论文 {canonical_id} 内容相同，记为别名: {paper_id}")
+                return True
             
             # 更新处理队列
             self._update_processing_queue(paper_id, file_path)
             
-            # 如果不是暂停状态，开始处理
+            # 如果不是暂停状态，开始处理（同时处理数已满时让出一个普通优先级的任务）
             if not self.is_paused:
+                self._preempt_for(paper_id)
                 self.process_next_in_queue()
             
             return True
@@ -580,6 +636,45 @@ class DataManager(QObject):
             error(f"上传文件失败: {str(e)}")
             return False
     
+    def find_paper_by_content(self, pdf_data, alias=None):
+        """
+        按PDF内容查找已有论文（上传前调用，重复的文件不必保存）
+
+        Args:
+            pdf_data: PDF文件内容
+            alias: 上传文件对应的论文ID，找到已有论文时记为其别名
+
+        Returns:
+            str: 已有论文的ID，没有内容相同的论文时返回None
+        """
+        sha256 = hash_bytes(pdf_data)
+        paper_id = self.pdf_index.lookup(sha256)
+        if paper_id is None or not self._paper_exists(paper_id):
+            return None
+        if alias:
+            self.pdf_index.register(sha256, alias)
+            self.pdf_index.save()
+        return paper_id
+
+    def resolve_paper_id(self, paper_id):
+        """将内容重复的PDF的别名ID解析为已有论文的ID（不是别名时原样返回）"""
+        return self.pdf_index.resolve(paper_id)
+
+    def paper_aliases(self, paper_id):
+        """论文以其他文件名上传时记录的别名ID"""
+        return self.pdf_index.aliases(paper_id)
+
+    def _register_pdf(self, pdf_path, paper_id):
+        """登记PDF内容，返回该内容对应的论文ID（与已有论文重复时为已有论文的ID）"""
+        sha256 = self.pdf_index.hash_pdf(pdf_path)
+        return self.pdf_index.register(sha256, paper_id, exists=self._paper_exists)
+
+    def _paper_exists(self, paper_id):
+        """论文是否已处理、正在排队，或其PDF仍在数据目录中"""
+        return (any(p['id'] == paper_id for p in self.papers_index)
+                or any(item['id'] == paper_id for item in self.processing_queue)
+                or os.path.exists(os.path.join(self.data_dir, paper_id + '.pdf')))
+
     def _update_processing_queue(self, paper_id, file_path):
         """更新处理队列"""
         # 检查是否已在队列中
@@ -604,28 +699,81 @@ class DataManager(QObject):
                 'priority': 1  # 添加一个高优先级标记
             })
     
+    def _preempt_for(self, paper_id):
+        """
+        为高优先级任务抢占处理名额
+
+        同时处理的论文数已达上限时，停止一个普通优先级的任务并放回队列。
+        被停止的任务在当前LLM调用结束后退出，已完成的结果保留在断点日志和检查点中，
+        重新开始时从中断处继续。
+
+        Returns:
+            bool: 是否停止了某个任务
+        """
+        with self._queue_lock:
+            if paper_id in self.processing_threads or len(self.processing_threads) < self.max_concurrent_papers:
+                return False
+            priorities = {item['id']: item.get('priority', 0) for item in self.processing_queue}
+            if priorities.get(paper_id, 0) <= 0:
+                return False
+            candidates = [pid for pid in self.processing_threads if priorities.get(pid, 0) < priorities[paper_id]]
+            if not candidates:
+                return False
+            # 让出最后启动的任务，它已完成的工作最少
+            victim = candidates[-1]
+            print(f"[DataManager] 为高优先级任务 {paper_id} 暂停处理: {victim}")
+            self._stop_thread(victim, f"让出处理名额给 {paper_id}")
+            return True
+
+    def _stop_thread(self, paper_id, reason=""):
+        """请求停止论文的处理线程，并将其重置为待处理状态（调用方需持有队列锁）"""
+        thread = self.processing_threads.pop(paper_id, None)
+        if thread is None:
+            return
+        if thread.isRunning():
+            thread.stop(reason)
+            self.stopping_threads[paper_id] = thread
+        self.processing_progress_by_paper.pop(paper_id, None)
+        for item in self.processing_queue:
+            if item['id'] == paper_id:
+                item['status'] = 'pending'
+
     def process_next_in_queue(self):
-        """处理队列中的下一个文件"""
-        print("[DataManager] 尝试处理下一个文件", self.is_paused, self.is_processing, {item['id'] for item in self.processing_queue})
-        if self.is_paused or self.is_processing or not self.processing_queue:
-            return False
-        
-        print("[DataManager] 开始处理下一个文件")
-        
-        # 获取队列中第一个待处理项
-        next_item = self.processing_queue[0]
-        
-        # 标记为正在处理
-        self.is_processing = True
-        next_item['status'] = 'processing'
-        
-        # 创建并启动处理线程
-        self.current_thread = ProcessingThread(
-            self.pipeline, next_item['path'], self.output_dir, self
-        )
-        self.current_thread.start()
-        
-        return True
+        """按队列顺序启动待处理文件，直到达到同时处理的论文数上限"""
+        with self._queue_lock:
+            print("[DataManager] 尝试处理下一个文件", self.is_paused, list(self.processing_threads), {item['id'] for item in self.processing_queue})
+            if self.is_paused or not self.processing_queue:
+                return False
+            
+            started = False
+            for item in self.processing_queue:
+                if len(self.processing_threads) >= self.max_concurrent_papers:
+                    break
+                if item['status'] not in ('pending', 'incomplete') or item['id'] in self.processing_threads:
+                    continue
+                if item['id'] in self.stopping_threads:
+                    # 上一次处理还在退出中，退出后再重新开始
+                    continue
+                
+                print(f"[DataManager] 开始处理文件: {item['id']}")
+                
+                # 标记为正在处理
+                item['status'] = 'processing'
+                
+                # 创建并启动处理线程
+                thread = ProcessingThread(
+                    self.pipeline, item['path'], self.output_dir, self
+                )
+                self.processing_threads[item['id']] = thread
+                thread.start()
+                started = True
+            
+            return started
+
+    def on_progress_updated(self, paper_id, progress):
+        """处理进度更新回调"""
+        self.processing_progress_by_paper[paper_id] = progress
+        self.processing_progress = progress
     
     # ========== 处理线程回调 ==========
         
@@ -633,12 +781,13 @@ class DataManager(QObject):
         """处理完成回调"""
         print(f"论文处理完成: {paper_id}")
         
-        # 标记处理完成
-        self.is_processing = False
-        
-        # 从队列中移除已处理项
-        if self.processing_queue:
-            self.processing_queue.pop(0)
+        with self._queue_lock:
+            # 标记处理完成
+            self.processing_threads.pop(paper_id, None)
+            self.processing_progress_by_paper.pop(paper_id, None)
+            
+            # 从队列中移除已处理项
+            self.processing_queue = [item for item in self.processing_queue if item['id'] != paper_id]
         
         # 发送处理完成信号
         self.processing_finished.emit(paper_id)
@@ -653,6 +802,16 @@ class DataManager(QObject):
         if not self.is_paused:
             self.process_next_in_queue()
 
+    def on_processing_stopped(self, paper_id):
+        """处理线程响应停止请求并退出后的回调"""
+        with self._queue_lock:
+            self.stopping_threads.pop(paper_id, None)
+        print(f"论文处理线程已退出: {paper_id}")
+        
+        # 被抢占的任务需要在名额空出后重新开始
+        if not self.is_paused:
+            self.process_next_in_queue()
+
     def _add_paper_vector_store(self, paper_id):
         """将处理完成的论文向量库添加到RAG检索器"""
         try:
@@ -695,21 +854,24 @@ class DataManager(QObject):
     
     def on_processing_error(self, paper_id, error_msg):
         """处理错误回调"""
-        # 由于我们可能通过强制终止线程导致错误，需要检查处理状态
-        if not self.is_processing:
-            # 线程已被手动停止，无需报告错误
-            return
+        with self._queue_lock:
+            # 由于我们可能通过强制终止线程导致错误，需要检查处理状态
+            if paper_id not in self.processing_threads:
+                # 线程已被手动停止，无需报告错误
+                return
+                
+            error(f"处理论文 {paper_id} 时出错: {error_msg}")
             
-        error(f"处理论文 {paper_id} 时出错: {error_msg}")
-        
-        # 标记处理结束
-        self.is_processing = False
-        
-        # 从队列中移除错误项
-        if self.processing_queue and len(self.processing_queue) > 0:
-            self.processing_queue[0]['status'] = 'error'
-            self.processing_queue[0]['error_msg'] = error_msg
-            self.processing_queue.pop(0)
+            # 标记处理结束
+            self.processing_threads.pop(paper_id, None)
+            self.processing_progress_by_paper.pop(paper_id, None)
+            
+            # 从队列中移除错误项
+            for item in self.processing_queue:
+                if item['id'] == paper_id:
+                    item['status'] = 'error'
+                    item['error_msg'] = error_msg
+            self.processing_queue = [item for item in self.processing_queue if item['id'] != paper_id]
         
         # 继续处理下一个（如果未暂停）
         if not self.is_paused:
@@ -722,16 +884,11 @@ class DataManager(QObject):
         self.is_paused = True
         print("处理队列已暂停")
         
-        # 立即停止当前正在运行的线程
-        if self.current_thread and self.current_thread.isRunning():
-            self.current_thread.stop()  # 立即终止线程
-            self.is_processing = False  # 重置处理状态
-            
-            # 如果队列不为空，将当前任务重置为待处理状态
-            if self.processing_queue and len(self.processing_queue) > 0:
-                current_item = self.processing_queue[0]
-                current_item['status'] = 'pending'
-                print(f"已停止处理论文: {current_item['id']}")
+        # 停止所有正在运行的线程（当前LLM调用结束后退出），任务重置为待处理状态
+        with self._queue_lock:
+            for paper_id in list(self.processing_threads):
+                self._stop_thread(paper_id, "暂停处理")
+                print(f"已停止处理论文: {paper_id}")
     
     def resume_processing(self):
         """继续处理队列"""
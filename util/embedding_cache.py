@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+# 向量文件与索引数据库的文件名
+VECTORS_FILE = "vectors.f16"
+INDEX_FILE = "index.sqlite"
+
+# 向量文件每次扩容的最小行数
+_MIN_GROW_ROWS = 1024
+
+# 缓存满时一次淘汰的比例，避免每次写入都淘汰一条
+_EVICT_FRACTION = 0.05
+
+# 文本类型：langchain 的 embed_query 与 embed_documents 可以使用不同的编码参数，分开缓存
+KIND_DOCUMENT = "document"
+KIND_QUERY = "query"
+
+
+def text_key(kind: str, text: str) -> bytes:
+    """缓存键：文本类型与文本内容的SHA-256"""
+    return hashlib.sha256(f"{kind}\0{text}".encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """
+    基于内容哈希的持久化嵌入缓存
+
+    每个 (模型名称, 是否归一化) 使用单独的子目录，其中：
+      - vectors.f16:   float16 向量的内存映射数组，每行一个向量，按需成倍扩容
+      - index.sqlite:  文本哈希 -> (向量所在行, 最近使用时间) 的索引
+    条目数超过 max_entries 时按最近使用时间淘汰最久未用的条目，其所在行留给新向量复用。
+    返回的向量都经过 float16 舍入（包括刚计算出的），同一文本无论是否命中缓存结果都相同。
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], model_name: str, normalize: bool, max_entries: int):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        namespace = re.sub(r'[^0-9A-Za-z._-]+', '_', model_name) + ('-norm' if normalize else '-raw')
+        self.directory = Path(cache_dir) / namespace
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / VECTORS_FILE
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+
+        # 同一进程内由锁串行访问；界面与批处理命令行同时运行时由SQLite的文件锁协调
+        self._db = sqlite3.connect(str(self.directory / INDEX_FILE), timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, slot INTEGER NOT NULL, "
+                         "last_used INTEGER NOT NULL) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('model', ?)", (model_name,))
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('normalize', ?)", (str(int(normalize)),))
+
+    # ========== 查询与写入 ==========
+
+    def get_many(self, kind: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，返回与 texts 对应的向量（float32），未命中的位置为None"""
+        keys = [text_key(kind, text) for text in texts]
+        with self._lock:
+            slots = self._lookup(keys)
+            result: List[Optional[np.ndarray]] = [None] * len(keys)
+            vectors = self._mapped(max(slots.values(), default=-1) + 1) if slots else None
+            for i, key in enumerate(keys):
+                slot = slots.get(key)
+                if slot is not None:
+                    result[i] = np.array(vectors[slot], dtype=np.float32)
+            if slots:
+                self._touch(list(slots))
+            hits = sum(1 for vector in result if vector is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return result
+
+    def put_many(self, kind: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        """写入新计算的向量，返回 float16 舍入后的向量数组 (文本数, 维度)"""
+        rounded = np.asarray(vectors, dtype=np.float16)
+        if rounded.ndim != 2 or len(rounded) != len(texts):
+            raise ValueError(f"向量形状与文本数不符: {rounded.shape}, {len(texts)}")
+        keys = list(dict.fromkeys(text_key(kind, text) for text in texts))
+        rows = {text_key(kind, text): rounded[i] for i, text in enumerate(texts)}
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                dimensions = self._dimensions(rounded.shape[1])
+                if rounded.shape[1] != dimensions:
+                    raise ValueError(f"向量维度 {rounded.shape[1]} 与缓存中的 {dimensions} 不一致")
+                existing = self._lookup(keys)
+                new_keys = [key for key in keys if key not in existing][:self.max_entries]
+                slots = self._allocate(len(new_keys))
+                vectors_file = self._mapped(max(slots, default=-1) + 1)
+                for key, slot in zip(new_keys, slots):
+                    vectors_file[slot] = rows[key]
+                vectors_file.flush()
+                # 向量写入文件后才登记索引，其他读取方不会读到未写完的行
+                clock = self._tick()
+                self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                                     [(key, slot, clock) for key, slot in zip(new_keys, slots)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rounded.astype(np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回本进程的命中统计和缓存的当前规模"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'bytes': self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._db.close()
+
+    # ========== 内部实现（调用方持有锁） ==========
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, int]:
+        slots = {}
+        # SQLite 单条语句的参数个数有上限，分批查询
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            slots.update(self._db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch).fetchall())
+        return slots
+
+    def _touch(self, keys: List[bytes]) -> None:
+        """更新命中条目的最近使用时间"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            clock = self._tick()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(clock, key) for key in keys])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _tick(self) -> int:
+        """递增并返回逻辑时钟，用作最近使用时间"""
+        self._db.execute("INSERT INTO meta VALUES ('clock', '1') "
+                         "ON CONFLICT(name) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+        return int(self._meta('clock'))
+
+    def _meta(self, name: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _dimensions(self, dimensions: int) -> int:
+        """返回缓存的向量维度，首次写入时记录"""
+        stored = self._meta('dimensions')
+        if stored is None:
+            self._db.execute("INSERT INTO meta VALUES ('dimensions', ?)", (str(dimensions),))
+            return dimensions
+        return int(stored)
+
+    def _allocate(self, count: int) -> List[int]:
+        """为新条目分配向量行：先用空闲行，再追加新行，达到上限时淘汰最久未用的条目"""
+        if count == 0:
+            return []
+        slots = [row[0] for row in self._db.execute(
+            "SELECT slot FROM free_slots ORDER BY slot LIMIT ?", (count,)).fetchall()]
+        self._db.executemany("DELETE FROM free_slots WHERE slot = ?", [(slot,) for slot in slots])
+
+        next_slot = int(self._meta('next_slot') or 0)
+        appended = min(count - len(slots), self.max_entries - next_slot)
+        if appended > 0:
+            slots.extend(range(next_slot, next_slot + appended))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next_slot', ?)", (str(next_slot + appended),))
+
+        shortage = count - len(slots)
+        if shortage > 0:
+            evict = max(shortage, int(self.max_entries * _EVICT_FRACTION))
+            victims = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (evict,)).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            freed = [slot for _, slot in victims]
+            slots.extend(freed[:shortage])
+            self._db.executemany("INSERT INTO free_slots VALUES (?)", [(slot,) for slot in freed[shortage:]])
+            self.evictions += len(victims)
+            self.logger.debug(f"嵌入缓存已满，淘汰 {len(victims)} 条最久未用的条目")
+        return slots
+
+    def _mapped(self, rows: int) -> np.memmap:
+        """返回至少包含 rows 行的向量文件映射，文件不够大时扩容（其他进程扩容后重新映射）"""
+        dimensions = int(self._meta('dimensions'))
+        row_bytes = dimensions * np.dtype(np.float16).itemsize
+        if self._vectors is not None and len(self._vectors) >= rows:
+            return self._vectors
+
+        self._vectors = None
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        capacity = size // row_bytes
+        if capacity < rows:
+            capacity = min(self.max_entries, max(rows, capacity * 2, _MIN_GROW_ROWS))
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(capacity * row_bytes)
+                os.fsync(f.fileno())
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r+', shape=(capacity, dimensions))
+        return self._vectors
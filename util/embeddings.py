@@ -0,0 +1,360 @@
+import hashlib
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from util.embedding_cache import EmbeddingCache, KIND_DOCUMENT, KIND_QUERY
+from util.metrics import estimate_tokens, record_embedding_call, record_embedding_cache
+from util.cancellation import check_cancelled
+
+
+class MeteredEmbeddings(Embeddings):
+    """嵌入模型包装：向当前阶段的指标记录嵌入调用次数和文本数量，并在每次调用前检查任务是否已取消"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        check_cancelled()
+        record_embedding_call(len(texts))
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        check_cancelled()
+        record_embedding_call(1)
+        return self.embeddings.embed_query(text)
+
+
+# 中日韩文字没有空格分词，按相邻两字切分；其余文字按单词切分（以字母开头，可以包含数字，如 gpt4）
+_CJK_RUN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+')
+_WORD_PATTERN = re.compile(r'[^\W\d_\u3400-\u4dbf\u4e00-\u9fff][^\W_\u3400-\u4dbf\u4e00-\u9fff]+')
+
+# 不参与相似度计算的英文虚词
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were "
+    "which with we our can not these those also than then such into been".split()
+)
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature(token: str, dimensions: int) -> Tuple[int, float]:
+    """词语哈希到的维度和符号（带符号的哈希使不同词语的冲突相互抵消而不是累加）"""
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest[:4], 'little') % dimensions, (1.0 if digest[4] & 1 else -1.0)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    无需加载模型的轻量嵌入：将词语哈希到固定维度，按词频的对数加权后做L2归一化
+
+    只反映词语重叠，适合 TextTiling 这类只比较相邻窗口相对相似度的场合，不适合语义检索。
+    没有使用IDF：向量只取决于文本本身，与同一批中的其他文本无关。
+    """
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        tokens = [word for word in _WORD_PATTERN.findall(text.lower()) if word not in _STOPWORDS]
+        for run in _CJK_RUN_PATTERN.findall(text):
+            tokens.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+        return tokens
+
+    def _embed(self, text: str) -> List[float]:
+        counts: Dict[str, int] = {}
+        for token in self.tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        weights: Dict[int, float] = {}
+        for token, count in counts.items():
+            index, sign = _feature(token, self.dimensions)
+            weights[index] = weights.get(index, 0.0) + sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(value * value for value in weights.values())) or 1.0
+        vector = [0.0] * self.dimensions
+        for index, value in weights.items():
+            vector[index] = value / norm
+        return vector
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    嵌入模型包装：先查持久化嵌入缓存，只将未命中的文本交给内层模型计算
+
+    分块、向量库创建和检索共用同一个缓存，重新处理论文或修改参数后重新分块时不必重新计算嵌入。
+    命中与未命中的文本数记入当前阶段的指标。缓存读写出错时记录警告并停用缓存，直接调用内层模型。
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.embeddings = embeddings
+        self.cache: Optional[EmbeddingCache] = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None or not texts:
+            return self.embeddings.embed_documents(texts)
+        try:
+            return self._embed(KIND_DOCUMENT, texts, self.embeddings.embed_documents)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            self._disable(e)
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.cache is None:
+            return self.embeddings.embed_query(text)
+        try:
+            return self._embed(KIND_QUERY, [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+        except (sqlite3.Error, OSError, ValueError) as e:
+            self._disable(e)
+            return self.embeddings.embed_query(text)
+
+    def _embed(self, kind: str, texts: List[str], compute) -> List[List[float]]:
+        vectors = self.cache.get_many(kind, texts)
+        misses = sum(1 for vector in vectors if vector is None)
+        record_embedding_cache(len(texts) - misses, misses)
+        if misses:
+            # 同一批中重复的文本只计算一次
+            missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+            computed = dict(zip(missing, self.cache.put_many(kind, missing, compute(missing))))
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return [vector.tolist() for vector in vectors]
+
+    def _disable(self, e: Exception) -> None:
+        self.logger.warning(f"嵌入缓存读写失败，本次运行不再使用缓存: {e}")
+        self.cache = None
+
+
+@dataclass
+class _Request:
+    text: str
+    tokens: int
+    enqueued: float
+    future: Future = field(default_factory=Future)
+
+
+class _ThroughputTuner:
+    """
+    按实测吞吐量（每秒嵌入的token数）调整每批的token预算和同时调用模型的线程数
+
+    每完成 window 批统计一次吞吐量，用爬山法每次调整一个参数：
+    吞吐量提高则沿同一方向继续调整，否则退回上一次的设置、反转方向并改为调整另一个参数。
+    记录的最好吞吐量每次失败后衰减，文本长度分布变化后仍会重新探索。
+    """
+
+    def __init__(self, token_budget: int, min_budget: int, max_budget: int, max_threads: int, window: int):
+        self.token_budget = token_budget
+        self.threads = 1
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.max_threads = max(1, max_threads)
+        self.window = max(1, window)
+        self._knob = 'token_budget'
+        self._direction = {'token_budget': 1, 'threads': 1}
+        self._best = 0.0
+        self._previous: Optional[Dict[str, int]] = None
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._batches = 0
+        self._tokens = 0
+        self._started = None
+        self._finished = 0.0
+
+    def record(self, tokens: int, started: float, finished: float) -> None:
+        """记录一批的token数和起止时间（调用方持有服务的锁）"""
+        self._batches += 1
+        self._tokens += tokens
+        self._started = started if self._started is None else min(self._started, started)
+        self._finished = max(self._finished, finished)
+        if self._batches >= self.window:
+            elapsed = self._finished - self._started
+            if elapsed > 0:
+                self._adjust(self._tokens / elapsed)
+            self._reset_window()
+
+    def _adjust(self, throughput: float) -> None:
+        if throughput > self._best:
+            self._best = throughput
+        else:
+            self._best *= 0.9
+            if self._previous is not None:
+                self.token_budget, self.threads = self._previous['token_budget'], self._previous['threads']
+            self._direction[self._knob] = -self._direction[self._knob]
+            if self.max_threads > 1:
+                self._knob = 'threads' if self._knob == 'token_budget' else 'token_budget'
+        self._previous = {'token_budget': self.token_budget, 'threads': self.threads}
+        if self._knob == 'token_budget':
+            factor = 2 if self._direction['token_budget'] > 0 else 0.5
+            self.token_budget = int(min(self.max_budget, max(self.min_budget, self.token_budget * factor)))
+        else:
+            self.threads = min(self.max_threads, max(1, self.threads + self._direction['threads']))
+
+
+class EmbeddingService(Embeddings):
+    """
+    共享的嵌入批处理服务
+
+    分块、向量库创建和检索的嵌入请求都进入同一个队列，由后台线程合并后调用模型：
+      - 文档按估算的token数分入长度桶（按2的幂划分），每批只取同一个桶中的文本，减少补齐浪费
+      - 每批的文本数受token预算限制（文本数 × 桶的长度上限不超过预算）
+      - 检索的查询优先处理，单独调用 embed_query
+      - 请求到达后最多等待 max_wait 秒，以便合并其他调用方同时提交的文本
+    token预算和同时调用模型的线程数由 _ThroughputTuner 按实测吞吐量调整。
+    submit 返回每条文本的 Future；embed_documents/embed_query 保持 langchain 的同步接口，
+    等待期间检查任务是否已取消，取消时撤回尚未开始计算的文本。
+    """
+
+    def __init__(self, embeddings: Embeddings, token_budget: int = 8192, max_threads: int = 2,
+                 max_wait: float = 0.005, min_budget: int = 512, max_budget: int = 65536, window: int = 8):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.embeddings = embeddings
+        self.max_wait = max_wait
+        self.tuner = _ThroughputTuner(token_budget, min_budget, max_budget, max_threads, window)
+        self._condition = threading.Condition()
+        self._queries: Deque[_Request] = deque()
+        self._buckets: Dict[int, Deque[_Request]] = {}
+        self._queued_tokens = 0
+        self._running = 0
+        self._workers: List[threading.Thread] = []
+        self.calls = 0
+        self.texts = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    # ========== 调用方接口 ==========
+
+    def submit(self, texts: List[str], kind: str = KIND_DOCUMENT) -> List[Future]:
+        """提交文本，返回与之对应的 Future（结果为嵌入向量）"""
+        now = time.perf_counter()
+        requests = [_Request(text, max(1, estimate_tokens(text)), now) for text in texts]
+        with self._condition:
+            self._start_workers()
+            for request in requests:
+                if kind == KIND_QUERY:
+                    self._queries.append(request)
+                else:
+                    self._buckets.setdefault(request.tokens.bit_length(), deque()).append(request)
+                    self._queued_tokens += request.tokens
+            self._condition.notify_all()
+        return [request.future for request in requests]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._wait(self.submit(texts, KIND_DOCUMENT))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._wait(self.submit([text], KIND_QUERY))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回累计调用统计和当前的调整结果"""
+        with self._condition:
+            return {
+                'calls': self.calls,
+                'texts': self.texts,
+                'tokens': self.tokens,
+                'padded_tokens': self.padded_tokens,
+                'padding_ratio': 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0,
+                'token_budget': self.tuner.token_budget,
+                'threads': self.tuner.threads
+            }
+
+    @staticmethod
+    def _wait(futures: List[Future]) -> List[Any]:
+        try:
+            while wait(futures, timeout=0.2).not_done:
+                check_cancelled()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return [future.result() for future in futures]
+
+    # ========== 后台线程 ==========
+
+    def _start_workers(self) -> None:
+        """首次提交时启动后台线程（调用方持有锁）"""
+        while len(self._workers) < self.tuner.max_threads:
+            worker = threading.Thread(target=self._run, name=f"embedding-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                kind, batch = self._next_batch()
+                self._running += 1
+            started = time.perf_counter()
+            try:
+                texts = [request.text for request in batch]
+                if kind == KIND_QUERY:
+                    vectors = [self.embeddings.embed_query(texts[0])]
+                else:
+                    vectors = self.embeddings.embed_documents(texts)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"嵌入模型返回 {len(vectors)} 个向量，应为 {len(batch)} 个")
+                for request, vector in zip(batch, vectors):
+                    request.future.set_result(vector)
+            except BaseException as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finally:
+                finished = time.perf_counter()
+                tokens = sum(request.tokens for request in batch)
+                with self._condition:
+                    self._running -= 1
+                    self.calls += 1
+                    self.texts += len(batch)
+                    self.tokens += tokens
+                    self.padded_tokens += len(batch) * max(request.tokens for request in batch)
+                    self.tuner.record(tokens, started, finished)
+                    self._condition.notify_all()
+
+    def _next_batch(self):
+        """等待并取出下一批（调用方持有锁），返回 (文本类型, 请求列表)"""
+        while True:
+            if self._running < self.tuner.threads:
+                while self._queries:
+                    request = self._queries.popleft()
+                    if request.future.set_running_or_notify_cancel():
+                        return KIND_QUERY, [request]
+                if self._buckets:
+                    # 优先处理等待最久的桶；未到等待时间且排队的文本不足一批时继续等待合并
+                    key = min(self._buckets, key=lambda k: self._buckets[k][0].enqueued)
+                    remaining = self._buckets[key][0].enqueued + self.max_wait - time.perf_counter()
+                    if remaining <= 0 or self._queued_tokens >= self.tuner.token_budget:
+                        batch = self._take(key)
+                        if batch:
+                            return KIND_DOCUMENT, batch
+                        continue
+                    self._condition.wait(remaining)
+                    continue
+            self._condition.wait()
+
+    def _take(self, key: int) -> List[_Request]:
+        """从长度桶中取出不超过token预算的一批，跳过已被调用方撤回的请求"""
+        bucket = self._buckets[key]
+        limit = max(1, self.tuner.token_budget >> key)
+        batch = []
+        while bucket and len(batch) < limit:
+            request = bucket.popleft()
+            self._queued_tokens -= request.tokens
+            if request.future.set_running_or_notify_cancel():
+                batch.append(request)
+        if not bucket:
+            del self._buckets[key]
+        return batch
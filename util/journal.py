@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from util.stage_cache import hash_text
+from util.metrics import current_metrics
+
+# 日志文件后缀，与阶段产物放在同一论文输出目录下
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+
+class StageJournal:
+    """
+    LLM阶段的追加式日志（JSONL）
+
+    每次LLM调用成功返回后立即追加一行 {node, input, result}，并 fsync 落盘。
+    node 为结果在文档中的节点路径（如 sections/2/content/5/content），
+    input 为调用输入（提示词、模型）的哈希。阶段被暂停、终止或崩溃后重新运行时，
+    节点路径和输入都相同的调用直接回放日志中的结果，只需补做剩余的调用。
+    输入变化（如提示词修改、前文翻译不同）时哈希不同，不会误用旧结果。
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Any] = {}
+        self._used: Dict[Tuple[str, str], Any] = {}   # 本次运行中回放或新写入的条目，压缩时保留
+        self._file = None
+        self._load()
+
+    @staticmethod
+    def input_hash(payload: Any) -> str:
+        """计算调用输入的哈希"""
+        return hash_text(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str))
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._entries[(entry['node'], entry['input'])] = entry['result']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # 进程在写入过程中被终止时最后一行可能不完整
+                    skipped += 1
+        self.logger.info(f"载入日志 {self.path}: {len(self._entries)} 条记录，跳过 {skipped} 行损坏记录")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, node: str, payload: Any) -> Optional[Any]:
+        """查找已完成的调用结果，没有时返回None"""
+        key = (node, self.input_hash(payload))
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._used[key] = self._entries[key]
+            return self._entries[key]
+
+    def record(self, node: str, payload: Any, result: Any) -> None:
+        """追加一条调用结果并立即落盘"""
+        key = (node, self.input_hash(payload))
+        line = json.dumps({
+            'node': node,
+            'input': key[1],
+            'result': result,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S')
+        }, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._entries[key] = result
+            self._used[key] = result
+
+    def replay_or_call(self, node: str, payload: Any, call: Callable[[], Any]) -> Any:
+        """
+        有记录时回放结果，否则执行调用并记录
+
+        调用抛出异常时不写日志，重新运行时会再次尝试。
+        """
+        result = self.lookup(node, payload)
+        if result is not None:
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.add(journal_replays=1)
+            return result
+        result = call()
+        self.record(node, payload, result)
+        return result
+
+    def compact(self) -> None:
+        """
+        阶段完成后压缩日志：只保留本次运行用到的条目
+
+        保留的条目可以让之后因部分输入变化而重跑的阶段回放未变化节点的结果。
+        """
+        with self._lock:
+            self._close()
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for (node, input_hash), result in self._used.items():
+                    f.write(json.dumps({'node': node, 'input': input_hash, 'result': result},
+                                       ensure_ascii=False) + '\n')
+            tmp_path.replace(self.path)
+            self._entries = dict(self._used)
+
+    def close(self) -> None:
+        """关闭日志文件（保留文件用于下次回放）"""
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,152 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+# 可累加的计数字段，汇总时按字段求和
+COUNTER_FIELDS = (
+    'wall_time', 'cpu_time', 'llm_calls', 'prompt_tokens', 'completion_tokens',
+    'embedding_calls', 'embedded_texts', 'embedding_cache_hits', 'embedding_cache_misses',
+    'bytes_read', 'bytes_written', 'journal_replays'
+)
+
+# 中日韩字符，估算token数时按每字一个token计
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """在接口未返回用量时粗略估算token数：中文每字约1个token，其余约4个字符1个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class StageMetrics:
+    """
+    单个阶段的运行指标
+
+    wall_time 为阶段函数的墙钟耗时；cpu_time 为运行阶段的工作线程自身消耗的CPU时间，
+    不包含后台检查点写线程和模型推理库内部线程。
+    """
+    stage: str
+    cached: bool = False                 # 是否命中阶段缓存而跳过
+    started_at: str = ''
+    wall_time: float = 0.0               # 秒
+    cpu_time: float = 0.0                # 秒
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_estimated: bool = False       # token数是否包含按字符估算的部分
+    embedding_calls: int = 0
+    embedded_texts: int = 0              # 实际由模型计算嵌入的文本数（不含命中嵌入缓存的）
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    journal_replays: int = 0             # 从断点日志回放而未实际调用LLM的次数
+    info: Dict[str, Any] = field(default_factory=dict)  # 阶段自行记录的说明信息（如PDF转换模式）
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counters) -> None:
+        """线程安全地累加计数（检查点写线程也会向阶段指标中记录写入字节数）"""
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def set_info(self, **info) -> None:
+        with self._lock:
+            self.info.update(info)
+
+    def record_llm_call(self, prompt_tokens: int, completion_tokens: int, estimated: bool = False) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.tokens_estimated = self.tokens_estimated or estimated
+
+    @contextmanager
+    def measure(self) -> Iterator['StageMetrics']:
+        """在当前线程中计时，并将本指标设为当前记录对象"""
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        token = _current_metrics.set(self)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield self
+        finally:
+            self.add(wall_time=time.perf_counter() - wall_start,
+                     cpu_time=time.thread_time() - cpu_start)
+            _current_metrics.reset(token)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            data = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith('_')}
+            data['info'] = dict(self.info)
+        data['wall_time'] = round(data['wall_time'], 3)
+        data['cpu_time'] = round(data['cpu_time'], 3)
+        return data
+
+
+# 当前线程（上下文）正在运行的阶段的指标，LLM客户端等底层组件通过它记录用量
+_current_metrics: ContextVar[Optional[StageMetrics]] = ContextVar('stage_metrics', default=None)
+
+
+def current_metrics() -> Optional[StageMetrics]:
+    """获取当前正在记录的阶段指标，不在阶段中运行时返回None"""
+    return _current_metrics.get()
+
+
+def record_llm_call(prompt_tokens: int, completion_tokens: int, estimated: bool = False) -> None:
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.record_llm_call(prompt_tokens, completion_tokens, estimated)
+
+
+def record_embedding_call(texts: int) -> None:
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(embedding_calls=1, embedded_texts=texts)
+
+
+def record_embedding_cache(hits: int, misses: int) -> None:
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(embedding_cache_hits=hits, embedding_cache_misses=misses)
+
+
+def record_bytes_read(size: int) -> None:
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(bytes_read=size)
+
+
+def record_stage_info(**info) -> None:
+    """向当前阶段的指标记录说明信息"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.set_info(**info)
+
+
+def record_bytes_written(size: int) -> None:
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(bytes_written=size)
+
+
+def summarize(stages: List[StageMetrics]) -> Dict[str, Any]:
+    """汇总各阶段指标"""
+    totals = {name: 0 for name in COUNTER_FIELDS}
+    for metrics in stages:
+        data = metrics.to_dict()
+        for name in COUNTER_FIELDS:
+            totals[name] += data[name]
+    totals['wall_time'] = round(totals['wall_time'], 3)
+    totals['cpu_time'] = round(totals['cpu_time'], 3)
+    totals['stages_run'] = sum(1 for m in stages if not m.cached)
+    totals['stages_cached'] = sum(1 for m in stages if m.cached)
+    return totals
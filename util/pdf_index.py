@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from util.stage_cache import hash_file
+
+# 与 papers_index.json 放在同一目录
+PDF_INDEX_FILE = "pdf_hashes.json"
+
+
+class PdfHashIndex:
+    """
+    PDF内容索引：按PDF文件的SHA-256识别同一篇论文
+
+    论文ID取自文件名，同一篇论文以不同文件名上传（如 2401.12345v1.pdf 与 attention.pdf）
+    时会被当成两篇论文重复处理。索引记录每个内容哈希对应的论文ID，重复的文件只记为别名。
+    同时按文件名缓存哈希及文件大小、修改时间，扫描数据目录时未变化的文件不必重新计算哈希。
+
+    文件格式:
+        {"papers": {哈希: {"id": 论文ID, "aliases": [别名ID, ...]}},
+         "files": {文件名: {"sha256": 哈希, "size": 字节数, "mtime_ns": 修改时间}}}
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._papers: Dict[str, Dict[str, Any]] = {}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._papers = data.get('papers', {})
+            self._files = data.get('files', {})
+        except (OSError, json.JSONDecodeError) as e:
+            # 索引可以由数据目录重建，损坏时从空索引开始
+            self.logger.warning(f"PDF内容索引无法读取，将重新建立: {e}")
+
+    def save(self) -> None:
+        """保存索引（先写临时文件再替换）"""
+        with self._lock:
+            data = {'papers': self._papers, 'files': self._files}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            tmp_path.replace(self.path)
+
+    def hash_pdf(self, pdf_path: Union[str, Path]) -> str:
+        """计算PDF文件的SHA-256，文件大小和修改时间未变时使用缓存的哈希"""
+        pdf_path = Path(pdf_path)
+        stat = pdf_path.stat()
+        with self._lock:
+            cached = self._files.get(pdf_path.name)
+            if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+                return cached['sha256']
+        sha256 = hash_file(pdf_path)
+        with self._lock:
+            self._files[pdf_path.name] = {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        return sha256
+
+    def lookup(self, sha256: str) -> Optional[str]:
+        """返回该内容对应的论文ID，未登记时返回None"""
+        with self._lock:
+            entry = self._papers.get(sha256)
+            return entry['id'] if entry else None
+
+    def register(self, sha256: str, paper_id: str, exists: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        登记论文内容
+
+        内容未登记时以 paper_id 为该内容的论文ID；已登记为其他论文时将 paper_id 记为别名。
+
+        Args:
+            exists: 判断已登记的论文是否仍然存在，原论文已被删除时由 paper_id 接替
+
+        Returns:
+            str: 该内容对应的论文ID
+        """
+        with self._lock:
+            entry = self._papers.get(sha256)
+            if entry is None:
+                self._papers[sha256] = {'id': paper_id, 'aliases': []}
+                return paper_id
+            if paper_id != entry['id'] and exists is not None and not exists(entry['id']):
+                self.logger.info(f"论文 {entry['id']} 已不存在，由 {paper_id} 接替")
+                entry['id'] = paper_id
+                if paper_id in entry['aliases']:
+                    entry['aliases'].remove(paper_id)
+                return paper_id
+            if paper_id != entry['id'] and paper_id not in entry['aliases']:
+                entry['aliases'].append(paper_id)
+            return entry['id']
+
+    def aliases(self, paper_id: str) -> List[str]:
+        """论文的全部别名"""
+        with self._lock:
+            for entry in self._papers.values():
+                if entry['id'] == paper_id:
+                    return list(entry['aliases'])
+        return []
+
+    def resolve(self, paper_id: str) -> str:
+        """将别名解析为论文ID（不是别名时原样返回）"""
+        with self._lock:
+            for entry in self._papers.values():
+                if paper_id in entry['aliases']:
+                    return entry['id']
+        return paper_id
+
+    def forget_missing_files(self, data_dir: Union[str, Path]) -> None:
+        """删除数据目录中已不存在的文件的哈希缓存"""
+        existing = set(os.listdir(data_dir))
+        with self._lock:
+            for name in [name for name in self._files if name not in existing]:
+                del self._files[name]
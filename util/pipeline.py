@@ -1,8 +1,14 @@
 from pathlib import Path
 import json
 import logging
-from typing import Optional, Dict, List, Union
+import threading
+import time
+import traceback
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Optional, Dict, List, Union
 from processor.pdf_processor import PDFProcessor
+from processor.image_processor import ImageProcessor
 from processor.md_processor import MarkdownProcessor
 from processor.json_processor import JsonProcessor
 from processor.tiling_processor import TilingProcessor
@@ -11,32 +17,65 @@ from processor.md_restore_processor import RestoreProcessor
 from processor.extra_info_processor import ExtraInfoProcessor
 from processor.rag_processor import RagProcessor
 from processor.md_processor_slides import MarkdownProcessorSlides
-from PyQt6.QtCore import QObject, pyqtSignal
+from util.stage_cache import StageCache, hash_path
+from util.checkpoint import CheckpointWriter, copy_document, load_document
+from util.metrics import StageMetrics, current_metrics, record_bytes_read, summarize
+from util.progress import ProgressTracker, track_progress
+from util.journal import StageJournal, JOURNAL_SUFFIX
+from util.cancellation import CancellationToken, ProcessingCancelled, use_token
+from util.scheduler import StageScheduler, RESOURCE_PDF, RESOURCE_CPU, RESOURCE_LLM
 from rich import print
 
+# 全局索引的读-改-写在多篇论文并发完成时需要串行
+_INDEX_LOCK = threading.Lock()
 
-def error(msg):
+
+def error(msg, exc_info=False):
     print(f"[bold red]Error:[/bold red] {msg}")
+    if exc_info:
+        traceback.print_exc()
+
+
+@dataclass
+class PaperJob:
+    """单篇论文的处理上下文，管线的所有逐篇状态都保存在这里，使管线可同时处理多篇论文"""
+    paper_id: str                  # 论文ID（基于PDF文件名）
+    pdf_path: Path                 # PDF文件路径
+    base_output_dir: Path          # 基础输出目录
+    output_dir: Path               # 论文输出目录
+    output_paths: Dict[str, Union[Path, Dict[str, Path]]] = field(default_factory=dict)  # 各阶段输出路径
+    running_stages: List[str] = field(default_factory=list)    # 正在运行的阶段
+    completed_stages: List[str] = field(default_factory=list)  # 已完成（或命中缓存）的阶段
+    documents: Dict[str, Any] = field(default_factory=dict, repr=False)      # 本次运行中各阶段产出的内存文档
+    checkpoints: Dict[str, Future] = field(default_factory=dict, repr=False)  # 各阶段检查点的写入任务，结果为产物哈希
+    pending_writes: List[Future] = field(default_factory=list, repr=False)   # 尚未确认完成的后台写入任务
+    metrics: Dict[str, StageMetrics] = field(default_factory=dict, repr=False)  # 各阶段运行指标
+    stage_progress: Dict[str, Dict[str, Any]] = field(default_factory=dict, repr=False)  # 运行中阶段的内部进度
+    started_at: float = field(default_factory=time.perf_counter, repr=False)   # 开始处理的时间（perf_counter）
+    cancel_token: CancellationToken = field(default_factory=CancellationToken, repr=False)  # 协作式取消令牌
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
-class Pipeline(QObject):
-    """学术论文处理管线"""
-    # 添加进度更新信号
-    # progress_updated = pyqtSignal(dict)  # 发送stage_info字典
+
+class Pipeline:
+    """学术论文处理管线（不依赖界面框架，可由 DataManager 或批处理命令行驱动）"""
     
-    def __init__(self, stages: Optional[List[str]] = None, data_manager=None):
+    def __init__(self, stages: Optional[List[str]] = None, data_manager=None,
+                 scheduler: Optional[StageScheduler] = None):
         """
         初始化处理管线
         
         Args:
             stages: 需要运行的处理阶段列表
-                   可选值: ['pdf2md', 'md2json', 'json_process', 
+                   可选值: ['pdf2md', 'images', 'md2json', 'json_process', 
                           'tiling', 'translate', 'md_restore', 'extra_info', 'rag']
+            data_manager: 数据管理器，用于回报处理进度
+            scheduler: 阶段调度器，多篇论文共享同一调度器时各资源类型的并发数全局生效
         """
-        super().__init__()  # 调用QObject初始化
-
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         # 定义阶段标识符和对应的处理函数
         self.stage_identifiers = {
             'pdf2md': 'main',
+            'images': 'images_manifest',
             'md2json': 'structured',
             'json_process': 'processed',
             'tiling': 'tiled',
@@ -48,6 +87,7 @@ class Pipeline(QObject):
         
         self.available_stages = {
             'pdf2md': self._stage_pdf_to_md,
+            'images': self._stage_images,
             'md2json': self._stage_md_to_json,
             'json_process': self._stage_json_process,
             'tiling': self._stage_tiling,
@@ -56,11 +96,42 @@ class Pipeline(QObject):
             'extra_info': self._stage_extra_info,
             'rag': self._stage_rag
         }
+
+        # 阶段依赖图：每个阶段声明其输入来自哪些前序阶段的输出
+        # 没有相互依赖的阶段（如 md_restore 与 extra_info）可以并行执行
+        self.stage_dependencies = {
+            'pdf2md': [],
+            'images': ['pdf2md'],
+            'md2json': ['pdf2md'],
+            'json_process': ['md2json'],
+            'tiling': ['json_process'],
+            'translate': ['tiling'],
+            'md_restore': ['translate'],
+            'extra_info': ['translate'],
+            'rag': ['translate', 'extra_info']
+        }
+
+        # 每个阶段占用的资源类型，决定其在调度器中使用哪个线程池
+        self.stage_resources = {
+            'pdf2md': RESOURCE_PDF,
+            'images': RESOURCE_CPU,
+            'md2json': RESOURCE_CPU,
+            'json_process': RESOURCE_CPU,
+            'tiling': RESOURCE_CPU,
+            'translate': RESOURCE_LLM,
+            'md_restore': RESOURCE_CPU,
+            'extra_info': RESOURCE_LLM,
+            'rag': RESOURCE_CPU
+        }
+        self.scheduler = scheduler or StageScheduler()
+        # 阶段之间直接传递内存文档，JSON检查点和缓存清单由后台线程写入
+        self.checkpoint_writer = CheckpointWriter()
         self.stages = stages or list(self.available_stages.keys())
         print("初始化处理阶段: ", self.stages)
         
         # 初始化处理器
         self.pdf_processor = PDFProcessor()
+        self.image_processor = ImageProcessor()
         self.md_processor = MarkdownProcessor()
         self.md_processor_original = MarkdownProcessor()
         self.md_processor_slides = MarkdownProcessorSlides()
@@ -72,14 +143,23 @@ class Pipeline(QObject):
         self.rag_processor = RagProcessor()
         self.data_manager = data_manager
         
-        # 论文处理状态
-        self.paper_info = {
-            'paper_id': None,     # 论文ID（基于PDF文件名）
-            'output_dir': None    # 输出目录
-        }
+        # 正在处理的论文: {paper_id: PaperJob}
+        self.jobs: Dict[str, PaperJob] = {}
+        self._jobs_lock = threading.Lock()
+
+    def cancel(self, paper_id: str, reason: str = '') -> bool:
+        """
+        请求取消正在处理的论文
 
-        # 添加跟踪当前处理阶段的属性
-        self._current_stage = None
+        Returns:
+            bool: 该论文是否正在处理
+        """
+        with self._jobs_lock:
+            job = self.jobs.get(paper_id)
+        if job is None:
+            return False
+        job.cancel_token.cancel(reason)
+        return True
 
     def _change_md_processor(self, processor: MarkdownProcessor):
         print("on _change_md_processor")
@@ -131,7 +211,8 @@ class Pipeline(QObject):
         """
         identifier = self.stage_identifiers.get(stage, '')
         if stage == 'pdf2md':
-            return paper_dir / f"{identifier}.md"
+            # PDFProcessor 以论文名称命名生成的Markdown文件
+            return paper_dir / f"{paper_name}.md"
         elif stage == 'md_restore':
             # 对于restore阶段，返回一个包含英文和中文输出路径的字典
             return {
@@ -148,24 +229,33 @@ class Pipeline(QObject):
         else:
             return paper_dir / f"{identifier}.json"
         
-    def get_current_stage(self) -> Dict[str, any]:
+    def get_current_stage(self, job: Optional[PaperJob] = None) -> Dict[str, any]:
         """
-        获取当前处理阶段的信息
+        获取论文当前处理阶段的信息
+        
+        Args:
+            job: 论文处理上下文，为空时取唯一正在处理的论文
         
         Returns:
             Dict: 包含当前阶段信息的字典，格式为:
                 {
-                    'stage': 当前阶段名称,
-                    'stage_name': 当前阶段显示名称,
-                    'index': 当前阶段在所有阶段中的索引位置,
+                    'stage': 当前阶段名称（多个阶段并行时为第一个）,
+                    'stages': 所有正在运行的阶段名称列表,
+                    'stage_name': 正在运行阶段的显示名称,
+                    'index': 已开始的阶段数,
                     'total': 总阶段数,
-                    'progress': 完成百分比,
-                    'stage_progress': 当前阶段内部进度
+                    'progress': 完成百分比（包含运行中阶段的部分进度）,
+                    'stage_progress': 当前阶段内部进度百分比,
+                    'eta': 当前阶段预计剩余秒数（未知时为None）,
+                    'throughput': 当前阶段吞吐量（单元/分钟）,
+                    'stage_details': {阶段: {'done', 'total', 'unit', 'percent', 'throughput', 'eta'}}
                 }
+            多个阶段并行时，stage_progress/eta/throughput 取预计剩余时间最长的阶段
         """
         # 阶段名称的友好显示映射
         stage_names = {
             'pdf2md': 'PDF转Markdown',
+            'images': '图片处理',
             'md2json': 'Markdown转JSON',
             'json_process': 'JSON处理',
             'tiling': '分段处理',
@@ -175,46 +265,291 @@ class Pipeline(QObject):
             'rag': 'RAG处理'
         }
         
-        if self._current_stage is None:
+        if job is None:
+            with self._jobs_lock:
+                active = list(self.jobs.values())
+            job = active[0] if len(active) == 1 else None
+
+        total = len(self.stages)
+        running, completed, details = [], 0, {}
+        if job is not None:
+            with job.lock:
+                running = list(job.running_stages)
+                completed = len(job.completed_stages)
+                details = {stage: dict(job.stage_progress[stage])
+                           for stage in running if stage in job.stage_progress}
+        
+        if not running and not completed:
             return {
                 'stage': None,
+                'stages': [],
                 'stage_name': '未开始',
                 'index': 0,
-                'total': len(self.stages),
+                'total': total,
                 'progress': 0,
-                'stage_progress': 0
+                'stage_progress': 0,
+                'eta': None,
+                'throughput': 0,
+                'stage_details': {}
             }
         
-        current_index = self.stages.index(self._current_stage) if self._current_stage in self.stages else -1
+        # 多个阶段并行时以预计剩余时间最长的阶段作为当前阶段进度
+        current = None
+        if details:
+            current = max(details.values(),
+                          key=lambda d: float('inf') if d['eta'] is None else d['eta'])
+        partial = sum(d['percent'] / 100 for d in details.values())
         
         result = {
-            'stage': self._current_stage,
-            'stage_name': stage_names.get(self._current_stage, self._current_stage),
-            'index': current_index + 1,
-            'total': len(self.stages),
-            'progress': int((current_index + 1) / len(self.stages) * 100) if current_index >= 0 else 0,
-            'stage_progress': 0  # 可以根据需要添加阶段内进度
+            'stage': running[0] if running else None,
+            'stages': running,
+            'stage_name': '、'.join(stage_names.get(stage, stage) for stage in running) if running else '已完成',
+            'index': min(completed + len(running), total),
+            'total': total,
+            'progress': int((completed + partial) / total * 100) if total else 0,
+            'stage_progress': current['percent'] if current else 0,
+            'eta': current['eta'] if current else None,
+            'throughput': current['throughput'] if current else 0,
+            'stage_details': details
         }
         
         # 发送进度更新信号
         # self.progress_updated.emit(result)
-        print(f"[Pipeline] 处理进度更新: {result}")
-        self.data_manager.processing_progress = result
+        self.logger.debug(f"处理进度更新: {job.paper_id} {result}")
+        if self.data_manager is not None:
+            self.data_manager.on_progress_updated(job.paper_id, result)
         # 触发更新信号，为什么更新之后前端没更新？
         # self.data_manager.scan_for_unprocessed_files()
         
         return result
+
+    def expand_stages(self, stages: List[str]) -> List[str]:
+        """
+        补全目标阶段的所有前序阶段，按管线顺序返回
+
+        前序阶段的缓存有效时会直接跳过，因此只指定目标阶段也不会重复处理。
+        
+        Args:
+            stages: 目标阶段列表
+        """
+        unknown = [stage for stage in stages if stage not in self.available_stages]
+        if unknown:
+            raise ValueError(f"未知的处理阶段: {unknown}")
+        selected, todo = set(), list(stages)
+        while todo:
+            stage = todo.pop()
+            if stage not in selected:
+                selected.add(stage)
+                todo.extend(self.stage_dependencies.get(stage, []))
+        return [stage for stage in self.available_stages if stage in selected]
+
+    def _resolve_stage_dependencies(self, stages: List[str]) -> Dict[str, List[str]]:
+        """
+        计算本次运行中每个阶段需要等待的前序阶段
+        
+        只有同样被选中运行的前序阶段才需要等待，未选中的依赖视为已满足
+        
+        Args:
+            stages: 本次需要运行的阶段列表
+            
+        Returns:
+            Dict[str, List[str]]: 阶段到其需等待阶段列表的映射
+        """
+        selected = set(stages)
+        return {
+            stage: [dep for dep in self.stage_dependencies.get(stage, []) if dep in selected]
+            for stage in stages
+        }
+
+    def _stage_output_files(self, expected_output: Union[Path, Dict[str, Path]]) -> List[Path]:
+        """将阶段的输出路径（单个路径或路径字典）展开为路径列表"""
+        if isinstance(expected_output, dict):
+            return list(expected_output.values())
+        return [expected_output]
+
+    def _get_stage_processor(self, stage: str):
+        """获取阶段对应的处理器实例"""
+        return {
+            'pdf2md': self.pdf_processor,
+            'images': self.image_processor,
+            'md2json': self.md_processor,
+            'json_process': self.json_processor,
+            'tiling': self.tiling_processor,
+            'translate': self.translate_processor,
+            'md_restore': self.restore_processor,
+            'extra_info': self.extra_info_processor,
+            'rag': self.rag_processor
+        }.get(stage)
+
+    def _stage_cache_params(self, stage: str) -> Dict[str, any]:
+        """
+        收集参与阶段缓存键计算的处理参数：处理器类型、版本以及处理器声明的参数
+
+        处理器的类属性 VERSION 是其处理逻辑的版本号（未声明时为0）。修改处理逻辑或输出格式时
+        将其递增，已缓存的该阶段产物即全部失效；只影响某个参数取值的改动应放在 cache_params() 中。
+        """
+        processor = self._get_stage_processor(stage)
+        params = {
+            'processor': type(processor).__name__,
+            'version': getattr(processor, 'VERSION', 0)
+        }
+        if hasattr(processor, 'cache_params'):
+            params.update(processor.cache_params())
+        return params
+
+    def _stage_cache_inputs(self, stage: str, job: PaperJob, output_paths: dict,
+                            artifact_hashes: Dict[str, str]) -> Dict[str, str]:
+        """
+        计算阶段输入产物的内容哈希
+
+        pdf2md 的输入为PDF文件本身，其余阶段的输入为依赖阶段的输出产物。
+        本次运行中产出的检查点直接使用写入时计算的哈希（需等待写入完成），
+        其余产物哈希只计算一次，缓存在 artifact_hashes 中。
+        """
+        if stage == 'pdf2md':
+            if 'pdf' not in artifact_hashes:
+                artifact_hashes['pdf'] = hash_path(job.pdf_path)
+            return {'pdf': artifact_hashes['pdf']}
+
+        inputs = {}
+        for dep in self.stage_dependencies.get(stage, []):
+            if dep not in output_paths:
+                continue
+            if dep not in artifact_hashes:
+                with job.lock:
+                    checkpoint = job.checkpoints.get(dep)
+                if checkpoint is not None:
+                    artifact_hashes[dep] = checkpoint.result()
+                else:
+                    digest = [
+                        hash_path(path) if Path(path).exists() else ''
+                        for path in self._stage_output_files(output_paths[dep])
+                    ]
+                    artifact_hashes[dep] = '+'.join(digest)
+            inputs[dep] = artifact_hashes[dep]
+        return inputs
+
+    def _record_stage_manifest(self, cache: StageCache, stage: str, job: PaperJob,
+                               output_paths: dict, cache_entry: Optional[tuple]) -> None:
+        """
+        阶段完成后写入缓存清单（在检查点写线程中执行，排在该阶段及其上游检查点之后）
+
+        cache_entry 为空表示阶段因输入在本次运行中发生变化而未做缓存检查，
+        此时依赖的检查点已经写完，在这里补算缓存键。
+        """
+        if cache_entry is None:
+            inputs = self._stage_cache_inputs(stage, job, output_paths, {})
+            params = self._stage_cache_params(stage)
+            key = cache.compute_key(stage, inputs, params)
+        else:
+            key, inputs, params = cache_entry
+
+        expected_output = self._get_stage_output_path(stage, job.output_dir, job.paper_id)
+        output_files = self._stage_output_files(expected_output)
+        with job.lock:
+            checkpoint = job.checkpoints.get(stage)
+        output_hashes = None
+        if checkpoint is not None:
+            output_hashes = {Path(expected_output).name: checkpoint.result()}
+        cache.record(stage, key, inputs, params, output_files, output_hashes=output_hashes)
+
+    def _stage_document(self, job: PaperJob, stage: str, output_paths: dict, mutable: bool = True) -> Any:
+        """
+        获取前序阶段产出的文档
+
+        本次运行中产出的文档直接从内存获取；会修改文档的阶段拿到独立副本，
+        因为原文档可能仍在后台写检查点，也可能被其他阶段同时读取。
+        前序阶段命中缓存时从其检查点文件读取。
+
+        Args:
+            job: 论文处理上下文
+            stage: 产出文档的前序阶段
+            output_paths: 各阶段输出路径
+            mutable: 调用方是否会修改文档
+        """
+        with job.lock:
+            data = job.documents.get(stage)
+        if data is not None:
+            return copy_document(data) if mutable else data
+        return load_document(output_paths[stage])
+
+    def _save_checkpoint(self, job: PaperJob, stage: str, data: Any) -> Path:
+        """
+        登记阶段产出的文档并提交后台检查点写入
+
+        提交后文档视为只读，后续阶段通过 _stage_document 获取。
+
+        Returns:
+            Path: 检查点文件路径（写入可能尚未完成）
+        """
+        output_path = self._get_stage_output_path(stage, job.output_dir, job.paper_id)
+        future = self.checkpoint_writer.write_json(output_path, data, metrics=current_metrics())
+        with job.lock:
+            job.documents[stage] = data
+            job.checkpoints[stage] = future
+            job.pending_writes.append(future)
+        return output_path
+
+    def _run_stage(self, stage: str, job: PaperJob, output_paths: dict):
+        """在调度器的工作线程中运行单个阶段，记录运行指标，并维护运行中阶段列表"""
+        # 排队期间论文已被取消时不再开始
+        job.cancel_token.raise_if_cancelled()
+        metrics = StageMetrics(stage)
+        # 处理器通过 current_progress() 报告阶段内进度，节流后更新到 stage_progress
+        tracker = ProgressTracker(callback=lambda snapshot: self._on_stage_progress(job, stage, snapshot))
+        with job.lock:
+            job.running_stages.append(stage)
+            job.metrics[stage] = metrics
+        self.get_current_stage(job)
+        try:
+            print(f"开始运行阶段: {stage}")
+            print(f"\n参数: pdf {job.pdf_path}\n paper_output_dir {job.output_dir}\n paper_id {job.paper_id}\n output_paths {output_paths}")
+            with metrics.measure(), track_progress(tracker), use_token(job.cancel_token):
+                stage_output = self.available_stages[stage](job, output_paths)
+            with job.lock:
+                has_checkpoint = stage in job.checkpoints
+            if not has_checkpoint:
+                # JSON检查点的写入字节数由写线程记录，其余阶段直接统计产物大小
+                metrics.add(bytes_written=sum(
+                    self._path_size(path) for path in self._stage_output_files(stage_output)
+                ))
+            print(f"阶段{stage},输出: {stage_output}")
+            return stage_output
+        finally:
+            with job.lock:
+                job.running_stages.remove(stage)
+                job.stage_progress.pop(stage, None)
+
+    def _on_stage_progress(self, job: PaperJob, stage: str, snapshot: Dict[str, Any]) -> None:
+        """阶段内进度回调（在阶段的工作线程中执行）"""
+        with job.lock:
+            job.stage_progress[stage] = snapshot
+        self.get_current_stage(job)
     
-    def process(self, pdf_path: str, output_dir: Optional[str] = None) -> Dict[str, Union[Path, Dict[str, Path]]]:
+    def process(self, pdf_path: str, output_dir: Optional[str] = None,
+                cancel_token: Optional[CancellationToken] = None,
+                update_index: bool = True) -> Dict[str, Union[Path, Dict[str, Path]]]:
         """
-        处理论文的主函数
+        处理论文的主函数（可重入，多篇论文可在不同线程中同时调用）
+        
+        按照阶段依赖图调度：所有前序阶段完成后即可启动，
+        相互独立的阶段（如 md_restore 与 extra_info）会并行执行。
+        阶段按资源类型提交到共享调度器的对应线程池。
         
         Args:
             pdf_path: PDF文件路径
             output_dir: 输出目录，默认为PDF所在目录
+            cancel_token: 取消令牌。取消后各阶段在当前LLM调用或嵌入批次结束时停止，
+                          已完成的结果保留在断点日志和检查点中
+            update_index: 是否立即更新全局索引。批量处理时可设为False，
+                          由调用方收集返回的 index_entry 后一次性写入
 
         Returns:
-            Dict[str, Path]: 各阶段输出文件的路径字典
+            Dict[str, Path]: 各阶段输出文件的路径字典，另含 'final'（最终文件）、
+                             'index_entry'（全局索引条目）和 'metrics'（运行指标摘要）
+
+        Raises:
+            ProcessingCancelled: 处理被取消
         """
         print("[Pipeline] 开始处理论文...", pdf_path, output_dir)
         # 规范化路径
@@ -226,67 +561,127 @@ class Pipeline(QObject):
         base_output_dir = Path(output_dir) if output_dir else pdf_path.parent
         base_output_dir.mkdir(exist_ok=True, parents=True)
         
-        # 初始化论文信息
-        self.paper_info['paper_id'] = pdf_path.stem
-        
-        # 创建输出目录
-        paper_output_dir = base_output_dir / self.paper_info['paper_id']
-        paper_output_dir.mkdir(exist_ok=True)
-        self.paper_info['output_dir'] = paper_output_dir
+        # 创建论文处理上下文和输出目录
+        paper_id = pdf_path.stem
+        job = PaperJob(
+            paper_id=paper_id,
+            pdf_path=pdf_path,
+            base_output_dir=base_output_dir,
+            output_dir=base_output_dir / paper_id
+        )
+        if cancel_token is not None:
+            job.cancel_token = cancel_token
+        job.output_dir.mkdir(exist_ok=True)
+        with self._jobs_lock:
+            if paper_id in self.jobs:
+                raise RuntimeError(f"论文正在处理中: {paper_id}")
+            self.jobs[paper_id] = job
         
+        running = {}  # future -> stage
         try:
             # 存储各阶段的输出路径
-            output_paths = {}
-            
-            # 运行选定的处理阶段
+            output_paths = job.output_paths
+
+            stages = []
             for stage in self.stages:
                 if stage not in self.available_stages:
                     error(f"未知的处理阶段: {stage}")
                     continue
+                stages.append(stage)
+            dependencies = self._resolve_stage_dependencies(stages)
 
-                # 设置当前阶段
-                self._current_stage = stage
-                # self.progress_updated.emit(self.get_current_stage())
-                self.get_current_stage()
-                print(f"开始运行阶段: {stage}")
-   
-                # 获取该阶段的预期输出路径
-                expected_output = self._get_stage_output_path(stage, paper_output_dir, self.paper_info['paper_id'])
-                
-                # 检查输出文件是否已存在
-                if stage in ['md_restore', 'rag']:
-                    # 对于有多个输出文件的阶段，检查所有文件是否都已存在
-                    files_exist = True
-                    for _, path in expected_output.items():
-                        if not path.exists():
-                            files_exist = False
-                            break
-                            
-                    if files_exist:
-                        print(f"阶段 {stage} 的输出文件已存在，跳过处理: {expected_output}")
-                        output_paths[stage] = expected_output
-                        continue
-                else:
-                    if isinstance(expected_output, Path) and expected_output.exists():
-                        print(f"阶段 {stage} 的输出文件已存在，跳过处理: {expected_output}")
-                        output_paths[stage] = expected_output
-                        continue
-                
-                # 执行处理阶段
-                print(f"开始运行阶段: {stage}")
-                print(f"\n参数: pdf {pdf_path}\n paper_output_dir {paper_output_dir}\n paper_info {self.paper_info['paper_id']}\n output_paths {output_paths}")
-                stage_output = self.available_stages[stage](
-                    pdf_path, paper_output_dir, self.paper_info['paper_id'], output_paths
-                )
-                print(f"阶段{stage},输出: {stage_output}")
-                output_paths[stage] = stage_output
-                print(f"阶段 {stage} 完成")
-
-                self.get_current_stage()
-
-            # 处理完成后
-            self._current_stage = None
+            pending = list(stages)
+            cache = StageCache(job.output_dir)
+            artifact_hashes = {}  # 本次运行中已计算的产物哈希
+            cache_entries = {}    # stage -> (缓存键, 输入哈希, 参数)，未做缓存检查的阶段为None
+
+            while pending or running:
+                job.cancel_token.raise_if_cancelled()
+                # 启动所有依赖已满足的阶段；跳过的阶段可能解锁后续阶段，因此循环直到没有变化
+                scheduled = True
+                while scheduled:
+                    scheduled = False
+                    for stage in list(pending):
+                        if not all(dep in output_paths for dep in dependencies[stage]):
+                            continue
+                        pending.remove(stage)
+                        scheduled = True
+
+                        # 获取该阶段的预期输出路径
+                        expected_output = self._get_stage_output_path(stage, job.output_dir, paper_id)
+                        output_files = self._stage_output_files(expected_output)
+
+                        # 输入在本次运行中刚产出的廉价阶段直接重跑，不等待上游检查点写完再算缓存键；
+                        # LLM阶段代价高，仍等待输入哈希做缓存检查，输入内容未变时可以跳过
+                        with job.lock:
+                            input_changed = any(dep in job.checkpoints for dep in dependencies[stage])
+                        if input_changed and self.stage_resources.get(stage) != RESOURCE_LLM:
+                            cache_entries[stage] = None
+                            future = self.scheduler.submit(
+                                self.stage_resources.get(stage, RESOURCE_CPU),
+                                self._run_stage, stage, job, dict(output_paths)
+                            )
+                            running[future] = stage
+                            continue
+
+                        # 根据输入产物哈希和处理参数计算缓存键
+                        inputs = self._stage_cache_inputs(stage, job, output_paths, artifact_hashes)
+                        params = self._stage_cache_params(stage)
+                        key = cache.compute_key(stage, inputs, params)
+                        cache_entries[stage] = (key, inputs, params)
+
+                        skip = cache.is_fresh(stage, key, output_files)
+                        if not skip and cache.load(stage) is None and all(p.exists() for p in output_files):
+                            # 旧版本生成的产物没有清单，直接沿用并补写清单，避免重复调用LLM
+                            print(f"阶段 {stage} 的输出文件已存在但没有缓存清单，沿用现有产物: {expected_output}")
+                            cache.record(stage, key, inputs, params, output_files, adopted=True)
+                            skip = True
+
+                        if skip:
+                            print(f"阶段 {stage} 的缓存有效，跳过处理: {expected_output}")
+                            output_paths[stage] = expected_output
+                            with job.lock:
+                                job.completed_stages.append(stage)
+                                job.metrics[stage] = StageMetrics(stage, cached=True)
+                            continue
+
+                        # 按资源类型提交到调度器（传入输出路径的快照，避免与本线程的更新交错）
+                        future = self.scheduler.submit(
+                            self.stage_resources.get(stage, RESOURCE_CPU),
+                            self._run_stage, stage, job, dict(output_paths)
+                        )
+                        running[future] = stage
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"阶段依赖无法满足: {pending}")
+                    break
+
+                # 等待任意一个运行中的阶段完成
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    output_paths[stage] = future.result()
+
+                    # 阶段成功完成后由写线程在其检查点之后写入缓存清单
+                    manifest_write = self.checkpoint_writer.submit(
+                        self._record_stage_manifest, cache, stage, job,
+                        dict(output_paths), cache_entries[stage]
+                    )
+                    with job.lock:
+                        job.pending_writes.append(manifest_write)
+
+                    with job.lock:
+                        job.completed_stages.append(stage)
+                    print(f"阶段 {stage} 完成")
+                    self.get_current_stage(job)
             
+            # 等待本论文的检查点和缓存清单全部写完，写入失败时报错
+            with job.lock:
+                pending_writes = list(job.pending_writes)
+            for write in pending_writes:
+                write.result()
+
             # 如果RAG或MD_RESTORE阶段已完成，更新全局索引
             final_paths = {}
             
@@ -309,46 +704,130 @@ class Pipeline(QObject):
                 })
                 
             # 检查图像文件夹
-            images_dir = paper_output_dir / "images"
+            images_dir = job.output_dir / "images"
             if images_dir.exists() and images_dir.is_dir():
                 final_paths['images'] = images_dir
+            if 'images' in output_paths:
+                final_paths['images_manifest'] = output_paths['images']
                 
+            # 保存运行指标，摘要写入全局索引
+            metrics_summary = self._write_metrics(job, 'completed')
+
+            output_paths['metrics'] = metrics_summary
+
             # 如果有最终文件，更新索引
             if final_paths:
-                self._update_global_index(base_output_dir, final_paths)
+                index_entry = self.build_index_entry(paper_id, final_paths, metrics_summary)
+                if update_index:
+                    self.update_global_index(base_output_dir, [index_entry])
                 output_paths['final'] = final_paths
-            print(f"处理完成: {self.paper_info['paper_id']}")
+                output_paths['index_entry'] = index_entry
+            print(f"处理完成: {paper_id}")
             
             return output_paths
+
+        except ProcessingCancelled:
+            print(f"[Pipeline] 处理已取消: {paper_id}")
+            job.cancel_token.cancel()
+            # 运行中的阶段在当前调用结束后退出；等待它们和已提交的检查点写完，
+            # 使断点日志、检查点和缓存清单保持完整，下次运行时从这里继续
+            wait(running)
+            running.clear()
+            with job.lock:
+                pending_writes = list(job.pending_writes)
+            wait(pending_writes)
+            try:
+                self._write_metrics(job, 'cancelled')
+            except Exception as metrics_error:
+                error(f"保存运行指标失败: {str(metrics_error)}")
+            raise
             
         except Exception as e:
             error(f"处理过程出错: {str(e)}", exc_info=True)
+            # 并行运行的其他阶段不再继续调用LLM：取消尚未开始的阶段，通知运行中的阶段退出并等待，
+            # 避免它们与重新处理同一论文的任务同时写入输出目录和断点日志
+            job.cancel_token.cancel(f"阶段出错: {str(e)}")
+            for future in running:
+                future.cancel()
+            wait(running)
+            running.clear()
+            try:
+                self._write_metrics(job, 'error')
+            except Exception as metrics_error:
+                error(f"保存运行指标失败: {str(metrics_error)}")
             raise
 
         finally:
-            self.data_manager.on_processing_finished(self.paper_info['paper_id'])
+            # 其他异常（如 KeyboardInterrupt）时取消尚未开始的阶段
+            for future in running:
+                future.cancel()
+            with self._jobs_lock:
+                self.jobs.pop(paper_id, None)
+
+
+    @staticmethod
+    def _path_size(path: Union[str, Path]) -> int:
+        """文件或目录（递归）的总字节数"""
+        path = Path(path)
+        if path.is_file():
+            return path.stat().st_size
+        if path.is_dir():
+            return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+        return 0
+
+    def _write_metrics(self, job: PaperJob, status: str) -> Dict[str, any]:
+        """
+        将论文各阶段的运行指标写入论文目录下的 metrics.json
 
+        Returns:
+            Dict: 用于写入全局索引的指标摘要
+        """
+        with job.lock:
+            stage_metrics = [job.metrics[stage] for stage in self.stages if stage in job.metrics]
+        totals = summarize(stage_metrics)
+        metrics_path = job.output_dir / "metrics.json"
 
-    def _update_global_index(self, base_output_dir: Path, final_paths: Dict) -> None:
+        if totals['stages_run'] == 0 and metrics_path.exists():
+            # 所有阶段都命中缓存时保留上次实际处理的指标，避免被空记录覆盖
+            try:
+                with open(metrics_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+                previous.pop('stages', None)
+                previous.pop('paper_id', None)
+                return previous
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        summary = {
+            'status': status,
+            'processed_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            # 论文整体墙钟耗时；阶段并行运行时小于各阶段耗时之和（stage_time）
+            'wall_time': round(time.perf_counter() - job.started_at, 3),
+            'stage_time': totals.pop('wall_time'),
+            **totals
+        }
+        report = {
+            'paper_id': job.paper_id,
+            **summary,
+            'stages': {metrics.stage: metrics.to_dict() for metrics in stage_metrics}
+        }
+        tmp_path = metrics_path.with_name(metrics_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(metrics_path)
+        print(f"[Pipeline] 运行指标已保存: {metrics_path}")
+        return summary
+
+    def build_index_entry(self, paper_id: str, final_paths: Dict,
+                          metrics: Optional[Dict[str, any]] = None) -> Dict[str, any]:
         """
-        更新全局论文索引
+        生成论文的全局索引条目
         
         Args:
-            base_output_dir: 基础输出目录
+            paper_id: 论文ID
             final_paths: 最终文件路径字典
+            metrics: 最近一次处理的运行指标摘要
         """
-        index_path = base_output_dir / "papers_index.json"
-        
-        # 读取现有索引（如果存在）
-        papers_index = []
-        if index_path.exists():
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    papers_index = json.load(f)
-            except json.JSONDecodeError:
-                error(f"索引文件损坏，将创建新索引: {index_path}")
-                papers_index = []
-        
         # 从 rag_tree.json 提取 title 和 translated_title
         title = ""
         translated_title = ""
@@ -363,40 +842,67 @@ class Pipeline(QObject):
                 error(f"从RAG树中提取标题时出错: {str(e)}")
         
         paper_entry = {
-            'id': self.paper_info['paper_id'],
+            'id': paper_id,
             'title': title,
             'translated_title': translated_title
         }
-        print("[Pipeline] 开始更新全局索引...", index_path, paper_entry)
-        
-        # 查找现有条目
-        existing_index = -1
-        for i, entry in enumerate(papers_index):
-            if entry.get('id') == paper_entry['id']:
-                existing_index = i
-                break
-        
-        # 更新或添加条目
-        if existing_index >= 0:
-            papers_index[existing_index] = paper_entry
-        else:
-            papers_index.append(paper_entry)
+        if metrics:
+            paper_entry['metrics'] = metrics
+        return paper_entry
+
+    def update_global_index(self, base_output_dir: Path, entries: List[Dict[str, any]]) -> None:
+        """
+        将论文条目写入全局索引（已有同ID条目时替换）
+        
+        批量处理时所有论文的条目一次性写入，只读写一次索引文件。
+        
+        Args:
+            base_output_dir: 基础输出目录
+            entries: build_index_entry 生成的条目列表
+        """
+        if not entries:
+            return
+        index_path = Path(base_output_dir) / "papers_index.json"
+        print("[Pipeline] 开始更新全局索引...", index_path, [entry['id'] for entry in entries])
         
-        # 保存更新后的索引
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(papers_index, f, ensure_ascii=False, indent=2)
+        with _INDEX_LOCK:
+            # 读取现有索引（如果存在）
+            papers_index = []
+            if index_path.exists():
+                try:
+                    with open(index_path, 'r', encoding='utf-8') as f:
+                        papers_index = json.load(f)
+                except json.JSONDecodeError:
+                    error(f"索引文件损坏，将创建新索引: {index_path}")
+                    papers_index = []
+            
+            # 更新或添加条目
+            positions = {entry.get('id'): i for i, entry in enumerate(papers_index)}
+            for paper_entry in entries:
+                existing_index = positions.get(paper_entry['id'], -1)
+                if existing_index >= 0:
+                    papers_index[existing_index] = paper_entry
+                else:
+                    positions[paper_entry['id']] = len(papers_index)
+                    papers_index.append(paper_entry)
+            
+            # 保存更新后的索引（先写临时文件再替换，避免中断时损坏索引）
+            tmp_path = index_path.with_name(index_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(papers_index, f, ensure_ascii=False, indent=2)
+            tmp_path.replace(index_path)
         
-        print(f"全局索引更新完成: {index_path}")
+        print(f"全局索引更新完成: {index_path}（{len(entries)} 篇）")
         
 
-    def _stage_pdf_to_md(self, pdf_path: Path, paper_dir: Path, 
-                        paper_name: str, output_paths: dict) -> Path:
+    def _stage_pdf_to_md(self, job: PaperJob, output_paths: dict) -> Path:
         """PDF转Markdown阶段"""
-        print(f"开始将PDF转换为Markdown: {pdf_path}")
+        print(f"开始将PDF转换为Markdown: {job.pdf_path}")
         try:
+            record_bytes_read(self._path_size(job.pdf_path))
             markdown_path = self.pdf_processor.process(
-                str(pdf_path),
-                str(paper_dir)
+                str(job.pdf_path),
+                str(job.output_dir)
             )
             print(f"PDF成功转换为Markdown: {markdown_path}")
             return markdown_path
@@ -404,8 +910,18 @@ class Pipeline(QObject):
             error(f"PDF转Markdown失败: {str(e)}")
             raise
 
-    def _stage_md_to_json(self, pdf_path: Path, paper_dir: Path, 
-                         paper_name: str, output_paths: dict) -> Path:
+    def _stage_images(self, job: PaperJob, output_paths: dict) -> Path:
+        """图片后处理阶段：图片去重，生成阅读界面使用的渲染版本和缩略图"""
+        print(f"开始处理图片: {job.output_dir / 'images'}")
+        try:
+            output_path = self._get_stage_output_path('images', job.output_dir, job.paper_id)
+            manifest_path = self.image_processor.process(str(job.output_dir), str(output_path))
+            return Path(manifest_path)
+        except Exception as e:
+            error(f"图片处理失败: {str(e)}")
+            raise
+
+    def _stage_md_to_json(self, job: PaperJob, output_paths: dict) -> Path:
         """Markdown转结构化JSON阶段"""
         print("开始将Markdown转换为JSON")
         try:
@@ -413,56 +929,43 @@ class Pipeline(QObject):
             if not markdown_path:
                 raise ValueError("未找到前序阶段生成的Markdown文件")
 
-            output_path = self._get_stage_output_path('md2json', paper_dir, paper_name)
-            json_path = self.md_processor.process(
-                str(markdown_path),
-                str(output_path)
-            )
+            record_bytes_read(self._path_size(markdown_path))
+            data = self.md_processor.parse_file(markdown_path)
+            json_path = self._save_checkpoint(job, 'md2json', data)
             print(f"Markdown成功转换为JSON: {json_path}")
             return json_path
         except Exception as e:
             error(f"Markdown转JSON失败: {str(e)}")
             raise
 
-    def _stage_json_process(self, pdf_path: Path, paper_dir: Path, 
-                          paper_name: str, output_paths: dict) -> Path:
+    def _stage_json_process(self, job: PaperJob, output_paths: dict) -> Path:
         """JSON处理阶段"""
         print("开始处理JSON文件")
         try:
-            input_json_path = output_paths.get('md2json')
-            if not input_json_path:
+            if not output_paths.get('md2json'):
                 raise ValueError("未找到前序阶段生成的JSON文件")
             
-            output_path = self._get_stage_output_path('json_process', paper_dir, paper_name)
-            processed_json_path = self.json_processor.process(
-                str(input_json_path),
-                str(output_path)
-            )
+            data = self._stage_document(job, 'md2json', output_paths)
+            data = self.json_processor.process_data(data)
+            processed_json_path = self._save_checkpoint(job, 'json_process', data)
             print(f"JSON文件处理完成: {processed_json_path}")
             return processed_json_path
         except Exception as e:
             error(f"JSON处理失败: {str(e)}")
             raise
             
-    def _stage_tiling(self, pdf_path: Path, paper_dir: Path, 
-                    paper_name: str, output_paths: dict) -> Path:
+    def _stage_tiling(self, job: PaperJob, output_paths: dict) -> Path:
         """平铺阶段：将处理后的JSON文件进行平铺处理"""
         print("开始平铺阶段")
         try:
-            # 获取前一阶段处理好的JSON文件路径
-            input_json_path = output_paths.get('json_process')
-                
-            if not input_json_path:
+            # 确认前一阶段已产出处理好的文档
+            if not output_paths.get('json_process'):
                 raise ValueError("未找到可用于平铺的JSON文件，请确保已运行前序JSON处理阶段")
             
-            # 构建输出文件路径
-            output_path = self._get_stage_output_path('tiling', paper_dir, paper_name)
-            
             # 调用平铺处理器进行平铺
-            tiled_json_path = self.tiling_processor.process(
-                str(input_json_path),
-                str(output_path)
-            )
+            data = self._stage_document(job, 'json_process', output_paths)
+            data = self.tiling_processor.process_data(data)
+            tiled_json_path = self._save_checkpoint(job, 'tiling', data)
             
             print(f"JSON文件平铺完成: {tiled_json_path}")
             return tiled_json_path
@@ -470,25 +973,37 @@ class Pipeline(QObject):
             error(f"平铺阶段失败: {str(e)}", exc_info=True)
             raise
 
-    def _stage_translate(self, pdf_path: Path, paper_dir: Path, 
-                        paper_name: str, output_paths: dict) -> Path:
+    def _run_journaled(self, job: PaperJob, stage: str, processor_cls, data: dict) -> dict:
+        """
+        使用断点日志运行LLM阶段的处理器
+
+        每次LLM调用的结果立即写入 <阶段>.journal.jsonl，阶段被暂停或中断后重新运行时
+        回放已完成的调用。阶段成功后压缩日志，只保留本次用到的条目。
+        """
+        journal = StageJournal(job.output_dir / f"{stage}{JOURNAL_SUFFIX}")
+        if len(journal):
+            print(f"[{stage}] 从断点日志恢复，已有 {len(journal)} 条LLM调用结果")
+        try:
+            data = processor_cls(journal=journal).process_data(data)
+        except BaseException:
+            journal.close()
+            raise
+        journal.compact()
+        return data
+
+    def _stage_translate(self, job: PaperJob, output_paths: dict) -> Path:
         """翻译阶段，使用TranslateProcessor进行JSON文件的翻译"""
         print("开始翻译阶段")
         try:
-            # 获取前一阶段处理好的JSON文件路径
-            input_json_path = output_paths.get('tiling')  
-                
-            if not input_json_path:
+            # 确认前一阶段已产出平铺好的文档
+            if not output_paths.get('tiling'):
                 raise ValueError("未找到可用于翻译的JSON文件，请确保已运行前序平铺阶段")
             
-            # 构建输出文件路径
-            output_path = self._get_stage_output_path('translate', paper_dir, paper_name)
-            
             # 调用翻译处理器进行翻译
-            translated_json_path = self.translate_processor.process(
-                str(input_json_path),
-                str(output_path)
-            )
+            # 翻译处理器保存了摘要翻译等逐篇状态，每篇论文使用独立实例以支持并发处理
+            data = self._stage_document(job, 'tiling', output_paths)
+            data = self._run_journaled(job, 'translate', TranslateProcessor, data)
+            translated_json_path = self._save_checkpoint(job, 'translate', data)
             
             print(f"JSON文件翻译完成: {translated_json_path}")
             return translated_json_path
@@ -496,25 +1011,23 @@ class Pipeline(QObject):
             error(f"翻译阶段失败: {str(e)}", exc_info=True)
             raise
 
-    def _stage_md_restore(self, pdf_path: Path, paper_dir: Path, 
-                  paper_name: str, output_paths: dict) -> dict:
+    def _stage_md_restore(self, job: PaperJob, output_paths: dict) -> dict:
         """还原阶段：将JSON文件还原为中英文Markdown文档"""
         print("开始还原阶段")
         try:
-            # 获取前一阶段处理好的翻译JSON文件路径
-            input_json_path = output_paths.get('translate')
-                
-            if not input_json_path:
+            # 确认前一阶段已产出翻译好的文档
+            if not output_paths.get('translate'):
                 raise ValueError("未找到可用于还原的翻译JSON文件，请确保已运行前序翻译阶段")
             
             # 获取该阶段的预期输出路径字典，直接生成最终路径
-            output_paths_dict = self._get_stage_output_path('md_restore', paper_dir, paper_name)
+            output_paths_dict = self._get_stage_output_path('md_restore', job.output_dir, job.paper_id)
             output_path_en = output_paths_dict['en']
             output_path_zh = output_paths_dict['zh']
             
-            # 调用还原处理器
-            en_path, zh_path = self.restore_processor.process(
-                str(input_json_path),
+            # 调用还原处理器（只读取文档，可与其他阶段共享同一份内存文档）
+            data = self._stage_document(job, 'translate', output_paths, mutable=False)
+            en_path, zh_path = self.restore_processor.process_data(
+                data,
                 str(output_path_en),
                 str(output_path_zh)
             )
@@ -530,25 +1043,18 @@ class Pipeline(QObject):
             error(f"还原阶段失败: {str(e)}", exc_info=True)
             raise
 
-    def _stage_extra_info(self, pdf_path: Path, paper_dir: Path, 
-                paper_name: str, output_paths: dict) -> Path:
+    def _stage_extra_info(self, job: PaperJob, output_paths: dict) -> Path:
         """额外信息提取处理阶段，主要生成各章节的总结"""
         print("开始额外信息提取阶段")
         try:
-            # 获取前一阶段处理好的JSON文件路径，这里使用翻译阶段的输出作为输入
-            input_json_path = output_paths.get('translate')
-                
-            if not input_json_path:
+            # 这里使用翻译阶段的输出作为输入
+            if not output_paths.get('translate'):
                 raise ValueError("未找到可用于提取额外信息的JSON文件，请确保已运行前序翻译阶段")
             
-            # 构建输出文件路径
-            output_path = self._get_stage_output_path('extra_info', paper_dir, paper_name)
-            
-            # 调用额外信息处理器
-            processed_json_path = self.extra_info_processor.process(
-                str(input_json_path),
-                str(output_path)
-            )
+            # 调用额外信息处理器（保存了摘要等逐篇状态，每篇论文使用独立实例）
+            data = self._stage_document(job, 'translate', output_paths)
+            data = self._run_journaled(job, 'extra_info', ExtraInfoProcessor, data)
+            processed_json_path = self._save_checkpoint(job, 'extra_info', data)
             
             print(f"额外信息提取完成: {processed_json_path}")
             return processed_json_path
@@ -556,8 +1062,7 @@ class Pipeline(QObject):
             error(f"额外信息提取阶段失败: {str(e)}", exc_info=True)
             raise
 
-    def _stage_rag(self, pdf_path: Path, paper_dir: Path, 
-                paper_name: str, output_paths: dict) -> dict:
+    def _stage_rag(self, job: PaperJob, output_paths: dict) -> dict:
         """RAG处理阶段：生成用于检索增强生成的数据结构
         
         该阶段将生成三个文件：
@@ -567,19 +1072,18 @@ class Pipeline(QObject):
         """
         print("开始RAG处理阶段")
         try:
-            # 获取前一阶段处理好的JSON文件路径
             # 使用extra_info阶段的输出作为输入，因为它包含了额外的摘要信息
-            input_json_path = output_paths.get('extra_info')
+            input_stage = 'extra_info'
             
-            if not input_json_path:
+            if not output_paths.get(input_stage):
                 # 如果没有extra_info阶段的输出，则使用translate阶段的输出
-                input_json_path = output_paths.get('translate')
+                input_stage = 'translate'
                 
-            if not input_json_path:
+            if not output_paths.get(input_stage):
                 raise ValueError("未找到可用于RAG处理的JSON文件，请确保已运行前序翻译或额外信息阶段")
             
             # 构建输出文件路径字典，直接生成最终路径
-            output_paths_dict = self._get_stage_output_path('rag', paper_dir, paper_name)
+            output_paths_dict = self._get_stage_output_path('rag', job.output_dir, job.paper_id)
             output_md_path = output_paths_dict['md']
             output_tree_json_path = output_paths_dict['tree_json']
             
@@ -587,8 +1091,9 @@ class Pipeline(QObject):
             vector_store_path = output_paths_dict['vector_store']
             
             # 调用RAG处理器
-            md_path, tree_json_path, vector_store_path = self.rag_processor.process(
-                str(input_json_path),
+            data = self._stage_document(job, input_stage, output_paths)
+            md_path, tree_json_path, vector_store_path = self.rag_processor.process_data(
+                data,
                 str(output_md_path),
                 str(output_tree_json_path),
                 str(vector_store_path)
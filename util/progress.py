@@ -0,0 +1,123 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# 进度回调的最小间隔（秒），避免逐条LLM调用都刷新界面
+DEFAULT_MIN_INTERVAL = 1.0
+
+# 吞吐量指数移动平均的平滑系数，越大越偏向最近的速度
+DEFAULT_SMOOTHING = 0.3
+
+
+class ProgressTracker:
+    """
+    阶段内进度跟踪器
+
+    处理器在开始时统计总工作量（如需要翻译的段落数、需要嵌入的句子数），
+    每完成一个单元调用 advance。吞吐量按单元间隔的指数移动平均估计，
+    剩余时间由剩余单元数除以平均速度得到。回调按 min_interval 节流，
+    开始和完成时总会触发。
+    """
+
+    def __init__(self, callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 min_interval: float = DEFAULT_MIN_INTERVAL, smoothing: float = DEFAULT_SMOOTHING):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self.total = 0
+        self.done = 0
+        self.unit = ''
+        self._rate: Optional[float] = None   # 单元/秒的移动平均
+        self._last_time = 0.0
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, total: int, unit: str = '') -> None:
+        """开始计数，total 为预先统计的总工作单元数"""
+        with self._lock:
+            self.total = max(0, int(total))
+            self.done = 0
+            self.unit = unit
+            self._rate = None
+            self._last_time = time.perf_counter()
+        self._emit(force=True)
+
+    def advance(self, units: int = 1) -> None:
+        """完成若干工作单元"""
+        with self._lock:
+            now = time.perf_counter()
+            elapsed = now - self._last_time
+            self._last_time = now
+            self.done += units
+            if self.total and self.done > self.total:
+                # 预先统计可能与实际处理略有出入，不让进度超过100%
+                self.total = self.done
+            if elapsed > 0:
+                rate = units / elapsed
+                self._rate = rate if self._rate is None else \
+                    self.smoothing * rate + (1 - self.smoothing) * self._rate
+        self._emit(force=self.done >= self.total)
+
+    def finish(self) -> None:
+        """标记全部完成（实际工作量少于预先统计时补齐）"""
+        with self._lock:
+            self.done = self.total = max(self.done, self.total)
+        self._emit(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前进度
+
+        Returns:
+            Dict: {'done', 'total', 'unit', 'percent', 'throughput'(单元/分钟), 'eta'(秒，未知时为None)}
+        """
+        with self._lock:
+            percent = int(self.done / self.total * 100) if self.total else 0
+            throughput = self._rate * 60 if self._rate else 0.0
+            remaining = self.total - self.done
+            eta = remaining / self._rate if self._rate else None
+            if remaining <= 0:
+                eta = 0.0
+            return {
+                'done': self.done,
+                'total': self.total,
+                'unit': self.unit,
+                'percent': percent,
+                'throughput': round(throughput, 1),
+                'eta': round(eta, 1) if eta is not None else None
+            }
+
+    def _emit(self, force: bool = False) -> None:
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if not force and now - self._last_emit < self.min_interval:
+                return
+            self._last_emit = now
+        self.callback(self.snapshot())
+
+
+# 当前上下文中正在运行的阶段的进度跟踪器
+_current_progress: ContextVar[Optional[ProgressTracker]] = ContextVar('stage_progress', default=None)
+
+
+def current_progress() -> ProgressTracker:
+    """获取当前阶段的进度跟踪器；不在管线阶段中运行时返回一个不回调的跟踪器"""
+    tracker = _current_progress.get()
+    if tracker is None:
+        tracker = ProgressTracker()
+        _current_progress.set(tracker)
+    return tracker
+
+
+@contextmanager
+def track_progress(tracker: ProgressTracker) -> Iterator[ProgressTracker]:
+    """在当前上下文中使用指定的进度跟踪器"""
+    token = _current_progress.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_progress.reset(token)
@@ -1,10 +1,12 @@
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
-from langchain_community.vectorstores.faiss import FAISS
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 from util.config import EmbeddingModel
 from PyQt6.QtCore import QObject, pyqtSignal, QThread
 
+if TYPE_CHECKING:
+    from langchain_community.vectorstores.faiss import FAISS
+
 def get_paths(id):
     return {
         "article_en": f"{id}/final_en.md",
@@ -133,7 +135,7 @@ class RagRetriever(QObject):
             print(f"[ERROR] 添加新论文 {paper_id} 失败: {str(e)}")
             return False
 
-    def load_vector_store(self, vector_store_path: str) -> Optional[FAISS]:
+    def load_vector_store(self, vector_store_path: str) -> Optional['FAISS']:
         """
         加载向量库
         
@@ -155,7 +157,8 @@ class RagRetriever(QObject):
             return None
             
         try:
-            # 加载向量库
+            # 加载向量库（FAISS和嵌入模型在首次加载向量库时才导入）
+            from langchain_community.vectorstores.faiss import FAISS
             vector_store = FAISS.load_local(
                 vector_store_path,
                 EmbeddingModel.get_instance(),
@@ -0,0 +1,48 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from util.config import PDF_WORKERS, CPU_WORKERS, LLM_WORKERS
+
+# 资源类型
+RESOURCE_PDF = 'pdf'   # PDF解析/OCR，占用GPU或大量CPU
+RESOURCE_CPU = 'cpu'   # 本地计算与嵌入向量计算
+RESOURCE_LLM = 'llm'   # 调用远程LLM接口，以网络I/O为主
+
+
+class StageScheduler:
+    """
+    按资源类型划分线程池的阶段调度器
+
+    不同资源类型的阶段互不争抢工作线程：第N+1篇论文的PDF解析
+    可以与第N篇论文的LLM翻译同时进行。调度器可被多篇论文共享。
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None):
+        """
+        初始化调度器
+
+        Args:
+            workers: 各资源类型的工作线程数，未指定的类型使用配置文件中的默认值
+        """
+        self.workers = {
+            RESOURCE_PDF: PDF_WORKERS,
+            RESOURCE_CPU: CPU_WORKERS,
+            RESOURCE_LLM: LLM_WORKERS,
+        }
+        if workers:
+            self.workers.update(workers)
+        self._pools = {
+            resource: ThreadPoolExecutor(max_workers=max(1, count), thread_name_prefix=f"stage-{resource}")
+            for resource, count in self.workers.items()
+        }
+
+    def submit(self, resource: str, fn: Callable, *args, **kwargs) -> Future:
+        """将任务提交到对应资源类型的线程池"""
+        pool = self._pools.get(resource)
+        if pool is None:
+            raise ValueError(f"未知的资源类型: {resource}")
+        return pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭所有线程池"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# 清单文件后缀，清单与阶段产物放在同一论文输出目录下
+MANIFEST_SUFFIX = ".manifest.json"
+
+# 读取文件时的分块大小
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_bytes(data: bytes) -> str:
+    """计算字节串的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """计算文本内容的SHA-256"""
+    return hash_bytes(text.encode('utf-8'))
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """分块计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_path(path: Union[str, Path]) -> str:
+    """
+    计算文件或目录的内容哈希
+
+    目录按相对路径排序后依次纳入文件名和文件内容，保证结果与遍历顺序无关
+    """
+    path = Path(path)
+    if path.is_file():
+        return hash_file(path)
+    digest = hashlib.sha256()
+    for file_path in sorted(p for p in path.rglob('*') if p.is_file()):
+        digest.update(file_path.relative_to(path).as_posix().encode('utf-8'))
+        digest.update(hash_file(file_path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def hash_prompt_files(paths: Iterable[str]) -> Dict[str, str]:
+    """计算提示词文件内容的哈希，文件不存在时记为空字符串的哈希"""
+    result = {}
+    for path in paths:
+        try:
+            result[path] = hash_file(path)
+        except OSError:
+            result[path] = hash_text("")
+    return result
+
+
+class StageCache:
+    """
+    基于内容哈希的阶段缓存
+
+    每个阶段的产物旁边保存一份清单（<stage>.manifest.json），记录由
+    (输入产物哈希, 处理器版本, 提示词内容, 模型名称, 处理参数) 计算出的缓存键。
+    只有缓存键变化或产物缺失时阶段才需要重新运行。
+    """
+
+    def __init__(self, paper_dir: Union[str, Path]):
+        self.paper_dir = Path(paper_dir)
+
+    def manifest_path(self, stage: str) -> Path:
+        """获取阶段清单文件路径"""
+        return self.paper_dir / f"{stage}{MANIFEST_SUFFIX}"
+
+    @staticmethod
+    def compute_key(stage: str, inputs: Dict[str, str], params: Dict[str, Any]) -> str:
+        """根据阶段名称、输入产物哈希和处理参数计算缓存键"""
+        payload = json.dumps(
+            {'stage': stage, 'inputs': inputs, 'params': params},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hash_text(payload)
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+        """读取阶段清单，不存在或损坏时返回None"""
+        path = self.manifest_path(stage)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def is_fresh(self, stage: str, key: str, outputs: List[Path]) -> bool:
+        """判断阶段产物是否仍然有效：清单中的缓存键一致且所有产物都存在"""
+        manifest = self.load(stage)
+        if not manifest or manifest.get('key') != key:
+            return False
+        return all(Path(p).exists() for p in outputs)
+
+    def record(self, stage: str, key: str, inputs: Dict[str, str],
+               params: Dict[str, Any], outputs: List[Path], adopted: bool = False,
+               output_hashes: Optional[Dict[str, str]] = None) -> Path:
+        """
+        阶段完成后写入清单
+
+        Args:
+            stage: 阶段名称
+            key: 缓存键
+            inputs: 输入产物哈希
+            params: 参与缓存键计算的处理参数
+            outputs: 阶段产物路径列表
+            adopted: 是否为沿用旧版本已存在产物（没有清单）的情况
+            output_hashes: 已知的产物哈希（文件名 -> 哈希），写入时已计算过的不再重新读取文件
+        """
+        known = output_hashes or {}
+        manifest = {
+            'stage': stage,
+            'key': key,
+            'inputs': inputs,
+            'params': params,
+            'outputs': {
+                Path(p).name: known[Path(p).name] if Path(p).name in known else hash_path(p)
+                for p in outputs if Path(p).name in known or Path(p).exists()
+            },
+            'adopted': adopted,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        path = self.manifest_path(stage)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        tmp_path.replace(path)
+        return path
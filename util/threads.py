@@ -1,5 +1,6 @@
 from PyQt6.QtCore import QThread, pyqtSignal
 from pathlib import Path
+from util.cancellation import CancellationToken, ProcessingCancelled
 
 class ProcessingThread(QThread):
     """处理PDF文件的线程"""
@@ -11,24 +12,37 @@ class ProcessingThread(QThread):
         self.output_dir = output_dir
         self.is_running = True
         self.data_manager = data_manager
+        self.cancel_token = CancellationToken()
     
     def run(self):
+        paper_id = Path(self.pdf_path).stem
         try:
             output_paths = self.pipeline.process(
                 self.pdf_path, 
-                self.output_dir
+                self.output_dir,
+                cancel_token=self.cancel_token
             )
             
             if self.is_running:  # 检查是否被取消
-                self.data_manager.on_processing_finished(Path(self.pdf_path).stem)
+                self.data_manager.on_processing_finished(paper_id)
+        except ProcessingCancelled:
+            print(f"论文处理已停止: {paper_id}")
         except Exception as e:
             if self.is_running:  # 只有在线程没有被手动停止时才报告错误
-                self.data_manager.on_processing_error(Path(self.pdf_path).stem, str(e))
+                self.data_manager.on_processing_error(paper_id, str(e))
+        finally:
+            if not self.is_running:
+                self.data_manager.on_processing_stopped(paper_id)
     
-    def stop(self):
-        """立即停止线程处理"""
+    def stop(self, reason=""):
+        """
+        请求停止线程处理
+
+        不强制终止线程（强制终止可能中断文件写入并遗留与LLM服务的连接），
+        而是取消处理任务：当前LLM调用或嵌入批次结束后退出，已完成的结果保留用于续跑。
+        """
         self.is_running = False
-        self.terminate()  # 强制终止线程
+        self.cancel_token.cancel(reason)
 
 # 修改 AIResponseThread 类以传递滚动信息
 class AIResponseThread(QThread):